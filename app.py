@@ -6,68 +6,102 @@ to configure the database connection and queries.
 """
 
 import sys
-from typing import Optional
+from typing import Optional, List, Union
+import dash
 from dash import Dash
-from config import init_config, Config
+from sources import SourceRegistry
 from layouts import create_layout
 from callbacks import register_callbacks
+from export import register_export_routes
+from metrics import register_metrics_route
+from compression import register_compression, configure_json_engine
+from callback_profiling import register_callback_profiling
+from prewarm import PrewarmScheduler, PREWARM_ENABLED
+from plot_sandbox import plot_sandbox
+from db_utils import ASYNC_CALLBACKS
 
-def create_app(source: str = 'example') -> Dash:
+def create_app(sources: Union[str, List[str]] = 'example') -> Dash:
     """
     Create and configure the Dash application.
     
     Args:
-        source (str): The source module name to use for database connection and queries.
-            Must be a valid source configuration name.
+        sources (Union[str, List[str]]): The source module name, or names, to serve.
+            The first source is selected by default. Each source is initialized
+            on first use and dropped again after being idle.
     
     Returns:
         Dash: The configured Dash application.
         
     Raises:
-        ValueError: If source configuration cannot be initialized.
+        ValueError: If the default source configuration cannot be initialized.
     """
-    # Initialize configuration first
+    if isinstance(sources, str):
+        sources = [sources]
+
+    # Validate the default source up front; the others load lazily
     try:
-        config = init_config(source)
-        print(f"Configuration initialized with source: {source}")
+        registry = SourceRegistry(sources)
+        config = registry.get().config
+        print(f"Configuration initialized with source: {config.source}")
         print(f"Queries path: {config.queries_path}")
     except Exception as e:
-        raise ValueError(f'Failed to initialize configuration for source {source}: {str(e)}')
+        raise ValueError(f'Failed to initialize configuration for source {sources[0] if sources else None}: {str(e)}')
 
     # Initialize the app with external stylesheets
-    app = Dash(
-        __name__,
-        external_stylesheets=[
-            'https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css',
-            'https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap',
-            'https://cdn.jsdelivr.net/npm/@heroicons/v1/outline/index.min.css'
-        ],
-        suppress_callback_exceptions=True
-    )
+    options = {}
+    if ASYNC_CALLBACKS:
+        # Async callbacks need Dash 3.1 or newer; older versions do not know the option
+        options['use_async'] = True
+    try:
+        app = Dash(
+            __name__,
+            external_stylesheets=[
+                'https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css',
+                'https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap',
+                'https://cdn.jsdelivr.net/npm/@heroicons/v1/outline/index.min.css'
+            ],
+            suppress_callback_exceptions=True,
+            **options
+        )
+    except TypeError as e:
+        if 'use_async' not in str(e):
+            raise
+        raise ValueError(f'ASYNC_CALLBACKS=1 needs Dash 3.1 or newer with dash[async]; installed Dash is {dash.__version__}')
     
-    # Create layout with configuration
-    app.layout = create_layout(config)
+    # Create layout with the served sources
+    app.layout = create_layout(registry)
     
-    # Register callbacks with app and configuration
-    register_callbacks(app, config)
+    # Register callbacks with app and source registry
+    register_callbacks(app, registry)
+    register_callback_profiling(app)
+    register_export_routes(app.server, registry)
+    register_metrics_route(app.server)
+    register_compression(app.server)
+    configure_json_engine()
+    registry.start_sweeper()
+    if plot_sandbox.workers > 0:
+        plot_sandbox.start()
+    if PREWARM_ENABLED:
+        PrewarmScheduler(registry).start()
     
     return app
 
-def main(source: Optional[str] = None) -> None:
+def main(source: Optional[Union[str, List[str]]] = None) -> None:
     """
     Main entry point for the application.
     
     Args:
-        source (Optional[str]): The source parameter. If None, will attempt to get from
-            command line arguments. Defaults to 'example' if not provided.
+        source (Optional[Union[str, List[str]]]): The source parameter, or several
+            source names. If None, will attempt to get from command line arguments.
+            Defaults to 'example' if not provided.
             
     Raises:
         SystemExit: If configuration cannot be initialized or app creation fails.
     """
     try:
-        # Get source from command line argument or use default
+        # Get sources from command line arguments or use default
         if source is None:
-            source = sys.argv[1] if len(sys.argv) > 1 else 'example'
+            source = sys.argv[1:] if len(sys.argv) > 1 else 'example'
             
         print(f'Initializing app with source: {source}')
         
@@ -0,0 +1,51 @@
+// Clientside callbacks rendering the parameter panel from the query catalog
+// that update_catalog ships to the browser when a source is selected.
+
+// Whether the selected query changed, rather than the catalog or a batch switch of the same query
+function queryChanged() {
+    var context = window.dash_clientside.callback_context;
+    var triggered = (context && context.triggered) || [];
+    return !triggered.length || triggered.some(function(t) { return t.prop_id.indexOf('query-selector.') === 0; });
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    catalog: {
+        // Show the slots the selected query uses, label them and clear values left
+        // from the previous query. Values that are already empty are not touched,
+        // so no autocomplete or prefetch callback fires, and a catalog update or a
+        // batch switch for the same query keeps them all. Batched date parameters
+        // show the text input instead of the date picker.
+        render_parameters: function(query, catalog, batchValues, textValues, dateValues) {
+            var entry = (catalog && catalog.queries && catalog.queries[query]) || {};
+            var params = entry.params || [];
+            var noUpdate = window.dash_clientside.no_update;
+            var clear = queryChanged();
+            var slots = textValues.map(function(_, i) { return params[i]; });
+            var batched = batchValues.map(function(v) { return !clear && !!(v && v.length); });
+            return [
+                slots.map(function(p) { return {display: p ? 'block' : 'none', marginBottom: '15px'}; }),
+                slots.map(function(p) { return p ? p.name + ' (' + p.type + ')' : ''; }),
+                slots.map(function(p, i) { return {display: p && (p.type !== 'date' || batched[i]) ? 'block' : 'none'}; }),
+                slots.map(function(p, i) { return {display: p && p.type === 'date' && !batched[i] ? 'block' : 'none'}; }),
+                textValues.map(function(v) { return v && clear ? null : noUpdate; }),
+                dateValues.map(function(v) { return v && clear ? null : noUpdate; }),
+                batchValues.map(function(v) { return v && v.length && clear ? [] : noUpdate; })
+            ];
+        },
+
+        // Offer the result columns of the selected query for a rollup, with the
+        // first column named like a date as the date column. A catalog update for
+        // the same query refreshes the options and keeps the choices.
+        rollup_options: function(query, catalog) {
+            var entry = (catalog && catalog.queries && catalog.queries[query]) || {};
+            var columns = entry.columns || [];
+            var options = columns.map(function(col) { return {label: col, value: col}; });
+            if (!queryChanged()) {
+                var noUpdate = window.dash_clientside.no_update;
+                return [options, noUpdate, options, noUpdate, options, noUpdate];
+            }
+            var dateColumn = columns.find(function(col) { return col.toLowerCase().indexOf('date') >= 0; });
+            return [options, dateColumn || null, options, [], options, []];
+        }
+    }
+});
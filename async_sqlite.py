@@ -0,0 +1,80 @@
+"""
+Async adapter for sqlite connections.
+
+sqlite has no async driver in the standard library, so every call is
+offloaded to a small shared thread pool. Sources can use it for
+get_connection_async(), which lets the async query path run without an
+external database. The interface follows aiosqlite: execute() returns a
+cursor whose fetch methods are awaited.
+"""
+
+import os
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Sequence
+
+# Threads shared by all async sqlite connections
+ASYNC_SQLITE_THREADS = int(os.getenv('ASYNC_SQLITE_THREADS', '4'))
+
+_executor = ThreadPoolExecutor(max_workers=ASYNC_SQLITE_THREADS, thread_name_prefix='async-sqlite')
+
+async def offload(fn, *args) -> Any:
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+class AsyncSQLiteCursor:
+    """Awaitable wrapper of a sqlite3 cursor."""
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    @property
+    def description(self) -> Optional[Sequence[tuple]]:
+        """Column descriptions of the last statement."""
+        return self._cursor.description
+
+    async def fetchall(self) -> List[tuple]:
+        return await offload(self._cursor.fetchall)
+
+    async def fetchmany(self, size: int) -> List[tuple]:
+        return await offload(self._cursor.fetchmany, size)
+
+    async def close(self) -> None:
+        await offload(self._cursor.close)
+
+class AsyncSQLiteConnection:
+    """
+    Awaitable wrapper of a sqlite3 connection.
+
+    Calls on one connection run one at a time, but may run on different
+    pool threads, so the connection is opened with check_same_thread=False.
+
+    Args:
+        conn (sqlite3.Connection): Connection to wrap.
+    """
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self._lock = asyncio.Lock()
+
+    async def execute(self, sql: str, parameters: Any = ()) -> AsyncSQLiteCursor:
+        """Execute a statement and return its cursor."""
+        async with self._lock:
+            cursor = await offload(self._conn.execute, sql, parameters)
+        return AsyncSQLiteCursor(cursor)
+
+    async def close(self) -> None:
+        await offload(self._conn.close)
+
+async def connect_async(database: str, **kwargs) -> AsyncSQLiteConnection:
+    """
+    Open a sqlite database for use with the async query path.
+
+    Args:
+        database (str): Path or URI of the database.
+        **kwargs: Further arguments for sqlite3.connect.
+
+    Returns:
+        AsyncSQLiteConnection: The wrapped connection.
+    """
+    kwargs.setdefault('check_same_thread', False)
+    conn = await offload(lambda: sqlite3.connect(database, **kwargs))
+    return AsyncSQLiteConnection(conn)
@@ -0,0 +1,97 @@
+"""
+Benchmark plain per-query sqlite connections against SQLiteConnectionFactory.
+
+Builds a multi-million-row price table like the example source's and
+times three workloads with each connection strategy: indexed lookups of one
+ticker, full-scan aggregates, and lookups from several threads at once.
+
+    python bench/bench_sqlite_connections.py --rows 3000000
+    python bench/bench_sqlite_connections.py --db /path/to/existing.db --no-build
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlite_connections import SQLiteConnectionFactory
+
+LOOKUP = 'SELECT date, price FROM stock_prices WHERE ticker = ?'
+AGGREGATE = 'SELECT ticker, AVG(price), MAX(price), COUNT(*) FROM stock_prices GROUP BY ticker'
+
+def build_database(path: str, rows: int, tickers: int = 2000) -> None:
+    """Write a stock_prices table with an index on ticker."""
+    rng = np.random.default_rng(0)
+    days = rows // tickers
+    df = pd.DataFrame({
+        'date': np.repeat(pd.date_range('2000-01-01', periods=days).strftime('%Y-%m-%d'), tickers),
+        'ticker': np.tile([f'T{i:04d}' for i in range(tickers)], days),
+        'price': rng.random(days * tickers) * 100
+    })
+    conn = sqlite3.connect(path)
+    df.to_sql('stock_prices', conn, if_exists='replace', index=False, chunksize=100000)
+    conn.execute('CREATE INDEX idx_stock_prices_ticker ON stock_prices (ticker)')
+    conn.commit()
+    conn.close()
+
+def run(connect, sql, args=()) -> int:
+    """Run a query the way db_utils does: connect, fetch, close."""
+    conn = connect()
+    try:
+        return len(conn.execute(sql, args).fetchall())
+    finally:
+        conn.close()
+
+def timed(fn, repeat: int) -> float:
+    """Return milliseconds per call."""
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+def benchmark(path: str, lookups: int, scans: int, threads: int) -> pd.DataFrame:
+    tickers = [row[0] for row in sqlite3.connect(path).execute('SELECT DISTINCT ticker FROM stock_prices LIMIT 200')]
+    strategies = {
+        'sqlite3.connect per query': lambda: sqlite3.connect(path),
+        'factory, new connection': SQLiteConnectionFactory(path, shared=False).connect,
+        'factory, pooled': SQLiteConnectionFactory(path).connect
+    }
+    results = []
+    for name, connect in strategies.items():
+        # One untimed scan so every strategy starts with the file in the OS cache
+        run(connect, AGGREGATE)
+        lookup_ms = timed(lambda i: run(connect, LOOKUP, (tickers[i % len(tickers)],)), lookups)
+        scan_ms = timed(lambda i: run(connect, AGGREGATE), scans)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(lambda i: run(connect, LOOKUP, (tickers[i % len(tickers)],)), range(lookups * threads)))
+        concurrent_ms = (time.perf_counter() - start) * 1000 / (lookups * threads)
+        results.append({'strategy': name, 'lookup_ms': lookup_ms, 'scan_ms': scan_ms,
+                        f'lookup_ms_{threads}_threads': concurrent_ms})
+    return pd.DataFrame(results)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark sqlite connection strategies.')
+    parser.add_argument('--rows', type=int, default=3_000_000, help='Rows of the generated table')
+    parser.add_argument('--db', help='Database file; a temporary one is generated by default')
+    parser.add_argument('--no-build', action='store_true', help='Use --db as it is')
+    parser.add_argument('--lookups', type=int, default=500, help='Indexed lookups per strategy')
+    parser.add_argument('--scans', type=int, default=5, help='Full-scan aggregates per strategy')
+    parser.add_argument('--threads', type=int, default=4, help='Threads of the concurrent workload')
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    if not args.no_build:
+        start = time.perf_counter()
+        build_database(path, args.rows)
+        print(f'Built {args.rows:,} rows in {time.perf_counter() - start:.1f} s ({os.path.getsize(path) / 1e6:.0f} MB)')
+    print(benchmark(path, args.lookups, args.scans, args.threads).round(2).to_string(index=False))
+
+if __name__ == '__main__':
+    main()
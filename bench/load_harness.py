@@ -0,0 +1,300 @@
+"""
+Concurrent-user load test of the Dash callbacks.
+
+Simulates analysts working against create_app: pick a saved query and
+parameter values, run it, generate its report and, sometimes, ask VizroAI for
+a chart. Requests go through the real callback endpoint with the Flask test
+client. VizroAI is replaced by a fake LLM with a fixed latency, so runs need
+no API key or network. Every user follows a seeded script, so runs against
+the generated sample databases are reproducible.
+
+    python bench/load_harness.py --users 8 --sessions 5 --think 0.5
+    python bench/load_harness.py --workers 2 --users 16 --profiles --json bench_output.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import get_context
+from types import SimpleNamespace
+from typing import Dict, List, Any, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class FakeVizroAI:
+    """Stand-in for VizroAI answering after a fixed latency with a simple chart."""
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def plot(self, df, user_input, return_elements=False, validate_code=True):
+        import plotly.express as px
+        time.sleep(self.latency)
+        x, y = df.columns[0], df.select_dtypes('number').columns[-1]
+        return SimpleNamespace(
+            code=f'import plotly.express as px\n\ndef custom_chart(data_frame):\n    return px.line(data_frame, x={x!r}, y={y!r})\n',
+            chart_insights=f'{len(df)} rows of {y}',
+            code_explanation='Line chart generated by the fake LLM',
+            get_fig_object=lambda data_frame, vizro=False: px.line(data_frame, x=x, y=y)
+        )
+
+class CallbackClient:
+    """
+    Calls Dash callbacks by output through the /_dash-update-component endpoint.
+
+    Args:
+        client: Flask test client of the app.
+        dependencies (List[Dict[str, Any]]): The app's /_dash-dependencies.
+    """
+    def __init__(self, client, dependencies: List[Dict[str, Any]]):
+        self.client = client
+        self.dependencies = {dep['output']: dep for dep in dependencies}
+
+    def _dependency(self, output: str) -> Dict[str, Any]:
+        for key, dep in self.dependencies.items():
+            if output in [spec.split('@')[0] for spec in key.strip('.').split('...')]:
+                return dep
+        raise KeyError(output)
+
+    @staticmethod
+    def _fill(items: List[Dict[str, Any]], values: Dict[str, Any]) -> List[Any]:
+        filled = []
+        for item in items:
+            key = f"{item['id']}.{item['property']}"
+            value = values.get(key)
+            if item['id'].startswith('{'):
+                # Wildcard ids take one value per matched component
+                wildcard = json.loads(item['id'])
+                filled.append([{'id': {**wildcard, 'index': i}, 'property': item['property'], 'value': v}
+                               for i, v in enumerate(value or [])])
+            else:
+                filled.append({'id': item['id'], 'property': item['property'], 'value': value})
+        return filled
+
+    def call(self, output: str, trigger: str, values: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """
+        Fire a callback.
+
+        Args:
+            output (str): One output of the callback, e.g. 'report-content.children'.
+            trigger (str): Changed input, e.g. 'run-report.n_clicks'.
+            values (Dict[str, Any]): Input and state values keyed by 'id.property'.
+
+        Returns:
+            Tuple[int, Dict[str, Any]]: HTTP status and the response by component id.
+        """
+        dep = self._dependency(output)
+        outputs = []
+        for spec in dep['output'].strip('.').split('...'):
+            component, prop = spec.rsplit('.', 1)
+            outputs.append({'id': component, 'property': prop.split('@')[0]})
+        payload = {
+            'output': dep['output'],
+            'outputs': outputs if len(outputs) > 1 else outputs[0],
+            'inputs': self._fill(dep['inputs'], values),
+            'state': self._fill(dep['state'], values),
+            'changedPropIds': [trigger]
+        }
+        response = self.client.post('/_dash-update-component', json=payload)
+        if response.status_code != 200:
+            return response.status_code, {}
+        return 200, json.loads(response.data).get('response', {})
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != 'darwin' else peak / 1024 / 1024
+
+def choose_params(rng: random.Random, context, query: str) -> Dict[str, List[Any]]:
+    """Pick parameter values from the query's distinct-value index."""
+    from query_graph import param_query
+    text_values, date_values = [], []
+    for param in context.queries[query]['params']:
+        sql = context.queries[param_query(context.queries, query, param['name'])]['template'].sql
+        values = context.param_index.get(param['name'], sql, context.config)['values']
+        value = rng.choice(values) if values else None
+        if param['type'] == 'date':
+            text_values.append(None)
+            date_values.append(value[:10] if value else None)
+        else:
+            text_values.append(value)
+            date_values.append(None)
+    return {'text': text_values, 'date': date_values}
+
+def simulate_user(app, registry, user: int, args: argparse.Namespace) -> List[Tuple[str, float, bool]]:
+    """Run one user's seeded script and return (callback, latency ms, ok) samples."""
+    rng = random.Random(args.seed * 1000 + user)
+    client = app.server.test_client()
+    client = CallbackClient(client, json.loads(client.get('/_dash-dependencies').data))
+    context = registry.get(args.source)
+    samples = []
+
+    def timed(name, output, trigger, values, check=lambda response: True):
+        start = time.perf_counter()
+        try:
+            status, response = client.call(output, trigger, values)
+            ok = status == 200 and check(response)
+        except Exception as e:
+            print(f'{name} failed: {e}', file=sys.stderr)
+            status, response, ok = 0, {}, False
+        samples.append((name, (time.perf_counter() - start) * 1000, ok))
+        return response
+
+    def think():
+        time.sleep(rng.expovariate(1 / args.think) if args.think > 0 else 0)
+
+    # Page load: the source's catalog is shipped once, query selection then happens in the browser
+    timed('update_catalog', 'catalog-store.data', 'source-selector.value', {'source-selector.value': args.source})
+
+    for session in range(args.sessions):
+        query = rng.choice(sorted(context.queries))
+        params = choose_params(rng, context, query)
+        state = {
+            'query-selector.value': query,
+            'source-selector.value': args.source,
+            '{"index":["ALL"],"type":"param"}.value': params['text'],
+            '{"index":["ALL"],"type":"param-date"}.date': params['date'],
+            '{"index":["ALL"],"type":"param-batch"}.value': [[] for _ in params['text']],
+            'custom-sql-input.value': '',
+            'last-query-store.data': None,
+            'preflight-store.data': None
+        }
+        think()
+
+        response = timed('run_queries', 'query-results-table.data', 'run-query.n_clicks',
+                         {**state, 'run-query.n_clicks': session + 1})
+        records = (response.get('dataframe-store') or {}).get('data')
+        last_query = (response.get('last-query-store') or {}).get('data')
+        if not records:
+            continue
+        think()
+
+        state.update({'dataframe-store.data': records, 'last-query-store.data': last_query})
+        timed('generate_report', 'report-content.children', 'run-report.n_clicks',
+              {**state, 'run-report.n_clicks': session + 1},
+              check=lambda r: not str(r.get('report-content', {}).get('children', '')).startswith('Error'))
+        think()
+
+        if rng.random() < args.vizro_share:
+            timed('generate_vizroai_plot', 'vizroai-plot.figure', 'generate-plot.n_clicks',
+                  {**state, 'generate-plot.n_clicks': session + 1, 'user-input.value': 'plot the trend'},
+                  check=lambda r: bool(r.get('vizroai-plot', {}).get('figure')))
+            think()
+
+        if args.profiles and rng.random() < args.profile_share:
+            timed('generate_ydata_profile', 'ydata-profile.src', 'generate-profile.n_clicks',
+                  {**state, 'generate-profile.n_clicks': session + 1, 'ydata-tsmode.value': []},
+                  check=lambda r: bool(r.get('ydata-profile', {}).get('src')))
+            timed('generate_sweetviz_report', 'sweetviz-profile.src', 'generate-sweetviz.n_clicks',
+                  {**state, 'generate-sweetviz.n_clicks': session + 1},
+                  check=lambda r: bool(r.get('sweetviz-profile', {}).get('src')))
+            think()
+    return samples
+
+def run_worker(worker: int, users: List[int], args: argparse.Namespace) -> Dict[str, Any]:
+    """Create an app in this process and drive it with the given users."""
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('OPENAI_API_KEY', 'load-test')
+    import callbacks
+    from app import create_app
+    from sources import SourceRegistry
+    callbacks.vizro_ai = FakeVizroAI(args.llm_latency)
+    if args.profiles:
+        os.makedirs(os.path.join(ROOT, 'assets'), exist_ok=True)
+
+    app = create_app(args.source)
+    # Separate registry for picking parameter values, so the app's caches start cold
+    registry = SourceRegistry([args.source])
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(users), thread_name_prefix=f'user-{worker}') as pool:
+        results = list(pool.map(lambda user: simulate_user(app, registry, user, args), users))
+    return {
+        'worker': worker,
+        'seconds': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb(),
+        'samples': [sample for user_samples in results for sample in user_samples]
+    }
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+def summarize(workers: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """Aggregate samples into per-callback latency percentiles, error rates and throughput."""
+    samples = [sample for worker in workers for sample in worker['samples']]
+    callbacks: Dict[str, Dict[str, Any]] = {}
+    for name in dict.fromkeys(name for name, _, _ in samples):
+        latencies = [ms for n, ms, _ in samples if n == name]
+        errors = sum(1 for n, _, ok in samples if n == name and not ok)
+        callbacks[name] = {
+            'calls': len(latencies),
+            'errors': errors,
+            'error_rate': errors / len(latencies),
+            'p50_ms': percentile(latencies, 0.5),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'max_ms': max(latencies)
+        }
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'wall_seconds': wall_seconds,
+        'throughput_rps': len(samples) / wall_seconds if wall_seconds else 0.0,
+        'callbacks': callbacks,
+        'workers': [{'worker': w['worker'], 'seconds': w['seconds'], 'peak_rss_mb': w['peak_rss_mb']} for w in workers]
+    }
+
+def print_report(summary: Dict[str, Any]) -> None:
+    print(f"{'callback':<26}{'calls':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in summary['callbacks'].items():
+        print(f"{name:<26}{stats['calls']:>7}{stats['errors']:>8}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+    error_rate = summary['errors'] / summary['requests'] if summary['requests'] else 0.0
+    print(f"{summary['requests']} requests in {summary['wall_seconds']:.1f} s: "
+          f"{summary['throughput_rps']:.1f} req/s, {error_rate:.1%} errors")
+    for worker in summary['workers']:
+        print(f"worker {worker['worker']}: peak RSS {worker['peak_rss_mb']:.0f} MB")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Load-test the Dash callbacks with simulated users.')
+    parser.add_argument('--source', default='example', help='Source module to serve')
+    parser.add_argument('--users', type=int, default=8, help='Concurrent users in total')
+    parser.add_argument('--workers', type=int, default=1, help='Server processes; users are spread across them')
+    parser.add_argument('--sessions', type=int, default=5, help='Query sessions per user')
+    parser.add_argument('--think', type=float, default=0.5, help='Mean think time in seconds between actions')
+    parser.add_argument('--llm-latency', type=float, default=1.0, help='Seconds the fake LLM takes to answer')
+    parser.add_argument('--vizro-share', type=float, default=0.3, help='Share of sessions asking VizroAI for a chart')
+    parser.add_argument('--profiles', action='store_true', help='Include the YData and Sweetviz callbacks')
+    parser.add_argument('--profile-share', type=float, default=0.1, help='Share of sessions running the profilers')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the user scripts')
+    parser.add_argument('--json', help='Also write the summary to this file')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    users = list(range(args.users))
+    shards = [users[i::args.workers] for i in range(args.workers) if users[i::args.workers]]
+    start = time.perf_counter()
+    if len(shards) == 1:
+        workers = [run_worker(0, shards[0], args)]
+    else:
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=get_context('spawn')) as pool:
+            workers = list(pool.map(run_worker, range(len(shards)), shards, [args] * len(shards)))
+    summary = summarize(workers, time.perf_counter() - start)
+    print_report(summary)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(summary, file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Payload size and encode time of representative callback responses.
+
+Encodes every table of a sqlite source as the run callback sends it (table
+records) and the built-in report of the largest one as unpack_to_dash
+renders it (tables and figures), once per JSON engine, and compresses the
+encoded bytes with gzip and, if installed, brotli.
+
+    python bench/payloads.py [--source example] [--repeat 5]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plotly.io as pio
+from plotly.io.json import to_json_plotly
+from config import init_config
+from db_utils import load_queries, execute_sql_query
+from compression import compress, brotli, COMPRESSION_LEVEL
+from report_utils import create_report_data
+from utils import unpack_to_dash
+
+def payloads(source: str):
+    """Yield (name, value) pairs shaped like the app's callback responses."""
+    config = init_config(source)
+    queries = load_queries(config)
+    conn = config.get_connection()
+    try:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    finally:
+        conn.close()
+    largest = None
+    for table in tables:
+        df = execute_sql_query(f'SELECT * FROM {table}', [], config, queries, is_file=False, origin='bench')
+        yield f'{table} records', {'data': df.to_dict('records'), 'columns': [{'name': c, 'id': c} for c in df.columns]}
+        if largest is None or len(df) > len(largest):
+            largest = df
+    yield 'profile report', unpack_to_dash(create_report_data(source, None, largest))
+
+def best_of(repeat: int, fn):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times), result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--source', default='example')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+    header = f"{'payload':<28}{'engine':<8}{'encode ms':>10}{'raw KB':>10}" + \
+        ''.join(f'{enc + " KB":>10}{enc + " ms":>9}' for enc in encodings)
+    print(header)
+    for name, value in payloads(args.source):
+        for engine in ('json', 'orjson'):
+            pio.json.config.default_engine = engine
+            encode_ms, encoded = best_of(args.repeat, lambda: to_json_plotly(value).encode('utf-8'))
+            row = f'{name:<28}{engine:<8}{encode_ms:>10.1f}{len(encoded) / 1024:>10.1f}'
+            for enc in encodings:
+                compress_ms, compressed = best_of(args.repeat, lambda: compress(encoded, enc, COMPRESSION_LEVEL))
+                row += f'{len(compressed) / 1024:>10.1f}{compress_ms:>9.1f}'
+            print(row)
+
+if __name__ == '__main__':
+    main()
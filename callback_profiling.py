@@ -0,0 +1,323 @@
+"""
+Opt-in profiling of Dash callbacks.
+
+When enabled, every registered callback runs under a sampling profiler and
+tracemalloc. The sampler records the stack of the thread running the
+callback every few milliseconds, including Dash's own argument handling
+and JSON serialization of the response, so the time split between SQL,
+pandas and encoding is visible. The slowest profiles are written as
+speedscope files (https://www.speedscope.app), which show them as
+flamegraphs, and listed in the Profiling tab with the peak allocation of
+each callback.
+
+Profiling is on for all requests with CALLBACK_PROFILING=1. With
+CALLBACK_PROFILING_ALLOW_REQUEST=1 a request can also ask for it with an
+'X-Profile: 1' header or a 'profile_callbacks=1' cookie; this is off by
+default, since any visitor could otherwise slow the server down.
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import threading
+import functools
+import tracemalloc
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+from flask import Flask, Response, request, send_from_directory, has_request_context
+from metrics import metrics
+
+CALLBACK_PROFILING = os.getenv('CALLBACK_PROFILING', '0').lower() in ('1', 'true', 'yes')
+# Whether single requests may turn profiling on with the X-Profile header or cookie
+CALLBACK_PROFILING_ALLOW_REQUEST = os.getenv('CALLBACK_PROFILING_ALLOW_REQUEST', '0').lower() in ('1', 'true', 'yes')
+# Seconds between stack samples
+CALLBACK_PROFILE_INTERVAL = float(os.getenv('CALLBACK_PROFILE_INTERVAL', '0.005'))
+# Number of slowest profiles kept on disk
+CALLBACK_PROFILE_KEEP = int(os.getenv('CALLBACK_PROFILE_KEEP', '20'))
+# Directory the speedscope files are written to
+CALLBACK_PROFILE_DIR = os.getenv('CALLBACK_PROFILE_DIR', 'profiles')
+
+# Callbacks that are never profiled, so the Profiling tab does not list itself
+EXCLUDED_CALLBACKS = {'update_profiling'}
+
+def profiling_requested() -> bool:
+    """Return whether the current request asks for profiling."""
+    if CALLBACK_PROFILING:
+        return True
+    if not CALLBACK_PROFILING_ALLOW_REQUEST or not has_request_context():
+        return False
+    return request.headers.get('X-Profile') == '1' or request.cookies.get('profile_callbacks') == '1'
+
+class StackSampler:
+    """
+    Samples the stack of one thread at a fixed interval.
+
+    Args:
+        thread_id (int): Identifier of the thread to sample.
+        interval (float): Seconds between samples.
+    """
+    def __init__(self, thread_id: int, interval: float = CALLBACK_PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames: List[Tuple[str, str, int]] = []
+        self.samples: List[List[int]] = []
+        self.weights: List[float] = []
+        self._frame_index: Dict[Tuple[str, str, int], int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='callback-sampler', daemon=True)
+
+    def _stack(self) -> Optional[List[int]]:
+        """Return the current stack of the thread as frame indexes, outermost first."""
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            if key not in self._frame_index:
+                self._frame_index[key] = len(self.frames)
+                self.frames.append(key)
+            stack.append(self._frame_index[key])
+            frame = frame.f_back
+        return stack[::-1] or None
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            stack = self._stack()
+            now = time.perf_counter()
+            if stack:
+                self.samples.append(stack)
+                self.weights.append((now - last) * 1000)
+            last = now
+
+    def start(self) -> 'StackSampler':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def speedscope(self, name: str, duration_ms: float) -> Dict[str, Any]:
+        """
+        Return the samples in the speedscope file format.
+
+        Args:
+            name (str): Profile name shown by speedscope.
+            duration_ms (float): Wall time of the profiled call.
+
+        Returns:
+            Dict[str, Any]: Speedscope document with one sampled profile.
+        """
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'callback_profiling',
+            'activeProfileIndex': 0,
+            'shared': {'frames': [{'name': fn, 'file': file, 'line': line} for fn, file, line in self.frames]},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': duration_ms,
+                'samples': self.samples,
+                'weights': self.weights
+            }]
+        }
+
+class ProfileStore:
+    """
+    Keeps the slowest callback profiles on disk and per-callback summaries in memory.
+
+    Args:
+        directory (str): Directory the speedscope files are written to.
+        keep (int): Number of slowest profiles kept.
+    """
+    def __init__(self, directory: str = CALLBACK_PROFILE_DIR, keep: int = CALLBACK_PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+        # Min-heap of (duration_ms, sequence, entry), so the fastest kept profile is evicted first
+        self._slowest: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._sequence = 0
+        self._summary: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, callback: str, duration_ms: float, peak_bytes: int, sampler: StackSampler) -> None:
+        """
+        Record a profiled call, writing its profile if it is among the slowest.
+
+        Args:
+            callback (str): Callback name.
+            duration_ms (float): Wall time of the call.
+            peak_bytes (int): Peak traced allocation during the call.
+            sampler (StackSampler): Stopped sampler of the call.
+        """
+        with self._lock:
+            summary = self._summary.setdefault(callback, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'peak_bytes': 0})
+            summary['calls'] += 1
+            summary['total_ms'] += duration_ms
+            summary['max_ms'] = max(summary['max_ms'], duration_ms)
+            summary['peak_bytes'] = max(summary['peak_bytes'], peak_bytes)
+
+            if self.keep <= 0:
+                return
+            if len(self._slowest) >= self.keep and duration_ms <= self._slowest[0][0]:
+                return
+            self._sequence += 1
+            started = datetime.now()
+            filename = f"{callback}_{started.strftime('%Y%m%d_%H%M%S')}_{self._sequence}.speedscope.json"
+            entry = {'callback': callback, 'duration_ms': duration_ms, 'peak_bytes': peak_bytes,
+                     'samples': len(sampler.samples), 'started': started.isoformat(timespec='seconds'),
+                     'file': filename}
+            evicted = None
+            if len(self._slowest) >= self.keep:
+                evicted = heapq.heapreplace(self._slowest, (duration_ms, self._sequence, entry))
+            else:
+                heapq.heappush(self._slowest, (duration_ms, self._sequence, entry))
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, filename), 'w') as file:
+                json.dump(sampler.speedscope(f'{callback} ({duration_ms:.0f} ms)', duration_ms), file)
+            if evicted is not None:
+                os.remove(os.path.join(self.directory, evicted[2]['file']))
+        except OSError as e:
+            print(f"Failed to write callback profile: {e}")
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        """Return the kept profiles, slowest first."""
+        with self._lock:
+            return [entry for _, _, entry in sorted(self._slowest, key=lambda item: -item[0])]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Return per-callback call counts, timings and peak allocation."""
+        with self._lock:
+            return [
+                {'callback': name, 'calls': s['calls'], 'mean_ms': s['total_ms'] / s['calls'],
+                 'max_ms': s['max_ms'], 'peak_mb': s['peak_bytes'] / 1024 / 1024}
+                for name, s in sorted(self._summary.items(), key=lambda item: -item[1]['max_ms'])
+            ]
+
+    def clear(self) -> None:
+        """Forget all profiles and delete their files."""
+        with self._lock:
+            files = [entry['file'] for _, _, entry in self._slowest]
+            self._slowest.clear()
+            self._summary.clear()
+        for filename in files:
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                pass
+
+# Shared store of the application's callback profiles
+callback_profiles = ProfileStore()
+
+_tracing_lock = threading.Lock()
+_tracing_calls = 0
+_tracing_started = False
+
+def _start_tracing() -> int:
+    """Start tracemalloc for a profiled call and return the traced size at its start."""
+    global _tracing_calls, _tracing_started
+    with _tracing_lock:
+        if _tracing_calls == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+        _tracing_calls += 1
+        # The peak is process-wide, so calls profiled concurrently share it
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+
+def _stop_tracing(start_bytes: int) -> int:
+    """Return the peak allocation since start_bytes; stop tracemalloc after the last profiled call."""
+    global _tracing_calls, _tracing_started
+    with _tracing_lock:
+        peak = max(tracemalloc.get_traced_memory()[1] - start_bytes, 0)
+        _tracing_calls -= 1
+        if _tracing_calls == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+        return peak
+
+def profile_callback(name: str, func, store: ProfileStore = callback_profiles):
+    """
+    Wrap a Dash callback function so requested calls are profiled.
+
+    Args:
+        name (str): Callback name used for files and summaries.
+        func: The function Dash dispatches to.
+        store (ProfileStore): Store receiving the profiles.
+
+    Returns:
+        The wrapped function, async if func is.
+    """
+    def begin():
+        sampler = StackSampler(threading.get_ident()).start()
+        return sampler, _start_tracing(), time.perf_counter()
+
+    def end(sampler, start_bytes, start):
+        duration_ms = (time.perf_counter() - start) * 1000
+        sampler.stop()
+        peak = _stop_tracing(start_bytes)
+        store.add(name, duration_ms, peak, sampler)
+        metrics.observe('callback_seconds', duration_ms / 1000, callback=name)
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not profiling_requested():
+                return await func(*args, **kwargs)
+            # Awaited work running on other threads is not sampled, only the event loop thread
+            state = begin()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                end(*state)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not profiling_requested():
+            return func(*args, **kwargs)
+        state = begin()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end(*state)
+    return wrapper
+
+def register_callback_profiling(app, store: ProfileStore = callback_profiles) -> None:
+    """
+    Wrap all registered callbacks of an app and serve the stored profiles.
+
+    Callbacks are wrapped once; call this after all callbacks are registered.
+    Profiles are downloaded from /profiles/<file>.
+
+    Args:
+        app: The Dash application.
+        store (ProfileStore): Store receiving the profiles.
+    """
+    for callback in app.callback_map.values():
+        # Clientside callbacks run in the browser
+        func = callback.get('callback')
+        if func is None:
+            continue
+        name = getattr(func, '__name__', 'callback')
+        if name not in EXCLUDED_CALLBACKS and not getattr(func, '_profiled', False):
+            callback['callback'] = profile_callback(name, func, store)
+            callback['callback']._profiled = True
+
+    server: Flask = app.server
+
+    @server.route('/profiles/<path:filename>')
+    def download_profile(filename: str) -> Response:
+        """Serve a stored speedscope file."""
+        if not filename.endswith('.speedscope.json'):
+            return Response('Not a profile', status=404)
+        return send_from_directory(os.path.abspath(store.directory), filename, mimetype='application/json',
+                                   as_attachment=True)
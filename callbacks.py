@@ -3,29 +3,87 @@ Callback functions for the Dash application.
 """
 
 import time
+import asyncio
 import pandas as pd
-from dash import Dash, Output, Input, State, callback_context, ALL, html, dcc
+from flask import request
+from dash import (Dash, Output, Input, State, ClientsideFunction, callback_context, ALL, MATCH, html, dcc, Patch,
+                  no_update)
 from ydata_profiling import ProfileReport
 import sweetviz as sv
 from vizro_ai import VizroAI
-from db_utils import load_queries, get_params, execute_sql_query
+from db_utils import get_params, execute_sql_query, execute_sql_query_async, resolve_statement, upstream_tables, \
+    ASYNC_CALLBACKS
 from utils import unpack_to_dash
-from config import Config
-import importlib
+from result_diff import fingerprint_result, diff_result, is_unchanged
+from export import export_url
+from prewarm import usage_tracker
+from report_utils import create_report_data, report_key
+from query_history import query_history
+from explain import explain_statement, build_plan_tree, analyze_plan
+from query_graph import param_query
+from preflight import preflight_query
+from rollup import normalize_rollup
+from sampling import normalize_fraction
+from callback_profiling import callback_profiles
+from metrics import metrics
+from plot_sandbox import plot_sandbox, render_figure
+from speculation import Speculator, SpeculativeRun, params_complete, SPECULATION_ENABLED
+from sources import SourceRegistry
 
 # Initialize VizroAI globally since it's stateless
 vizro_ai = VizroAI()
 
-def create_parameter_input(param_details, index):
-    """Create parameter input components."""
-    param_name = param_details['name']
-    param_type = param_details['type']
-    
+def param_options_id(index):
+    """Return the DOM id Dash renders for a parameter's datalist."""
+    return f'{{"index":{index},"type":"param-options"}}'
+
+def split_batch_values(text):
+    """Split a comma-separated batch entry into its values."""
+    return [value.strip() for value in (text or '').split(',') if value.strip()]
+
+def collect_param_values(params, text_values, date_values, batch_flags=None):
+    """Map parameter names to the values entered in the parameter panel.
+
+    Parameters switched to batch mode, dates included, get the list of the
+    comma-separated values typed into their text input.
+    """
+    values = {}
+    for i, param in enumerate(params):
+        if batch_flags and i < len(batch_flags) and batch_flags[i]:
+            values[param['name']] = split_batch_values(text_values[i])
+        elif param['type'] == 'date':
+            values[param['name']] = date_values[i]
+        else:
+            values[param['name']] = text_values[i]
+    return values
+
+def render_plan_tree(nodes):
+    """Render plan tree nodes as nested lists."""
+    return html.Ul(
+        className='ml-4 list-disc',
+        children=[html.Li([node['detail'], render_plan_tree(node['children']) if node['children'] else None])
+                  for node in nodes]
+    )
+
+def build_result_patch(df: pd.DataFrame, diff: dict) -> Patch:
+    """Build a Patch of row operations that turns the previous records into df's."""
+    patch = Patch()
+    for start, end in diff['replace']:
+        for offset, record in enumerate(df.iloc[start:end].to_dict('records')):
+            patch[start + offset] = record
+    if diff['append_from'] is not None:
+        patch.extend(df.iloc[diff['append_from']:].to_dict('records'))
+    if diff['delete_from'] is not None:
+        for i in range(diff['old_rows'] - 1, diff['delete_from'] - 1, -1):
+            del patch[i]
+    return patch
+
+def create_parameter_slot(index):
+    """Create the input components of one parameter slot, hidden until a query uses the slot."""
     return html.Div(
         id={'type': 'param-div', 'index': index},
         children=[
             html.Label(
-                f'{param_name} ({param_type})',
                 id={'type': 'param-label', 'index': index},
                 className='form-label',
                 style={
@@ -38,178 +96,627 @@ def create_parameter_input(param_details, index):
             html.Div(
                 id={'type': 'param-input-container', 'index': index},
                 children=[
-                    dcc.Input(
-                        id={'type': 'param', 'index': index},
-                        type='text',
-                        className='w-full px-3 py-2 text-sm border border-gray-300 rounded-md focus:outline-none focus:ring-1 focus:ring-indigo-500 focus:border-indigo-500',
-                        style={
-                            'display': 'block' if param_type != 'date' else 'none',
-                            'width': '100%',
-                            'backgroundColor': 'white',
-                            'color': 'black',
-                            'borderColor': '#d1d5db'
-                        }
+                    html.Div(
+                        id={'type': 'param-text', 'index': index},
+                        style={'display': 'none'},
+                        children=[
+                            dcc.Input(
+                                id={'type': 'param', 'index': index},
+                                type='text',
+                                list=param_options_id(index),
+                                autoComplete='off',
+                                className='w-full px-3 py-2 text-sm border border-gray-300 rounded-md focus:outline-none focus:ring-1 focus:ring-indigo-500 focus:border-indigo-500',
+                                style={
+                                    'display': 'block',
+                                    'width': '100%',
+                                    'backgroundColor': 'white',
+                                    'color': 'black',
+                                    'borderColor': '#d1d5db'
+                                }
+                            ),
+                            html.Datalist(id={'type': 'param-options', 'index': index})
+                        ]
                     ),
-                    dcc.DatePickerSingle(
-                        id={'type': 'param-date', 'index': index},
-                        className='w-full',
-                        style={
-                            'display': 'block' if param_type == 'date' else 'none',
-                            'zIndex': 9999,
-                            'width': '100%'
-                        },
-                        date=None,
-                        display_format='YYYY-MM-DD',
-                        placeholder='Select a date...',
-                        clearable=True,
-                        with_portal=True,
-                        day_size=35
+                    html.Div(
+                        id={'type': 'param-date-picker', 'index': index},
+                        style={'display': 'none'},
+                        children=[
+                            dcc.DatePickerSingle(
+                                id={'type': 'param-date', 'index': index},
+                                className='w-full',
+                                style={'zIndex': 9999, 'width': '100%'},
+                                date=None,
+                                display_format='YYYY-MM-DD',
+                                placeholder='Select a date...',
+                                clearable=True,
+                                with_portal=True,
+                                day_size=35
+                            )
+                        ]
+                    ),
+                    # Batched date parameters take their dates in the text input, e.g. '2024-01-31, 2024-02-29'
+                    dcc.Checklist(
+                        id={'type': 'param-batch', 'index': index},
+                        options=[{'label': ' Batch (comma-separated values, one query)', 'value': 'batch'}],
+                        value=[],
+                        className='text-xs text-gray-600 mt-1'
                     )
                 ]
             )
         ],
         style={
-            'display': 'block',
+            'display': 'none',
             'marginBottom': '15px'
         }
     )
 
-def register_callbacks(app: Dash, config: Config) -> None:
+def register_callbacks(app: Dash, registry: SourceRegistry) -> None:
     """
     Register all callbacks for the application.
     
     Args:
         app (Dash): The Dash application instance.
-        config (Config): The application configuration instance.
+        registry (SourceRegistry): Registry of the sources served by the application.
     """
-    # Load queries once at startup
-    queries = load_queries(config)
-    max_params = max(len(query['params']) for query in queries.values())
-    
     @app.callback(
+        Output('catalog-store', 'data'),
+        Output('query-selector', 'options'),
+        Output('query-selector', 'value'),
         Output('parameter-inputs', 'children'),
-        Input('query-selector', 'value')
+        Input('source-selector', 'value')
     )
-    def update_parameters(selected_query):
-        """Update parameter inputs based on selected query."""
-        if not selected_query:
-            return [html.Div(
-                id={'type': 'param-div', 'index': i},
-                style={'display': 'none'}
-            ) for i in range(max_params)]
-        
-        # Get parameters for the selected query
-        params = get_params(queries, selected_query)
-        
-        children = []
-        for i in range(max_params):
-            if i < len(params):
-                children.append(create_parameter_input(params[i], i))
-            else:
-                children.append(html.Div(
-                    id={'type': 'param-div', 'index': i},
-                    style={'display': 'none'}
-                ))
-        return children
+    def update_catalog(source):
+        """Ship the first page of the selected source's query catalog and empty parameter slots for it."""
+        context = registry.get(source)
+        names = context.search_queries('')
+        catalog = context.catalog(names)
+        options = [{'label': name, 'value': name} for name in names]
+        return catalog, options, None, [create_parameter_slot(i) for i in range(catalog['max_params'])]
+
+    def reship_catalog(context, catalog, names):
+        """Return the catalog entries the browser holds and the listed ones, current again, and slots to append."""
+        shipped = [name for name in (catalog or {}).get('queries', {}) if name in context.queries]
+        fresh = context.catalog(list(dict.fromkeys(shipped + names)))
+        # Slots are only ever appended, so values typed into the existing ones are kept
+        slots = (catalog or {}).get('max_params', 0)
+        fresh['max_params'] = max(fresh['max_params'], slots)
+        if fresh['max_params'] == slots:
+            return fresh, no_update
+        patch = Patch()
+        for i in range(slots, fresh['max_params']):
+            patch.append(create_parameter_slot(i))
+        return fresh, patch
 
     @app.callback(
-        Output('query-selector', 'options'),
-        Input('query-selector', 'value')  # Dummy input to initialize
+        Output('catalog-store', 'data', allow_duplicate=True),
+        Output('parameter-inputs', 'children', allow_duplicate=True),
+        Input('query-selector', 'value'),
+        State('catalog-store', 'data'),
+        State('source-selector', 'value'),
+        prevent_initial_call=True
     )
-    def update_query_options(_):
-        """Update query selector options."""
-        return [{'label': k, 'value': k} for k in queries.keys()]
+    def sync_catalog(selected_query, catalog, source):
+        """Ship the catalog again when the source reloaded its query files after the browser got it."""
+        context = registry.get(source)
+        if not catalog or catalog.get('version') == context.catalog_version:
+            return no_update, no_update
+        return reship_catalog(context, catalog, [selected_query] if selected_query else [])
 
     @app.callback(
+        Output('query-selector', 'options', allow_duplicate=True),
+        Output('catalog-store', 'data', allow_duplicate=True),
+        Output('parameter-inputs', 'children', allow_duplicate=True),
+        Input('query-selector', 'search_value'),
+        State('query-selector', 'value'),
+        State('source-selector', 'value'),
+        State('catalog-store', 'data'),
+        prevent_initial_call=True
+    )
+    def search_catalog(search_value, selected_query, source, catalog):
+        """Offer the queries best matching the typed text and ship the catalog entries the browser lacks."""
+        if search_value is None:
+            return no_update, no_update, no_update
+        context = registry.get(source)
+        names = context.search_queries(search_value)
+        metrics.increment('catalog_searches', source=context.source)
+        if selected_query and selected_query not in names and selected_query in context.queries:
+            names.append(selected_query)
+        # The dropdown filters options by their search text too; matches in SQL or parameters must stay visible
+        options = [{'label': name, 'value': name, 'search': f'{name} {search_value}'} for name in names]
+        if catalog and catalog.get('version') != context.catalog_version:
+            return (options, *reship_catalog(context, catalog, names))
+        shipped = (catalog or {}).get('queries', {})
+        missing = [name for name in names if name not in shipped]
+        if not missing:
+            return options, no_update, no_update
+        patch = Patch()
+        for name, entry in context.catalog(missing)['queries'].items():
+            patch['queries'][name] = entry
+        return options, patch, no_update
+
+    # Switching queries only reads the shipped catalog, in assets/catalog.js; the panel is
+    # rendered again when sync_catalog or a search ships newer catalog entries, and when a
+    # batch switch moves a date parameter between its date picker and the text input
+    app.clientside_callback(
+        ClientsideFunction(namespace='catalog', function_name='render_parameters'),
+        Output({'type': 'param-div', 'index': ALL}, 'style'),
+        Output({'type': 'param-label', 'index': ALL}, 'children'),
+        Output({'type': 'param-text', 'index': ALL}, 'style'),
+        Output({'type': 'param-date-picker', 'index': ALL}, 'style'),
+        Output({'type': 'param', 'index': ALL}, 'value'),
+        Output({'type': 'param-date', 'index': ALL}, 'date'),
+        Output({'type': 'param-batch', 'index': ALL}, 'value'),
+        Input('query-selector', 'value'),
+        Input('catalog-store', 'data'),
+        Input({'type': 'param-batch', 'index': ALL}, 'value'),
+        State({'type': 'param', 'index': ALL}, 'value'),
+        State({'type': 'param-date', 'index': ALL}, 'date')
+    )
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='catalog', function_name='rollup_options'),
+        Output('rollup-date-column', 'options'),
+        Output('rollup-date-column', 'value'),
+        Output('rollup-group-by', 'options'),
+        Output('rollup-group-by', 'value'),
+        Output('rollup-measures', 'options'),
+        Output('rollup-measures', 'value'),
+        Input('query-selector', 'value'),
+        Input('catalog-store', 'data')
+    )
+
+    @app.callback(
+        Output({'type': 'param-options', 'index': MATCH}, 'children'),
+        Input({'type': 'param', 'index': MATCH}, 'value'),
+        State('query-selector', 'value'),
+        State('source-selector', 'value'),
+        prevent_initial_call=True
+    )
+    def suggest_param_values(prefix, selected_query, source):
+        """Offer indexed values starting with the typed text."""
+        context = registry.get(source)
+        params = get_params(context.queries, selected_query)
+        index = callback_context.triggered_id['index']
+        if index >= len(params) or params[index]['type'] != 'text':
+            return []
+        # Inherited parameters are looked up in the tables of the upstream query they come from
+        name = params[index]['name']
+        query_sql = context.queries[param_query(context.queries, selected_query, name)]['template'].sql
+        # Batch entries complete their last comma-separated value
+        head, _, last = (prefix or '').rpartition(',')
+        values = context.param_index.search(name, query_sql, context.config, last.strip())
+        return [html.Option(value=f'{head}, {value}' if head else value) for value in values]
+
+    empty_run = ([], [], {'query': '', 'params': []}, None, 'data-tab', False, no_update, None, None)
+
+    def plan_run(button_id, selected_query, text_values, date_values, batch_flags, custom_sql, source):
+        """Return the source context, query, parameter values and is_file flag of a run, or None."""
+        context = registry.get(source)
+        if button_id == 'run-query' and selected_query:
+            # Get parameters for the selected query
+            params = get_params(context.queries, selected_query)
+            return context, selected_query, collect_param_values(params, text_values, date_values, batch_flags), True
+        if button_id == 'run-custom-sql' and custom_sql:
+            return context, custom_sql, [], False
+        return None
+
+    def plan_rollup(is_file, date_column, bucket, group_by, measures, functions):
+        """Return the rollup of a saved query run, or None; custom SQL is never rolled up."""
+        if not is_file:
+            return None
+        return normalize_rollup({'date_column': date_column, 'bucket': bucket, 'group_by': group_by,
+                                 'measures': measures, 'functions': functions})
+
+    def invalid_run(error):
+        """Keep the current result and tell the user why the run settings were rejected."""
+        return (no_update,) * 5 + (False, no_update, str(error), None)
+
+    def confirm_run(decision, button_id):
+        """Ask the user to confirm a huge fetch."""
+        message = (f"This query is estimated to return about {decision['rows']:,} rows. "
+                   f"Fetch all of them into the browser?")
+        return (no_update,) * 5 + (True, message, None, {'button': button_id})
+
+    def render_run(df, decision, context, query, param_values, is_file, last_query, rollup=None, sample=None):
+        """Turn a query result into the outputs of the run callback."""
+        if is_file and not df.empty:
+            usage_tracker.record(context.source, query, param_values)
+
+        if df.empty:
+            print("DataFrame is empty after query execution.")
+            return empty_run
+
+        notice = None
+        # An upper-bound estimate can overshoot; only flag results that actually hit the limit
+        if decision['row_limit'] and len(df) >= decision['row_limit']:
+            notice = (f"Estimated {decision['rows']:,} rows; showing the first {len(df):,}. "
+                      f"Use the export links for the full result.")
+        if sample:
+            scaled = 'aggregates are scaled to the full table, _se columns hold standard errors' if rollup \
+                else 'roll the result up for scaled aggregates with standard errors'
+            approximate = (f"Approximate result from a {df.attrs.get('sample', sample) * 100:g}% sample; {scaled}. "
+                           f"Exports are exact.")
+            # A large sample can be limited by preflight as well
+            notice = f'{notice} {approximate}' if notice else approximate
+
+        store_data = {
+            'source': context.source,
+            'query': query,
+            'params': param_values,
+            'row_limit': decision['row_limit'],
+            'rollup': rollup,
+            'sample': sample,
+            'fingerprint': fingerprint_result(df)
+        }
+
+        # Rerun of the same query: send only the rows that changed
+        if last_query and all(last_query.get(k) == store_data[k] for k in ('source', 'query', 'params', 'row_limit', 'rollup', 'sample')):
+            diff = diff_result(last_query.get('fingerprint'), df)
+            if diff is not None:
+                if is_unchanged(diff):
+                    return no_update, no_update, store_data, no_update, 'data-tab', False, no_update, notice, None
+                patch = build_result_patch(df, diff)
+                return patch, no_update, store_data, patch, 'data-tab', False, no_update, notice, None
+
+        data = df.to_dict('records')
+        columns = [{'name': col, 'id': col} for col in df.columns]
+
+        return data, columns, store_data, data, 'data-tab', False, no_update, notice, None
+
+    def triggered_run(pending):
+        """Return the button that started a run and whether it was confirmed."""
+        button_id = callback_context.triggered[0]['prop_id'].split('.')[0]
+        # A confirmed huge fetch reruns the action that asked for confirmation
+        if button_id == 'preflight-confirm':
+            return (pending or {}).get('button'), True
+        return button_id, False
+
+    def start_run(run_query_clicks, run_custom_sql_clicks, confirm_clicks, selected_query,
+                  text_values, date_values, batch_flags, custom_sql, last_query, source, pending,
+                  rollup_date, rollup_bucket, rollup_group_by, rollup_measures, rollup_functions, sample_fraction,
+                  refresh_results):
+        """Plan a run from the callback arguments: (outputs, None) if the callback returns early, else (None, plan)."""
+        if not callback_context.triggered:
+            return empty_run, None
+        button_id, confirmed = triggered_run(pending)
+        planned = plan_run(button_id, selected_query, text_values, date_values, batch_flags, custom_sql, source)
+        if planned is None:
+            return empty_run, None
+        context, query, param_values, is_file = planned
+        try:
+            rollup = plan_rollup(is_file, rollup_date, rollup_bucket, rollup_group_by, rollup_measures,
+                                 rollup_functions)
+            sample = normalize_fraction(sample_fraction)
+        except ValueError as e:
+            return invalid_run(e), None
+        return None, {'button_id': button_id, 'confirmed': confirmed, 'context': context, 'query': query,
+                      'param_values': param_values, 'is_file': is_file, 'rollup': rollup, 'sample': sample,
+                      'refresh': 'refresh' in (refresh_results or []), 'last_query': last_query}
+
+    def preflight_run(plan):
+        """Estimate the result size before fetching it.
+
+        Rollups return one row per bucket, while approximate runs without one fetch
+        their sampled rows and are estimated too. Cached results and estimates are
+        reused, so a cached run does not wait for an estimate.
+        """
+        if plan['confirmed'] or plan['rollup'] is not None:
+            return {'action': 'run', 'row_limit': None}
+        context = plan['context']
+        return preflight_query(plan['query'], plan['param_values'], context.config, context.queries, plan['is_file'],
+                               sample=plan['sample'], cache=context.result_cache, refresh=plan['refresh'])
+
+    def execute_arguments(plan, decision):
+        """Positional and keyword arguments of execute_sql_query and its async variant for a run."""
+        context = plan['context']
+        return ((plan['query'], plan['param_values'], context.config, context.queries),
+                {'is_file': plan['is_file'], 'cache': context.result_cache, 'refresh': plan['refresh'],
+                 'row_limit': decision['row_limit'], 'rollup': plan['rollup'], 'sample': plan['sample']})
+
+    def finish_run(plan, decision, df):
+        """Render the result of a planned run."""
+        return render_run(df, decision, plan['context'], plan['query'], plan['param_values'], plan['is_file'],
+                          plan['last_query'], plan['rollup'], plan['sample'])
+
+    def run_queries(*args):
+        """Execute SQL queries and update the results."""
+        try:
+            outputs, plan = start_run(*args)
+            if plan is None:
+                return outputs
+            decision = preflight_run(plan)
+            if decision['action'] == 'confirm':
+                return confirm_run(decision, plan['button_id'])
+            positional, keywords = execute_arguments(plan, decision)
+            return finish_run(plan, decision, execute_sql_query(*positional, **keywords))
+        except Exception as e:
+            print(f"Query execution error: {e}")
+            return empty_run
+
+    async def run_queries_async(*args):
+        """Execute SQL queries without holding a server thread while they run."""
+        try:
+            outputs, plan = start_run(*args)
+            if plan is None:
+                return outputs
+            decision = await asyncio.to_thread(preflight_run, plan)
+            if decision['action'] == 'confirm':
+                return confirm_run(decision, plan['button_id'])
+            positional, keywords = execute_arguments(plan, decision)
+            return finish_run(plan, decision, await execute_sql_query_async(*positional, **keywords))
+        except Exception as e:
+            print(f"Query execution error: {e}")
+            return empty_run
+
+    app.callback(
         Output('query-results-table', 'data'),
         Output('query-results-table', 'columns'),
         Output('last-query-store', 'data'),
         Output('dataframe-store', 'data'),
         Output('tabs', 'value', allow_duplicate=True),
+        Output('preflight-confirm', 'displayed'),
+        Output('preflight-confirm', 'message'),
+        Output('preflight-notice', 'children'),
+        Output('preflight-store', 'data'),
         Input('run-query', 'n_clicks'),
         Input('run-custom-sql', 'n_clicks'),
+        Input('preflight-confirm', 'submit_n_clicks'),
         State('query-selector', 'value'),
         State({'type': 'param', 'index': ALL}, 'value'),
         State({'type': 'param-date', 'index': ALL}, 'date'),
+        State({'type': 'param-batch', 'index': ALL}, 'value'),
         State('custom-sql-input', 'value'),
+        State('last-query-store', 'data'),
+        State('source-selector', 'value'),
+        State('preflight-store', 'data'),
+        State('rollup-date-column', 'value'),
+        State('rollup-bucket', 'value'),
+        State('rollup-group-by', 'value'),
+        State('rollup-measures', 'value'),
+        State('rollup-functions', 'value'),
+        State('sample-fraction', 'value'),
+        State('refresh-results', 'value'),
         prevent_initial_call=True
+    )(run_queries_async if ASYNC_CALLBACKS else run_queries)
+
+    # Each browser tab gets a random id kept in session storage, identifying its speculative runs
+    app.clientside_callback(
+        """
+        function(current) {
+            if (current) { return window.dash_clientside.no_update; }
+            return window.crypto && crypto.randomUUID ? crypto.randomUUID() : String(Math.random()).slice(2);
+        }
+        """,
+        Output('session-id', 'data'),
+        Input('session-id', 'data')
     )
-    def run_queries(run_query_clicks, run_custom_sql_clicks, selected_query, 
-                   text_values, date_values, custom_sql):
-        """Execute SQL queries and update the results."""
-        ctx = callback_context
-        if not ctx.triggered:
-            return [], [], {'query': '', 'params': []}, None, 'data-tab'
 
-        button_id = ctx.triggered[0]['prop_id'].split('.')[0]
+    if SPECULATION_ENABLED:
+        speculator = Speculator(registry)
 
-        try:
-            if button_id == 'run-query' and selected_query:
-                # Get parameters for the selected query
-                params = get_params(queries, selected_query)
-                param_values = {param['name']: date_values[i] if param['type'] == 'date' else text_values[i] for i, param in enumerate(params)}
-                df = execute_sql_query(selected_query, param_values, config, queries)
-                
-            elif button_id == 'run-custom-sql' and custom_sql:
-                df = execute_sql_query(custom_sql, [], config, queries, is_file=False)
-            else:
-                return [], [], {'query': '', 'params': []}, None, 'data-tab'
-
-            if df.empty:
-                print("DataFrame is empty after query execution.")
-                return [], [], {'query': '', 'params': []}, None, 'data-tab'
-
-            data = df.to_dict('records')
-            columns = [{'name': col, 'id': col} for col in df.columns]
-            store_data = {
-                'query': custom_sql if button_id == 'run-custom-sql' else selected_query,
-                'params': [] if button_id == 'run-custom-sql' else param_values
-            }
-            
-            return data, columns, store_data, df.to_json(), 'data-tab'
-            
-        except Exception as e:
-            print(f"Query execution error: {e}")
-            return [], [], {'query': '', 'params': []}, None, 'data-tab'
+        @app.callback(
+            Output('speculation-store', 'data'),
+            Input({'type': 'param', 'index': ALL}, 'value'),
+            Input({'type': 'param-date', 'index': ALL}, 'date'),
+            Input({'type': 'param-batch', 'index': ALL}, 'value'),
+            Input('rollup-date-column', 'value'),
+            Input('rollup-bucket', 'value'),
+            Input('rollup-group-by', 'value'),
+            Input('rollup-measures', 'value'),
+            Input('rollup-functions', 'value'),
+            Input('sample-fraction', 'value'),
+            State('query-selector', 'value'),
+            State('source-selector', 'value'),
+            State('session-id', 'data'),
+            prevent_initial_call=True
+        )
+        def speculate_query(text_values, date_values, batch_flags, rollup_date, rollup_bucket, rollup_group_by,
+                            rollup_measures, rollup_functions, sample_fraction, selected_query, source, session_id):
+            """Prefetch the selected query once its parameters are filled in and stable."""
+            user = session_id or request.remote_addr or 'anonymous'
+            if not selected_query:
+                speculator.cancel(user)
+                return {'query': None, 'scheduled': False}
+            try:
+                context = registry.get(source)
+                params = get_params(context.queries, selected_query)
+                param_values = collect_param_values(params, text_values, date_values, batch_flags)
+                rollup = plan_rollup(True, rollup_date, rollup_bucket, rollup_group_by, rollup_measures,
+                                     rollup_functions)
+                sample = normalize_fraction(sample_fraction)
+            except Exception as e:
+                print(f"Speculation skipped: {e}")
+                speculator.cancel(user)
+                return {'query': selected_query, 'scheduled': False}
+            if not params_complete(param_values):
+                speculator.cancel(user)
+                return {'query': selected_query, 'scheduled': False}
+            speculator.schedule(SpeculativeRun(user, context.source, selected_query, param_values, rollup, sample))
+            return {'query': selected_query, 'scheduled': True}
 
     @app.callback(
-        Output('report-content', 'children'),
+        Output('export-csv-link', 'href'),
+        Output('export-csv-link', 'style'),
+        Output('export-parquet-link', 'href'),
+        Output('export-parquet-link', 'style'),
+        Input('last-query-store', 'data')
+    )
+    def update_export_links(last_query):
+        """Point the export links at the server-side export of the last query."""
+        if not last_query or not last_query.get('query'):
+            hidden = {'display': 'none'}
+            return '', hidden, '', hidden
+        is_file = last_query['query'] in registry.get(last_query.get('source')).queries
+        shown = {'display': 'inline', 'color': '#2563eb'}
+        # Exports of a rolled-up run are rolled up the same way, but read every row rather than a sample
+        rollup = last_query.get('rollup')
+        return (
+            export_url('csv', last_query['source'], last_query['query'], last_query['params'], is_file, rollup), shown,
+            export_url('parquet', last_query['source'], last_query['query'], last_query['params'], is_file, rollup),
+            shown
+        )
+
+    @app.callback(
+        Output('explain-content', 'children'),
         Output('tabs', 'value', allow_duplicate=True),
-        Input('run-report', 'n_clicks'),
-        State('dataframe-store', 'data'),
+        Input('explain-query', 'n_clicks'),
+        Input('explain-custom-sql', 'n_clicks'),
         State('query-selector', 'value'),
+        State({'type': 'param', 'index': ALL}, 'value'),
+        State({'type': 'param-date', 'index': ALL}, 'date'),
+        State({'type': 'param-batch', 'index': ALL}, 'value'),
+        State('custom-sql-input', 'value'),
+        State('source-selector', 'value'),
         prevent_initial_call=True
     )
-    def generate_report(run_report_clicks, df_data, selected_query):
-        """Generate report from DataFrame."""
+    def explain_query(explain_query_clicks, explain_custom_clicks, selected_query,
+                      text_values, date_values, batch_flags, custom_sql, source):
+        """Show the query plan with scan warnings and index suggestions."""
+        button_id = callback_context.triggered[0]['prop_id'].split('.')[0]
+        try:
+            context = registry.get(source)
+            config, queries = context.config, context.queries
+            if button_id == 'explain-query' and selected_query:
+                param_values = collect_param_values(get_params(queries, selected_query), text_values, date_values,
+                                                    batch_flags)
+                statement, args = resolve_statement(selected_query, param_values, config, queries)
+                sql = queries[selected_query]['query']
+                # Composed queries read the upstream results from temporary tables
+                tables = upstream_tables(selected_query, config, queries)
+            elif button_id == 'explain-custom-sql' and custom_sql:
+                statement, args, sql, tables = custom_sql, [], custom_sql, None
+            else:
+                return 'Select a query or enter custom SQL to explain.', 'explain-tab'
+
+            rows = explain_statement(statement, args, config, tables)
+            analysis = analyze_plan(rows, sql, config)
+            return [
+                html.H3('Query Plan', className='text-lg font-semibold mb-2', style={'color': '#1f2937'}),
+                render_plan_tree(build_plan_tree(rows)),
+                html.Div(
+                    [html.P(warning, style={'color': '#b91c1c'}) for warning in analysis['warnings']],
+                    className='mt-4'
+                ),
+                html.H3('Suggested Indexes', className='text-lg font-semibold mt-4 mb-2', style={'color': '#1f2937'})
+                if analysis['suggestions'] else None,
+                html.Pre('\n'.join(analysis['suggestions']), className='bg-gray-100 p-2 rounded text-sm')
+                if analysis['suggestions'] else None
+            ], 'explain-tab'
+        except Exception as e:
+            print(f"Error explaining query: {e}")
+            return f"Error explaining query: {str(e)}", 'explain-tab'
+
+    @app.callback(
+        Output('performance-slowest', 'data'),
+        Output('performance-slowest', 'columns'),
+        Output('performance-frequent', 'data'),
+        Output('performance-frequent', 'columns'),
+        Output('performance-plans', 'data'),
+        Output('performance-plans', 'columns'),
+        Input('tabs', 'value'),
+        Input('refresh-performance', 'n_clicks')
+    )
+    def update_performance(tab, _):
+        """List the slowest and most frequent queries from the query history."""
+        if tab != 'performance-tab':
+            return (no_update,) * 6
+        query_history.flush()
+        summary = query_history.summary()
+        if summary.empty:
+            return [], [], [], [], [], []
+        columns = [{'name': col, 'id': col} for col in summary.columns]
+        slowest = summary.sort_values('p95_ms', ascending=False).head(20)
+        frequent = summary.sort_values('runs', ascending=False).head(20)
+        plans = query_history.captured_plans()
+        plan_columns = [{'name': col, 'id': col} for col in plans.columns]
+        return (slowest.to_dict('records'), columns, frequent.to_dict('records'), columns,
+                plans.to_dict('records'), plan_columns)
+
+    @app.callback(
+        Output('profiling-callbacks', 'data'),
+        Output('profiling-callbacks', 'columns'),
+        Output('profiling-slowest', 'data'),
+        Output('profiling-slowest', 'columns'),
+        Input('tabs', 'value'),
+        Input('refresh-profiling', 'n_clicks')
+    )
+    def update_profiling(tab, _):
+        """List profiled callbacks and their slowest calls with links to the speedscope files."""
+        if tab != 'profiling-tab':
+            return (no_update,) * 4
+        summary = pd.DataFrame(callback_profiles.summary())
+        slowest = pd.DataFrame(callback_profiles.slowest())
+        if summary.empty:
+            return [], [], [], []
+        slowest['peak_mb'] = slowest.pop('peak_bytes') / 1024 / 1024
+        slowest['file'] = slowest['file'].map(lambda name: f'[speedscope](/profiles/{name})')
+        slowest_columns = [
+            {'name': col, 'id': col, 'presentation': 'markdown'} if col == 'file' else {'name': col, 'id': col}
+            for col in slowest.columns
+        ]
+        return (summary.round(1).to_dict('records'), [{'name': col, 'id': col} for col in summary.columns],
+                slowest.round(1).to_dict('records'), slowest_columns)
+
+    def cached_report(context, selected_query, last_query):
+        """Return the report cache key of the current result and its cached report."""
+        key = None
+        if last_query and last_query.get('query') == selected_query:
+            key = report_key(selected_query, last_query.get('fingerprint'))
+        return key, context.report_cache.get(key) if key else None
+
+    def build_report(context, selected_query, df, key):
+        """Create and cache the report components of a result."""
+        report_content = unpack_to_dash(create_report_data(context.source, selected_query, df))
+        if key:
+            context.report_cache.put(key, report_content)
+        return report_content
+
+    def start_report(run_report_clicks, df_data, selected_query, source, last_query):
+        """Return (outputs, None) for a report that needs no build, else (None, build_report arguments)."""
         if run_report_clicks == 0 or not df_data:
-            return '', 'report-tab'
+            return ('', 'report-tab'), None
 
         df = pd.DataFrame.from_records(df_data)
         if df.empty:
-            return 'No data available for report.', 'report-tab'
+            return ('No data available for report.', 'report-tab'), None
+
+        context = registry.get(source)
+        # Reports of the current result may already be cached, e.g. by pre-warming
+        key, report_content = cached_report(context, selected_query, last_query)
+        if report_content is not None:
+            return (report_content, 'report-tab'), None
+        return None, (context, selected_query, df, key)
 
+    def report_error(e):
+        print(f"Error generating report: {e}")
+        return f"Error generating report: {str(e)}", 'report-tab'
+
+    def generate_report(*args):
+        """Generate report from DataFrame."""
         try:
-            # Try to import query-specific report function
-            query_name = selected_query.replace('.sql', '')
-            report_data = None
-            
-            try:
-                report_module = importlib.import_module(f'{config.source}.reports.{query_name}')
-                if hasattr(report_module, 'create_report'):
-                    report_data = report_module.create_report(df)
-            except ImportError:
-                print(f"No custom report module found for {query_name}")
-            
-            # Fallback to df.describe() if no custom report
-            if report_data is None:
-                report_data = df.describe().to_dict()
-                
-            report_content = unpack_to_dash(report_data)
-            return report_content, 'report-tab'
+            outputs, build = start_report(*args)
+            return outputs if build is None else (build_report(*build), 'report-tab')
         except Exception as e:
-            print(f"Error generating report: {e}")
-            return f"Error generating report: {str(e)}", 'report-tab'
+            return report_error(e)
+
+    async def generate_report_async(*args):
+        """Generate report from DataFrame on a worker thread."""
+        try:
+            outputs, build = start_report(*args)
+            return outputs if build is None else (await asyncio.to_thread(build_report, *build), 'report-tab')
+        except Exception as e:
+            return report_error(e)
+
+    app.callback(
+        Output('report-content', 'children'),
+        Output('tabs', 'value', allow_duplicate=True),
+        Input('run-report', 'n_clicks'),
+        State('dataframe-store', 'data'),
+        State('query-selector', 'value'),
+        State('source-selector', 'value'),
+        State('last-query-store', 'data'),
+        prevent_initial_call=True
+    )(generate_report_async if ASYNC_CALLBACKS else generate_report)
 
     @app.callback(
         Output('ydata-profile', 'src'),
@@ -286,8 +793,9 @@ def register_callbacks(app: Dash, config: Config) -> None:
             return {}, 'No data available for plot.', '', '', 'vizroai-tab'
 
         try:
-            res = vizro_ai.plot(df, user_input, return_elements=True)
-            fig = res.get_fig_object(data_frame=df, vizro=False)
+            # With the sandbox on, generated code runs only in its workers, not in VizroAI's validation
+            res = vizro_ai.plot(df, user_input, return_elements=True, validate_code=plot_sandbox.workers <= 0)
+            fig = render_figure(res, df)
             code = f'Generated Code:\n{res.code}'
             insights = f'Chart Insights:\n{res.chart_insights}'
             explanation = f'Code Explanation:\n{res.code_explanation}'
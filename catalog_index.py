@@ -0,0 +1,155 @@
+"""
+Search index over the saved queries of a source.
+
+Sources with thousands of saved queries cannot list them all in the query
+selector. The index maps the words of each query's filename, folders,
+parameter names and SQL text to the queries containing them, and the
+selector asks it for the best matches of what the user types. Words match
+by prefix; every typed word must match. Updates are incremental: only
+queries whose file or parameters changed are tokenized again.
+"""
+
+import os
+import re
+import bisect
+import threading
+from typing import Dict, List, Any, Set, Tuple
+
+# Queries returned per search
+CATALOG_SEARCH_LIMIT = int(os.getenv('CATALOG_SEARCH_LIMIT', '50'))
+
+# Score of a word by where it occurs in a query; a word keeps its best field
+FIELD_WEIGHTS = {'name': 8, 'folder': 4, 'param': 4, 'sql': 1}
+
+# Words of filenames and SQL, e.g. 'stock_prices.sql' -> stock, prices, sql
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+# SQL words that occur in nearly every query and are not indexed
+SQL_STOPWORDS = {
+    'select', 'from', 'where', 'and', 'or', 'not', 'as', 'on', 'in', 'is', 'null', 'join', 'left', 'inner',
+    'outer', 'group', 'by', 'order', 'having', 'limit', 'with', 'case', 'when', 'then', 'else', 'end',
+    'distinct', 'union', 'all', 'asc', 'desc', 'between', 'like', 'sql'
+}
+
+def words(text: str) -> List[str]:
+    """Split text into lowercase words."""
+    return WORD_PATTERN.findall((text or '').lower())
+
+def query_words(name: str, query: Dict[str, Any]) -> Dict[str, int]:
+    """Return the indexed words of a query with their field weights."""
+    folder, _, filename = name.rpartition('/')
+    fields = [
+        ('sql', [word for word in words(query['query']) if word not in SQL_STOPWORDS]),
+        ('param', [word for param in query['params'] for word in words(param['name'])]),
+        ('folder', words(folder)),
+        ('name', [word for word in words(filename) if word != 'sql'])
+    ]
+    weighted: Dict[str, int] = {}
+    for field, field_words in fields:
+        for word in field_words:
+            weighted[word] = max(weighted.get(word, 0), FIELD_WEIGHTS[field])
+    return weighted
+
+def index_key(query: Dict[str, Any]) -> Tuple:
+    """Identity of what the index holds for a query: its file and its parameter names."""
+    return query.get('signature') or query['query'], tuple(param['name'] for param in query['params'])
+
+class CatalogIndex:
+    """Inverted word index over a source's saved queries."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Tuple] = {}
+        self._query_words: Dict[str, Dict[str, int]] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._words: List[str] = []
+        self._names: List[str] = []
+        self._sorted = True
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(self, queries: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Bring the index in line with a loaded query catalog.
+
+        Args:
+            queries (Dict[str, Dict[str, Any]]): Loaded queries by filename.
+
+        Returns:
+            int: Number of queries added, changed or removed.
+        """
+        changed = 0
+        with self._lock:
+            for name in [name for name in self._keys if name not in queries]:
+                self._remove(name)
+                changed += 1
+            for name, query in queries.items():
+                key = index_key(query)
+                if self._keys.get(name) == key:
+                    continue
+                self._remove(name)
+                self._add(name, query, key)
+                changed += 1
+            if changed:
+                self._sorted = False
+        return changed
+
+    def _add(self, name: str, query: Dict[str, Any], key: Tuple) -> None:
+        weighted = query_words(name, query)
+        for word, weight in weighted.items():
+            self._postings.setdefault(word, {})[name] = weight
+        self._query_words[name] = weighted
+        self._keys[name] = key
+
+    def _remove(self, name: str) -> None:
+        for word in self._query_words.pop(name, {}):
+            postings = self._postings[word]
+            del postings[name]
+            if not postings:
+                del self._postings[word]
+        self._keys.pop(name, None)
+
+    def _ensure_sorted(self) -> None:
+        if not self._sorted:
+            self._words = sorted(self._postings)
+            self._names = sorted(self._keys)
+            self._sorted = True
+
+    def _term_scores(self, term: str) -> Dict[str, int]:
+        """Best weight per query of the words starting with a term; whole-word matches count double."""
+        scores: Dict[str, int] = {}
+        start = bisect.bisect_left(self._words, term)
+        for word in self._words[start:]:
+            if not word.startswith(term):
+                break
+            factor = 2 if word == term else 1
+            for name, weight in self._postings[word].items():
+                scores[name] = max(scores.get(name, 0), weight * factor)
+        return scores
+
+    def search(self, text: str, limit: int = CATALOG_SEARCH_LIMIT) -> List[str]:
+        """
+        Return the queries best matching a search text.
+
+        Args:
+            text (str): Words to look for; empty lists queries by filename.
+            limit (int): Maximum number of queries returned.
+
+        Returns:
+            List[str]: Query filenames, best match first, ties by filename.
+        """
+        with self._lock:
+            self._ensure_sorted()
+            terms = list(dict.fromkeys(words(text)))
+            if not terms:
+                return self._names[:limit]
+            totals: Dict[str, int] = {}
+            matched: Set[str] = set()
+            for i, term in enumerate(terms):
+                scores = self._term_scores(term)
+                matched = set(scores) if i == 0 else matched & set(scores)
+                if not matched:
+                    return []
+                for name in matched:
+                    totals[name] = totals.get(name, 0) + scores[name]
+        return sorted(matched, key=lambda name: (-totals[name], name))[:limit]
@@ -0,0 +1,234 @@
+"""
+Headless batch runner for saved queries and reports.
+
+Runs queries without the web application, for example in nightly
+pipelines. Dash is never imported, so startup only pays for pandas and the
+database driver:
+
+    python cli.py run --source example --query stock_prices.sql --params '{"ticker": "AAPL"}' --report
+    python cli.py run --jobs nightly.json --workers 4 --format csv --out exports
+    python cli.py sample --source warehouse
+
+A jobs file is a JSON list of objects with 'query' and optional 'source',
+'params' and 'name' keys. The sample command rebuilds the sample tables a
+source declares in SAMPLE_TABLES for approximate runs.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+import pandas as pd
+from config import init_config
+from db_utils import load_queries, execute_sql_query
+from query_history import query_history
+from result_cache import ResultCache
+from sampling import refresh_sample_table
+
+# Default number of jobs running at once
+CLI_WORKERS = int(os.getenv('CLI_WORKERS', '4'))
+
+def job_name(job: Dict[str, Any]) -> str:
+    """Return the output file stem of a job: its name or the query name plus a parameter hash."""
+    if job.get('name'):
+        return job['name']
+    stem = job['query'].replace('.sql', '')
+    if not job.get('params'):
+        return stem
+    digest = hashlib.sha1(json.dumps(job['params'], sort_keys=True, default=str).encode('utf-8')).hexdigest()[:8]
+    return f'{stem}_{digest}'
+
+def build_jobs(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    Build the job list from a jobs file or the --query/--params options.
+
+    Every --query runs once per --params set, or once without parameters.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+
+    Returns:
+        List[Dict[str, Any]]: Jobs with 'source', 'query', 'params' and 'name' keys.
+    """
+    if args.jobs:
+        with open(args.jobs, 'r') as file:
+            jobs = json.load(file)
+    else:
+        param_sets = [json.loads(p) for p in args.params] or [{}]
+        jobs = [{'query': query, 'params': params} for query in args.query for params in param_sets]
+    for job in jobs:
+        job.setdefault('source', args.source)
+        job.setdefault('params', {})
+        job['name'] = job_name(job)
+    return jobs
+
+class Catalog:
+    """
+    Configs, query catalogs and result caches of the sources used by a run, loaded once each.
+
+    The cache lets jobs reuse the results of saved queries they reference.
+    """
+    def __init__(self):
+        self._sources: Dict[str, tuple] = {}
+
+    def get(self, source: str) -> tuple:
+        if source not in self._sources:
+            config = init_config(source)
+            self._sources[source] = (config, load_queries(config), ResultCache())
+        return self._sources[source]
+
+def write_result(df: pd.DataFrame, path: str, fmt: str) -> None:
+    """Write a result as Parquet or CSV."""
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+def run_job(job: Dict[str, Any], catalog: 'Catalog', out_dir: str, fmt: str, report: bool) -> Dict[str, Any]:
+    """
+    Run one job: execute the query, write its result and optionally its report.
+
+    Args:
+        job (Dict[str, Any]): Job description.
+        catalog (Catalog): Loaded sources.
+        out_dir (str): Output directory.
+        fmt (str): 'parquet' or 'csv'.
+        report (bool): Whether to write the report as HTML.
+
+    Returns:
+        Dict[str, Any]: Job summary with row count, stage timings, files and error.
+    """
+    summary = {'name': job['name'], 'source': job['source'], 'query': job['query'],
+               'rows': 0, 'query_ms': 0.0, 'write_ms': 0.0, 'report_ms': 0.0, 'files': [], 'error': None}
+    try:
+        config, queries, cache = catalog.get(job['source'])
+        if job['query'] not in queries:
+            raise KeyError(f"Query file {job['query']} not found in source {job['source']}")
+        start = time.perf_counter()
+        df = execute_sql_query(job['query'], job['params'], config, queries, cache=cache, origin='batch',
+                               raise_errors=True)
+        summary['query_ms'] = (time.perf_counter() - start) * 1000
+        summary['rows'] = len(df)
+
+        start = time.perf_counter()
+        path = os.path.join(out_dir, f"{job['name']}.{fmt}")
+        # Queries in subfolders of queries/ write to the same subfolders of the output
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_result(df, path, fmt)
+        summary['files'].append(path)
+        summary['write_ms'] = (time.perf_counter() - start) * 1000
+
+        if report and not df.empty:
+            # Report rendering pulls in plotly, so it is only imported when asked for
+            from report_utils import create_report_data, report_to_html
+            start = time.perf_counter()
+            path = os.path.join(out_dir, f"{job['name']}.html")
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(report_to_html(create_report_data(job['source'], job['query'], df), job['name']))
+            summary['files'].append(path)
+            summary['report_ms'] = (time.perf_counter() - start) * 1000
+    except Exception as e:
+        summary['error'] = str(e)
+    return summary
+
+def print_summary(summaries: List[Dict[str, Any]], total_ms: float) -> None:
+    """Print a timing table of the run."""
+    table = pd.DataFrame(summaries)[['name', 'rows', 'query_ms', 'write_ms', 'report_ms', 'error']]
+    print(table.round(1).to_string(index=False))
+    failed = sum(1 for s in summaries if s['error'])
+    print(f'{len(summaries)} jobs, {failed} failed, {total_ms:.0f} ms total')
+
+def run(args: argparse.Namespace) -> int:
+    """
+    Execute the jobs of a run in parallel.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+
+    Returns:
+        int: Exit code; 1 if any job failed.
+    """
+    start = time.perf_counter()
+    jobs = build_jobs(args)
+    if not jobs:
+        print('No jobs to run', file=sys.stderr)
+        return 1
+    os.makedirs(args.out, exist_ok=True)
+
+    # Sources are loaded up front so workers do not import them concurrently
+    catalog = Catalog()
+    for source in dict.fromkeys(job['source'] for job in jobs):
+        try:
+            catalog.get(source)
+        except Exception as e:
+            print(f'Source {source} could not be loaded: {e}', file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=max(args.workers, 1), thread_name_prefix='cli') as pool:
+        summaries = list(pool.map(
+            lambda job: run_job(job, catalog, args.out, args.format, args.report), jobs
+        ))
+    query_history.flush()
+
+    print_summary(summaries, (time.perf_counter() - start) * 1000)
+    return 1 if any(s['error'] for s in summaries) else 0
+
+def refresh_samples(args: argparse.Namespace) -> int:
+    """
+    Rebuild the maintained sample tables of a source.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+
+    Returns:
+        int: Exit code; 1 if the source has no sample tables or a rebuild failed.
+    """
+    config = init_config(args.source)
+    if not config.sample_tables or not config.table_sample_sql:
+        print(f'Source {args.source} needs SAMPLE_TABLES and TABLE_SAMPLE_SQL', file=sys.stderr)
+        return 1
+    conn = config.get_connection()
+    failed = 0
+    try:
+        for table, (sample_table, fraction) in config.sample_tables.items():
+            start = time.perf_counter()
+            try:
+                rows = refresh_sample_table(conn, table, sample_table, fraction, config.table_sample_sql)
+                print(f'{table} -> {sample_table}: {rows:,} rows ({fraction:.1%}) in {(time.perf_counter() - start):.1f} s')
+            except Exception as e:
+                print(f'{table} -> {sample_table} failed: {e}', file=sys.stderr)
+                failed += 1
+    finally:
+        conn.close()
+    return 1 if failed else 0
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Run saved queries and reports without the web application.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='Execute queries and write results')
+    run_parser.add_argument('--source', default='example', help='Source module of jobs without one')
+    run_parser.add_argument('--query', action='append', default=[], help='Query filename; repeatable')
+    run_parser.add_argument('--params', action='append', default=[], help='JSON parameter set; repeatable')
+    run_parser.add_argument('--jobs', help='JSON file with a list of jobs')
+    run_parser.add_argument('--out', default='output', help='Output directory')
+    run_parser.add_argument('--format', choices=['parquet', 'csv'], default='parquet', help='Result file format')
+    run_parser.add_argument('--report', action='store_true', help='Also write each report as HTML')
+    run_parser.add_argument('--workers', type=int, default=CLI_WORKERS, help='Jobs running at once')
+    sample_parser = commands.add_parser('sample', help='Rebuild the sample tables of a source')
+    sample_parser.add_argument('--source', default='example', help='Source module declaring SAMPLE_TABLES')
+    args = parser.parse_args(argv)
+    if args.command == 'run' and not args.jobs and not args.query:
+        parser.error('run needs --query or --jobs')
+    return args
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point."""
+    args = parse_args(argv)
+    sys.exit(refresh_samples(args) if args.command == 'sample' else run(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Response compression and JSON encoding settings for the Flask server.
+
+Callback responses carry table records and plotly figures as JSON, which
+compresses well. Responses above a size threshold are compressed with
+brotli when the optional brotli package is installed and the client accepts
+it, and with gzip otherwise. Streamed responses such as exports are left
+untouched.
+"""
+
+import os
+import gzip
+from flask import Flask, Request, Response, request
+from metrics import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+# gzip level 1-9; brotli uses the matching quality 1-9 of its 0-11 scale
+COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', '5'))
+# plotly JSON engine used for callback payloads: 'orjson', 'json' or 'auto'; unset keeps
+# plotly's default, 'auto', which already uses orjson when it is installed
+JSON_ENGINE = os.getenv('JSON_ENGINE', '')
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/html', 'text/css', 'text/plain', 'text/csv',
+    'application/javascript', 'text/javascript'
+}
+
+def configure_json_engine(engine: str = JSON_ENGINE) -> str:
+    """
+    Select the plotly JSON engine Dash uses to encode callback responses.
+
+    orjson encodes numpy arrays natively and is several times faster than
+    the standard library encoder; without it the 'json' engine is used.
+    The engine is a plotly setting for the whole process, so it is left
+    alone unless an engine is given.
+
+    Args:
+        engine (str): 'orjson', 'json' or 'auto'; empty keeps the current engine.
+
+    Returns:
+        str: The engine in use.
+    """
+    import plotly.io as pio
+    if not engine:
+        return pio.json.config.default_engine
+    try:
+        pio.json.config.default_engine = engine
+    except ValueError as e:
+        print(f'JSON engine {engine} not available, using json: {e}')
+        pio.json.config.default_engine = 'json'
+    return pio.json.config.default_engine
+
+def choose_encoding(req: Request) -> str:
+    """Return 'br', 'gzip' or '' for the client's Accept-Encoding."""
+    accepted = {part.split(';')[0].strip() for part in req.headers.get('Accept-Encoding', '').split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return ''
+
+def compress(data: bytes, encoding: str, level: int = COMPRESSION_LEVEL) -> bytes:
+    """Compress data with 'br' or 'gzip'."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level)
+
+def compress_response(response: Response, min_bytes: int = COMPRESSION_MIN_BYTES) -> Response:
+    """
+    Compress a buffered response if the client accepts it and it is large enough.
+
+    Args:
+        response (Response): Outgoing response.
+        min_bytes (int): Smallest body size worth compressing.
+
+    Returns:
+        Response: The response, compressed in place when applicable.
+    """
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
+    if response.status_code < 200 or response.status_code >= 300 or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request)
+    if not encoding:
+        return response
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+
+    compressed = compress(data, encoding)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    metrics.increment('response_bytes_raw', len(data), encoding=encoding)
+    metrics.increment('response_bytes_sent', len(compressed), encoding=encoding)
+    return response
+
+def register_compression(server: Flask) -> None:
+    """
+    Compress responses of a Flask server.
+
+    Args:
+        server (Flask): The Flask server behind the Dash app.
+    """
+    if COMPRESSION_ENABLED:
+        server.after_request(compress_response)
@@ -6,7 +6,7 @@ This module handles all configuration settings and imports required for the appl
 
 import os
 import importlib
-from typing import Callable, Pattern, Literal
+from typing import Callable, Pattern, Literal, Optional, Dict, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -30,8 +30,16 @@ class Config:
         
         # These will be set by _load_source_config
         self.get_connection: Callable
+        self.get_connection_async: Optional[Callable]
         self.query_param_pattern: Pattern
         self.query_param_replace_mode: Literal['named', 'positional']
+        self.query_paramstyle: str
+        self.explain_prefix: str
+        self.estimate_rows: Optional[Callable]
+        self.param_lookups: Dict[str, Optional[str]]
+        self.date_bucket_sql: Optional[Dict[str, str]]
+        self.table_sample_sql: Optional[str]
+        self.sample_tables: Dict[str, Tuple[str, float]]
         
         self._load_source_config()
     
@@ -46,8 +54,16 @@ class Config:
         try:
             connection_module = importlib.import_module(f'{self.source}.connection')
             self.get_connection = getattr(connection_module, 'get_connection')
+            self.get_connection_async = getattr(connection_module, 'get_connection_async', None)
             self.query_param_pattern = getattr(connection_module, 'QUERY_PARAM_PATTERN')
             self.query_param_replace_mode = getattr(connection_module, 'QUERY_PARAM_REPLACE_MODE')
+            self.query_paramstyle = getattr(connection_module, 'QUERY_PARAMSTYLE', 'qmark')
+            self.explain_prefix = getattr(connection_module, 'EXPLAIN_PREFIX', 'EXPLAIN')
+            self.estimate_rows = getattr(connection_module, 'ESTIMATE_ROWS', None)
+            self.param_lookups = getattr(connection_module, 'PARAM_LOOKUPS', {})
+            self.date_bucket_sql = getattr(connection_module, 'DATE_BUCKET_SQL', None)
+            self.table_sample_sql = getattr(connection_module, 'TABLE_SAMPLE_SQL', None)
+            self.sample_tables = getattr(connection_module, 'SAMPLE_TABLES', {})
         except ImportError as e:
             raise ImportError(f'Failed to import source module {self.source}: {e}')
         except AttributeError as e:
@@ -3,44 +3,402 @@ Database utilities module for handling SQL operations and query management.
 """
 
 import os
+import re
+import time
+import asyncio
+import threading
 import pandas as pd
-from typing import Dict, List, Optional, Any, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Union, Pattern, Tuple, Iterator
 from config import Config
+from metrics import metrics
+from singleflight import SingleFlight
+from result_cache import ResultCache
+from query_history import query_history, sql_hash
+from explain import explain_statement, plan_text, EXPLAIN_THRESHOLD_MS
+from rollup import rollup_statement, rollup_frame, rollup_key
+from sampling import sample_statement, moment_aggregates, moments_frame, estimate_frame
+from query_graph import find_refs, expand_refs, link_queries, ref_table, materialize, drop_materialized, REF_WORKERS
 
-def load_queries(config: Config) -> Dict[str, Dict[str, Any]]:
+# Matches the driver placeholder at the end of a QUERY_PARAM_PATTERN match
+PLACEHOLDER_TOKEN_PATTERN = re.compile(r'(\?|%s|[:$@]\w+)\s*$')
+
+# Result column naming the parameter value a row belongs to in batch runs
+BATCH_COLUMN = 'batch_value'
+
+# Queries selecting every column, which batch runs may rewrite to IN (...)
+SELECT_ALL_PATTERN = re.compile(r'^\s*SELECT\s+\*\s+FROM\b', re.IGNORECASE)
+
+# An unqualified column compared for equality at the end of the SQL before a placeholder, e.g. 'ticker ='
+COLUMN_EQUALS_END_PATTERN = re.compile(r'(?<![\w.])([A-Za-z_]\w*)\s*=\s*$')
+
+# Rows fetched per chunk when streaming results from the cursor
+STREAM_CHUNK_SIZE = 10000
+
+# Run the query and report callbacks as async callbacks (requires dash[async])
+ASYNC_CALLBACKS = os.getenv('ASYNC_CALLBACKS', '0').lower() in ('1', 'true', 'yes')
+
+# Coalesces identical queries that are in flight at the same time
+query_flights = SingleFlight()
+
+# Whitespace runs and the quoted literals and identifiers whose whitespace is kept
+SQL_SPACING_PATTERN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+")
+
+# Run key and connection of the statement each thread is executing, so a run can be interrupted
+_running_statements: Dict[int, Tuple[Tuple, Any]] = {}
+
+class QueryTemplate:
+    """
+    Compiled form of a saved SQL query.
+
+    The template is built once per file. It records where each parameter
+    placeholder sits in the SQL and which parameter feeds it, so repeated
+    parameters are bound once per occurrence. The driver statement is
+    produced at compile time, which keeps its text identical between runs
+    and lets drivers such as sqlite reuse their prepared statement cache.
+
+    Args:
+        sql (str): Raw SQL text of the query.
+        param_pattern (Pattern): Pattern extracting parameter names from the SQL.
+        replace_mode (bool): Whether parameters are substituted into the SQL
+            text instead of being bound by the driver.
+        paramstyle (str): DB-API paramstyle of the source driver.
+    """
+    def __init__(
+        self,
+        sql: str,
+        param_pattern: Pattern,
+        replace_mode: bool = False,
+        paramstyle: str = 'qmark'
+    ):
+        self.sql = sql
+        self.replace_mode = bool(replace_mode)
+        self.paramstyle = paramstyle
+        self.params: List[Dict[str, str]] = []
+        # (start, end, param name) for every placeholder, in SQL order
+        self.placeholders: List[Tuple[int, int, str]] = []
+        # Parameter name -> indexes into self.placeholders
+        self.param_positions: Dict[str, List[int]] = {}
+
+        self._compile(param_pattern)
+
+    def _compile(self, param_pattern: Pattern) -> None:
+        """Locate placeholders and build the driver statement."""
+        for match in param_pattern.finditer(self.sql):
+            param_name = match.group(1)
+            if param_name not in self.param_positions:
+                param_type = 'date' if 'date' in param_name.lower() else 'text'
+                self.params.append({'name': param_name, 'type': param_type})
+                self.param_positions[param_name] = []
+            if not self.replace_mode:
+                span = self._placeholder_span(match)
+                if span is not None:
+                    self.placeholders.append((span[0], span[1], param_name))
+
+        if self.replace_mode:
+            # Replace mode substitutes every quoted occurrence of the parameter name
+            for param_name in self.param_positions:
+                for m in re.finditer(re.escape(f"'{param_name}'"), self.sql):
+                    self.placeholders.append((m.start(), m.end(), param_name))
+
+        self.placeholders.sort()
+        for i, (_, _, param_name) in enumerate(self.placeholders):
+            self.param_positions[param_name].append(i)
+
+        # Split the SQL around placeholders once so runs only join segments
+        self._segments: List[str] = []
+        last = 0
+        for start, end, _ in self.placeholders:
+            self._segments.append(self.sql[last:start])
+            last = end
+        self._segments.append(self.sql[last:])
+
+        self._bind_order = [name for _, _, name in self.placeholders]
+        self.statement = None if self.replace_mode else self._build_statement()
+
+    @staticmethod
+    def _placeholder_span(match: re.Match) -> Optional[Tuple[int, int]]:
+        """Return the span of the placeholder token inside a parameter match."""
+        if 'placeholder' in match.re.groupindex:
+            return match.span('placeholder')
+        token = PLACEHOLDER_TOKEN_PATTERN.search(match.group(0))
+        if token is None:
+            return None
+        return match.start() + token.start(1), match.start() + token.end(1)
+
+    def _build_statement(self) -> str:
+        """Render the SQL with placeholders in the driver's paramstyle."""
+        if self.paramstyle == 'named':
+            markers = [f':{name}' for name in self._bind_order]
+        elif self.paramstyle == 'pyformat':
+            markers = [f'%({name})s' for name in self._bind_order]
+        elif self.paramstyle == 'numeric':
+            numbers = {name: i + 1 for i, name in enumerate(self.param_positions)}
+            markers = [f':{numbers[name]}' for name in self._bind_order]
+        elif self.paramstyle == 'format':
+            markers = ['%s'] * len(self._bind_order)
+        else:
+            markers = ['?'] * len(self._bind_order)
+
+        parts = [self._segments[0]]
+        for marker, segment in zip(markers, self._segments[1:]):
+            parts.append(marker)
+            parts.append(segment)
+        return ''.join(parts)
+
+    def bind(self, values: Dict[str, Any]) -> Tuple[str, Union[List[Any], Dict[str, Any]]]:
+        """
+        Produce a driver-ready statement and arguments for parameter values.
+
+        A list value for one parameter runs the query for every value in the
+        list at once, see bind_batch.
+
+        Args:
+            values (Dict[str, Any]): Parameter values keyed by parameter name.
+
+        Returns:
+            Tuple[str, Union[List[Any], Dict[str, Any]]]: Statement and driver arguments.
+
+        Raises:
+            ValueError: If more than one parameter has a list of values.
+        """
+        batched = [name for name in self.param_positions if isinstance(values.get(name), (list, tuple))]
+        if len(batched) > 1:
+            raise ValueError(f"Only one parameter can be batched, got {', '.join(batched)}")
+        if batched:
+            return self.bind_batch(batched[0], values)
+
+        if self.replace_mode:
+            parts = [self._segments[0]]
+            for name, segment in zip(self._bind_order, self._segments[1:]):
+                value = str(values.get(name, '')).replace("'", "''")
+                parts.append(f"'{value}'")
+                parts.append(segment)
+            return ''.join(parts), []
+
+        if self.paramstyle in ('named', 'pyformat'):
+            return self.statement, {name: values.get(name) for name in self.param_positions}
+        if self.paramstyle == 'numeric':
+            return self.statement, [values.get(name) for name in self.param_positions]
+        return self.statement, [values.get(name) for name in self._bind_order]
+
+    def bind_batch(self, name: str, values: Dict[str, Any]) -> Tuple[str, Union[List[Any], Dict[str, Any]]]:
+        """
+        Bind a list of values for one parameter into a single statement.
+
+        A 'SELECT *' query whose only use of the parameter is 'column = ?' is
+        rewritten to 'column IN (...)' and tagged with that column, whatever
+        the parameter is named. Any other query, including comparisons of
+        qualified columns or expressions, is repeated once per value and
+        combined with UNION ALL. Either way the result gets a BATCH_COLUMN
+        with the value each row belongs to.
+
+        Args:
+            name (str): Name of the batched parameter.
+            values (Dict[str, Any]): Parameter values; values[name] is the list.
+
+        Returns:
+            Tuple[str, Union[List[Any], Dict[str, Any]]]: Statement and driver arguments.
+
+        Raises:
+            ValueError: If the list of values is empty.
+        """
+        batch = list(values[name])
+        if not batch:
+            raise ValueError(f'No values given for batched parameter {name}')
+        segments = list(self._segments)
+        segments[-1] = segments[-1].rstrip().rstrip(';')
+        positions = self.param_positions[name]
+        equals = COLUMN_EQUALS_END_PATTERN.search(segments[positions[0]]) if len(positions) == 1 else None
+
+        if equals and SELECT_ALL_PATTERN.match(self.sql):
+            # Fold the values into the equality predicate; the compared column tags the rows
+            index, column = positions[0], equals.group(1)
+            tokens: List[Any] = []
+            for i, param_name in enumerate(self._bind_order):
+                segment = segments[i]
+                if i == index:
+                    tokens.append(segment[:equals.end(1)] + ' IN (')
+                    for j, value in enumerate(batch):
+                        tokens.extend([', '] if j else [])
+                        tokens.append((f'{name}_{j}', value))
+                    tokens.append(')')
+                else:
+                    tokens.extend([segment, (param_name, values.get(param_name))])
+            tokens.append(segments[-1])
+            return self._render([f'SELECT batched.{column} AS {BATCH_COLUMN}, batched.* FROM ('] + tokens + [') AS batched'])
+
+        tokens = []
+        for j, value in enumerate(batch):
+            tokens.extend([' UNION ALL '] if j else [])
+            tokens.extend(['SELECT ', (f'{name}_{j}', value), f' AS {BATCH_COLUMN}, batched.* FROM ('])
+            for i, param_name in enumerate(self._bind_order):
+                bound = (f'{name}_{j}', value) if param_name == name else (param_name, values.get(param_name))
+                tokens.extend([segments[i], bound])
+            tokens.extend([segments[-1], ') AS batched'])
+        return self._render(tokens)
+
+    def _render(self, tokens: List[Any]) -> Tuple[str, Union[List[Any], Dict[str, Any]]]:
+        """Join SQL text and (key, value) bind tokens into a statement in the driver's paramstyle."""
+        parts: List[str] = []
+        if self.replace_mode:
+            for token in tokens:
+                if isinstance(token, tuple):
+                    token = "'" + str('' if token[1] is None else token[1]).replace("'", "''") + "'"
+                parts.append(token)
+            return ''.join(parts), []
+
+        keys = list(dict.fromkeys(token[0] for token in tokens if isinstance(token, tuple)))
+        args: Union[List[Any], Dict[str, Any]] = {} if self.paramstyle in ('named', 'pyformat') else []
+        for token in tokens:
+            if not isinstance(token, tuple):
+                parts.append(token)
+                continue
+            key, value = token
+            if self.paramstyle == 'named':
+                parts.append(f':{key}')
+                args[key] = value
+            elif self.paramstyle == 'pyformat':
+                parts.append(f'%({key})s')
+                args[key] = value
+            elif self.paramstyle == 'numeric':
+                parts.append(f':{keys.index(key) + 1}')
+            else:
+                parts.append('%s' if self.paramstyle == 'format' else '?')
+                args.append(value)
+        if self.paramstyle == 'numeric':
+            bound = {token[0]: token[1] for token in tokens if isinstance(token, tuple)}
+            args = [bound[key] for key in keys]
+        return ''.join(parts), args
+
+def compile_query(query: str, config: Config) -> QueryTemplate:
+    """
+    Compile SQL text into a QueryTemplate using the source settings.
+
+    Args:
+        query (str): Raw SQL text.
+        config (Config): Configuration instance containing parameter settings.
+
+    Returns:
+        QueryTemplate: The compiled template.
+    """
+    return QueryTemplate(
+        query,
+        config.query_param_pattern,
+        replace_mode=config.query_param_replace_mode,
+        paramstyle=config.query_paramstyle
+    )
+
+def query_files(queries_path: str) -> Iterator[Tuple[str, str, os.stat_result]]:
+    """
+    Yield the saved query files under a folder, including its subfolders.
+
+    Args:
+        queries_path (str): Queries folder of a source.
+
+    Yields:
+        Tuple[str, str, os.stat_result]: Query filename relative to the folder with
+            '/' separators, e.g. 'risk/var.sql', its path and its stat.
     """
-    Load SQL queries from files and extract their parameters.
+    for folder, dirs, files in os.walk(queries_path):
+        dirs[:] = sorted(name for name in dirs if not name.startswith(('.', '__')))
+        relative = os.path.relpath(folder, queries_path)
+        prefix = '' if relative == '.' else relative.replace(os.sep, '/') + '/'
+        for filename in sorted(files):
+            if filename.endswith('.sql'):
+                path = os.path.join(folder, filename)
+                yield prefix + filename, path, os.stat(path)
+
+def load_queries(config: Config, previous: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Load SQL queries from files and compile them into templates.
     
     Args:
         config (Config): Configuration instance containing paths and settings.
+        previous (Optional[Dict[str, Dict[str, Any]]]): Queries loaded before; files
+            that have not changed since keep their compiled template.
     
     Returns:
-        Dict[str, Dict[str, Any]]: Dictionary of queries and their parameters.
+        Dict[str, Dict[str, Any]]: Dictionary of queries, their parameters and templates.
     """
     queries = {}
-    param_pattern = config.query_param_pattern
+    previous = previous or {}
 
-    for filename in os.listdir(config.queries_path):
-        if filename.endswith('.sql'):
-            try:
-                with open(os.path.join(config.queries_path, filename), 'r') as file:
-                    query = file.read()
+    for filename, path, stat in query_files(config.queries_path):
+        signature = (stat.st_mtime_ns, stat.st_size)
+        known = previous.get(filename)
+        if known is not None and known.get('signature') == signature:
+            queries[filename] = {
+                'query': known['query'],
+                'params': known['template'].params,
+                'template': known['template'],
+                'refs': known['refs'],
+                'signature': signature
+            }
+            continue
+        try:
+            with open(path, 'r') as file:
+                query = file.read()
 
-                    # Extract unique parameter names using a set
-                    seen_params = set()
-                    param_details = []
-                    for match in param_pattern.finditer(query):
-                        param_name = match.group(1)
-                        if param_name not in seen_params:
-                            seen_params.add(param_name)
-                            param_type = 'date' if 'date' in param_name.lower() else 'text'
-                            param_details.append({'name': param_name, 'type': param_type})
+            # References to other saved queries read from temporary tables
+            template = compile_query(expand_refs(query), config)
+            queries[filename] = {
+                'query': query,
+                'params': template.params,
+                'template': template,
+                'refs': find_refs(query),
+                'signature': signature
+            }
 
-                    queries[filename] = {'query': query, 'params': param_details}
+        except Exception as e:
+            print(f'{filename} not loaded due to error: {e}')
+    return link_queries(queries)
+
+def result_columns(query: str, config: Config, queries: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    Return the column names of a saved query without fetching rows.
 
-            except Exception as e:
-                print(f'{filename} not loaded due to error: {e}')
-    return queries
+    Args:
+        query (str): Query filename.
+        config (Config): Configuration instance for database connection.
+        queries (Dict[str, Dict[str, Any]]): Dictionary of loaded queries.
+
+    Returns:
+        List[str]: Result column names.
+    """
+    params = {param['name']: None for param in get_params(queries, query)}
+    statement, args = resolve_statement(query, params, config, queries)
+    # Composed queries read temporary tables; empty ones with the upstream columns suffice here
+    upstream = upstream_tables(query, config, queries)
+    conn = config.get_connection()
+    try:
+        for table, frame in upstream.items():
+            materialize(conn, table, frame, config.query_paramstyle)
+        cursor = conn.cursor()
+        cursor.execute(limit_statement(statement, 0), args)
+        return [desc[0] for desc in cursor.description or []]
+    finally:
+        if upstream:
+            drop_materialized(conn, list(upstream))
+        conn.close()
+
+def upstream_tables(query: str, config: Config, queries: Dict[str, Dict[str, Any]]) -> Dict[str, pd.DataFrame]:
+    """
+    Return empty stand-ins for the temporary tables a composed query reads.
+
+    They carry the upstream result columns, which is enough to compile the
+    query, e.g. to probe its columns or EXPLAIN it.
+
+    Args:
+        query (str): Query filename.
+        config (Config): Configuration instance for database connection.
+        queries (Dict[str, Dict[str, Any]]): Dictionary of loaded queries.
+
+    Returns:
+        Dict[str, pd.DataFrame]: Empty frames by temporary table name; empty for plain queries.
+    """
+    refs = queries[query].get('refs') or []
+    return {ref_table(ref): pd.DataFrame(columns=result_columns(ref, config, queries)) for ref in refs}
 
 def get_params(queries: Dict[str, Dict[str, Any]], query_name: str) -> List[Dict[str, str]]:
     """
@@ -55,12 +413,360 @@ def get_params(queries: Dict[str, Dict[str, Any]], query_name: str) -> List[Dict
     """
     return queries[query_name]['params'] if query_name in queries else []
 
+def resolve_statement(
+    query: str,
+    params: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    queries: Dict[str, Dict[str, Any]],
+    is_file: bool = True
+) -> Tuple[str, Union[List[Any], Dict[str, Any]]]:
+    """
+    Resolve a query filename or SQL string into a driver statement and arguments.
+    
+    Args:
+        query (str): SQL query or query filename.
+        params (Union[List[Any], Dict[str, Any]]): Query parameters as list or dict.
+        config (Config): Configuration instance containing parameter settings.
+        queries (Dict[str, Dict[str, Any]]): Dictionary of loaded queries.
+        is_file (bool): Whether query is a filename (True) or SQL string (False).
+    
+    Returns:
+        Tuple[str, Union[List[Any], Dict[str, Any]]]: Statement and driver arguments.
+        
+    Raises:
+        KeyError: If the query file is not in the loaded queries.
+    """
+    if is_file:
+        if query not in queries:
+            raise KeyError(f"Query file {query} not found.")
+        template = queries[query]['template']
+        if isinstance(params, dict):
+            return template.bind(params)
+        return template.statement or template.sql, params
+    if isinstance(params, dict):
+        return compile_query(query, config).bind(params)
+    return query, params
+
+def limit_statement(statement: str, row_limit: int) -> str:
+    """
+    Wrap a statement so it returns at most row_limit rows.
+    
+    Args:
+        statement (str): Driver statement.
+        row_limit (int): Maximum number of rows.
+    
+    Returns:
+        str: The limited statement; placeholders keep their order.
+    """
+    inner = statement.strip().rstrip(';')
+    return f'SELECT * FROM ({inner}) AS limited LIMIT {int(row_limit)}'
+
+def _start_run(query: str, params: Union[List[Any], Dict[str, Any]], config: Config,
+               is_file: bool, origin: str) -> Dict[str, Any]:
+    """Create the query history entry of a run."""
+    return {
+        'source': config.source,
+        'query_name': query if is_file else None,
+        'sql_hash': None if is_file else sql_hash(query),
+        'params': params,
+        'origin': origin,
+        'cache_hit': False,
+        'coalesced': False
+    }
+
+def _prepare_statement(
+    query: str,
+    params: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    queries: Dict[str, Dict[str, Any]],
+    is_file: bool,
+    row_limit: Optional[int],
+    run: Dict[str, Any],
+    rollup: Optional[Dict[str, Any]] = None,
+    sample: Optional[float] = None
+) -> Optional[Tuple[str, Union[List[Any], Dict[str, Any]]]]:
+    """Resolve the driver statement of a run, recording unknown queries and unsampleable SQL in the history."""
+    try:
+        statement, args, fraction = _driver_statement(query, params, config, queries, is_file, row_limit,
+                                                      rollup, sample)
+    except (KeyError, ValueError) as e:
+        print(e.args[0])
+        run['error'] = e.args[0]
+        query_history.record({**run, 'total_ms': 0.0, 'rows': 0})
+        return None
+    if sample:
+        run['sample'] = fraction
+    return statement, args
+
+def _driver_statement(
+    query: str,
+    params: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    queries: Dict[str, Dict[str, Any]],
+    is_file: bool,
+    row_limit: Optional[int],
+    rollup: Optional[Dict[str, Any]],
+    sample: Optional[float]
+) -> Tuple[str, Union[List[Any], Dict[str, Any]], Optional[float]]:
+    """Build the statement a run executes: resolved, sampled, rolled up and limited, with the sample fraction."""
+    statement, args = resolve_statement(query, params, config, queries, is_file)
+    fraction = None
+    if sample:
+        statement, fraction = sample_statement(statement, sample, config.table_sample_sql, config.sample_tables)
+    if rollup and pushes_down(rollup, config):
+        # Sampled rollups select the moments estimate_frame scales to the full table
+        aggregates = moment_aggregates(rollup) if sample else None
+        statement = rollup_statement(statement, rollup, config.date_bucket_sql, aggregates)
+    if row_limit:
+        statement = limit_statement(statement, row_limit)
+    return statement, args, fraction
+
+def _cached_result(cache: Optional[ResultCache], key: Tuple, refresh: bool, config: Config,
+                   origin: str, run: Dict[str, Any]) -> Optional[pd.DataFrame]:
+    """Return a cached result of the run, if any."""
+    if cache is None or refresh:
+        return None
+    cached = cache.get(key)
+    if cached is None:
+        metrics.increment('result_cache_misses', source=config.source, origin=origin)
+        return None
+    metrics.increment('result_cache_hits', source=config.source, origin=origin)
+    run['cache_hit'] = True
+    return cached.copy(deep=False)
+
+def _store_result(df: pd.DataFrame, stages: Dict[str, Any], coalesced: bool, cache: Optional[ResultCache],
+                  key: Tuple, cache_ttl: Optional[float], config: Config, origin: str,
+                  run: Dict[str, Any]) -> pd.DataFrame:
+    """Fill the cache with a fresh result and return the caller's copy."""
+    run.update(stages)
+    if coalesced:
+        metrics.increment('query_coalesced_waiters', source=config.source, origin=origin)
+        run['coalesced'] = True
+        return df.copy(deep=False)
+    if cache is not None and not df.empty:
+        cache.put(key, df, ttl=cache_ttl)
+        return df.copy(deep=False)
+    return df
+
+def pushes_down(rollup: Dict[str, Any], config: Config) -> bool:
+    """Return whether the source can compute a rollup in SQL."""
+    return bool(config.date_bucket_sql) and rollup['bucket'] in config.date_bucket_sql
+
+def _apply_rollup(df: pd.DataFrame, rollup: Dict[str, Any], cache: Optional[ResultCache], key: Tuple,
+                  cache_ttl: Optional[float], config: Config, sample: Optional[float] = None) -> pd.DataFrame:
+    """Return the rollup of a run, aggregating the full result in pandas unless SQL already did."""
+    pushed = pushes_down(rollup, config)
+    metrics.increment('rollup_runs', source=config.source, mode='sql' if pushed else 'pandas')
+    if df.empty:
+        return df
+    if pushed:
+        return estimate_frame(df, rollup, sample) if sample else df
+    # The rollup is cached per bucket next to the full result it was computed from
+    rolled_key = key + ('rollup', rollup_key(rollup))
+    cached = cache.get(rolled_key) if cache is not None else None
+    if cached is not None:
+        return cached.copy(deep=False)
+    try:
+        rolled = estimate_frame(moments_frame(df, rollup), rollup, sample) if sample else rollup_frame(df, rollup)
+    except KeyError as e:
+        print(e.args[0])
+        return pd.DataFrame()
+    if cache is not None and not rolled.empty:
+        cache.put(rolled_key, rolled, ttl=cache_ttl)
+    return rolled
+
+def _run_key(query: str, statement: str, args: Union[List[Any], Dict[str, Any]], config: Config,
+             queries: Dict[str, Dict[str, Any]], is_file: bool) -> Tuple:
+    """Return the cache and coalescing key of a run."""
+    key = query_key(config.source, statement, args)
+    if is_file and queries.get(query, {}).get('upstream'):
+        # Composed queries read temporary tables, so their results change with the upstream SQL
+        key += (queries[query]['version'],)
+    return key
+
+def run_key(
+    query: str,
+    params: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    queries: Dict[str, Dict[str, Any]],
+    is_file: bool = True,
+    row_limit: Optional[int] = None,
+    rollup: Optional[Dict[str, Any]] = None,
+    sample: Optional[float] = None
+) -> Optional[Tuple]:
+    """
+    Return the key execute_sql_query caches and coalesces a run under.
+
+    Args:
+        query (str): SQL query or query filename.
+        params (Union[List[Any], Dict[str, Any]]): Query parameters as list or dict.
+        config (Config): Configuration instance for database connection.
+        queries (Dict[str, Dict[str, Any]]): Dictionary of loaded queries.
+        is_file (bool): Whether query is a filename (True) or SQL string (False).
+        row_limit (Optional[int]): Row limit of the run.
+        rollup (Optional[Dict[str, Any]]): Normalized rollup of the run.
+        sample (Optional[float]): Sample fraction of the run.
+
+    Returns:
+        Optional[Tuple]: The key, or None if the run cannot be prepared.
+    """
+    try:
+        statement, args, _ = _driver_statement(query, params, config, queries, is_file, row_limit, rollup, sample)
+    except (KeyError, ValueError):
+        return None
+    return _run_key(query, statement, args, config, queries, is_file)
+
+def upstream_results(
+    query: str,
+    params: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    queries: Dict[str, Dict[str, Any]],
+    cache: Optional[ResultCache],
+    origin: str,
+    cache_ttl: Optional[float],
+    raise_errors: bool = False,
+    refresh: bool = False
+) -> Dict[str, pd.DataFrame]:
+    """
+    Run the saved queries a query references and return their results by temporary table.
+
+    Independent references run in parallel. Each goes through execute_sql_query,
+    so shared upstream queries are coalesced, cached and reused; with refresh
+    they skip the cache too, so a refreshed result is fresh all the way up.
+
+    Raises:
+        ValueError: If a referenced query fails; with raise_errors the message
+            includes the referenced query's error.
+    """
+    refs = queries[query]['refs']
+    values = params if isinstance(params, dict) else {}
+
+    def run_ref(ref: str) -> pd.DataFrame:
+        ref_values = {param['name']: values.get(param['name']) for param in queries[ref]['params']}
+        try:
+            return execute_sql_query(ref, ref_values, config, queries, cache=cache, origin=origin, refresh=refresh,
+                                     cache_ttl=cache_ttl, raise_errors=raise_errors)
+        except RuntimeError as e:
+            raise ValueError(f'Referenced query {ref} failed: {e}')
+
+    if len(refs) == 1:
+        results = [run_ref(refs[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(refs), REF_WORKERS), thread_name_prefix='ref') as pool:
+            results = list(pool.map(run_ref, refs))
+    # Failed runs return a frame without columns
+    failed = [ref for ref, df in zip(refs, results) if len(df.columns) == 0]
+    if failed:
+        raise ValueError(f"Referenced query failed: {', '.join(failed)}")
+    return {ref_table(ref): df for ref, df in zip(refs, results)}
+
+def _finish_run(run: Dict[str, Any], start: float, df: pd.DataFrame, statement: str,
+                args: Union[List[Any], Dict[str, Any]], config: Config,
+                refs: Optional[Dict[str, pd.DataFrame]] = None) -> None:
+    """Complete the history entry of a run, capturing the plan of slow runs."""
+    run['total_ms'] = (time.perf_counter() - start) * 1000
+    run['rows'] = len(df)
+    if EXPLAIN_THRESHOLD_MS and run['total_ms'] >= EXPLAIN_THRESHOLD_MS \
+            and not (run['cache_hit'] or run['coalesced'] or run.get('error')):
+        try:
+            # Composed queries are planned over empty upstream tables with the same columns
+            tables = {table: frame.iloc[:0] for table, frame in (refs or {}).items()}
+            run['plan'] = plan_text(explain_statement(statement, args, config, tables))
+        except Exception as e:
+            print(f"Plan capture error: {e}")
+    run['bytes'] = int(df.memory_usage(index=False).sum()) if not df.empty else 0
+    query_history.record(run)
+
+class _QueryRun:
+    """
+    Steps of one execute_sql_query run shared by the sync and async variants.
+
+    The variants differ only in how they wait for upstream results and the
+    statement; preparing, caching, rolling up and recording the run is here.
+    """
+    def __init__(self, query: str, params: Union[List[Any], Dict[str, Any]], config: Config,
+                 queries: Dict[str, Dict[str, Any]], is_file: bool, cache: Optional[ResultCache], origin: str,
+                 refresh: bool, cache_ttl: Optional[float], rollup: Optional[Dict[str, Any]],
+                 sample: Optional[float], raise_errors: bool):
+        self.query, self.params, self.config, self.queries, self.is_file = query, params, config, queries, is_file
+        self.cache, self.origin, self.refresh, self.cache_ttl = cache, origin, refresh, cache_ttl
+        self.rollup, self.sample, self.raise_errors = rollup, sample, raise_errors
+        self.start = time.perf_counter()
+        self.run = _start_run(query, params, config, is_file, origin)
+        self.statement: Optional[str] = None
+        self.args: Union[List[Any], Dict[str, Any], None] = None
+        self.key: Optional[Tuple] = None
+        self.refs: Optional[Dict[str, pd.DataFrame]] = None
+
+    def prepare(self, row_limit: Optional[int]) -> bool:
+        """Resolve the statement and key; False if the run cannot go ahead."""
+        prepared = _prepare_statement(self.query, self.params, self.config, self.queries, self.is_file, row_limit,
+                                      self.run, self.rollup, self.sample)
+        if prepared is None:
+            if self.raise_errors:
+                raise RuntimeError(self.run['error'])
+            return False
+        self.statement, self.args = prepared
+        self.key = _run_key(self.query, self.statement, self.args, self.config, self.queries, self.is_file)
+        return True
+
+    def cached(self) -> Optional[pd.DataFrame]:
+        return _cached_result(self.cache, self.key, self.refresh, self.config, self.origin, self.run)
+
+    @property
+    def composed(self) -> bool:
+        return self.is_file and bool(self.queries[self.query].get('refs'))
+
+    def upstream_args(self) -> Tuple:
+        """Arguments of upstream_results for this run."""
+        return (self.query, self.params, self.config, self.queries, self.cache, self.origin, self.cache_ttl,
+                self.raise_errors, self.refresh)
+
+    def upstream_failed(self, error: ValueError) -> pd.DataFrame:
+        """Record a failed referenced query; raises with raise_errors."""
+        print(error.args[0])
+        query_history.record({**self.run, 'error': error.args[0], 'total_ms': 0.0, 'rows': 0})
+        if self.raise_errors:
+            raise RuntimeError(error.args[0])
+        return pd.DataFrame()
+
+    def store(self, df: pd.DataFrame, stages: Dict[str, Any], coalesced: bool) -> pd.DataFrame:
+        return _store_result(df, stages, coalesced, self.cache, self.key, self.cache_ttl, self.config, self.origin,
+                             self.run)
+
+    def shape(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Apply the rollup and sample fraction to a fetched or cached result."""
+        if self.rollup:
+            df = _apply_rollup(df, self.rollup, self.cache, self.key, self.cache_ttl, self.config,
+                               self.run.get('sample'))
+        if self.sample:
+            df.attrs['sample'] = self.run['sample']
+        return df
+
+    def finish(self, df: pd.DataFrame) -> None:
+        """Record the run in the query history."""
+        _finish_run(self.run, self.start, df, self.statement, self.args, self.config, self.refs)
+
+    def result(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Return the result, raising a statement error with raise_errors."""
+        if self.raise_errors and self.run.get('error'):
+            raise RuntimeError(self.run['error'])
+        return df
+
 def execute_sql_query(
     query: str, 
     params: Union[List[Any], Dict[str, Any]], 
     config: Config,
     queries: Dict[str, Dict[str, Any]],
-    is_file: bool = True
+    is_file: bool = True,
+    cache: Optional[ResultCache] = None,
+    origin: str = 'user',
+    refresh: bool = False,
+    cache_ttl: Optional[float] = None,
+    row_limit: Optional[int] = None,
+    rollup: Optional[Dict[str, Any]] = None,
+    sample: Optional[float] = None,
+    raise_errors: bool = False
 ) -> pd.DataFrame:
     """
     Execute a SQL query and return the results as a DataFrame.
@@ -71,40 +777,317 @@ def execute_sql_query(
         config (Config): Configuration instance for database connection.
         queries (Dict[str, Dict[str, Any]]): Dictionary of loaded queries.
         is_file (bool): Whether query is a filename (True) or SQL string (False).
+        cache (Optional[ResultCache]): Result cache to read from and fill.
+        origin (str): Who asked for the run ('user' or 'warmup'), used as metrics label.
+        refresh (bool): Skip the cache lookup and store a fresh result.
+        cache_ttl (Optional[float]): Seconds the stored result stays valid.
+        row_limit (Optional[int]): Return at most this many rows.
+        rollup (Optional[Dict[str, Any]]): Normalized time-bucket rollup to apply, in SQL
+            when the source supports it and on the fetched result otherwise.
+        sample (Optional[float]): Read this fraction of the first base table for an
+            approximate result; rollups are then scaled with standard errors.
+        raise_errors (bool): Raise failures instead of returning an empty DataFrame.
     
     Returns:
         pd.DataFrame: Query results as a DataFrame.
+
+    Raises:
+        RuntimeError: With raise_errors, if the query, a query it references or
+            its statement fails.
     """
     # Check if query is empty
     if not query:
         print("Query is None or empty.")
         return pd.DataFrame()
 
-    # Get query from file if needed
-    if is_file:
-        if query not in queries:
-            print(f"Query file {query} not found.")
-            return pd.DataFrame()
-        query = queries[query]['query']
+    query_run = _QueryRun(query, params, config, queries, is_file, cache, origin, refresh, cache_ttl, rollup,
+                          sample, raise_errors)
+    if not query_run.prepare(row_limit):
+        return pd.DataFrame()
+    df = query_run.cached()
+    if df is None:
+        if query_run.composed:
+            try:
+                query_run.refs = upstream_results(*query_run.upstream_args())
+            except ValueError as e:
+                return query_run.upstream_failed(e)
+        statement, args, refs, key = query_run.statement, query_run.args, query_run.refs, query_run.key
+        # Identical queries already in flight share one execution
+        (df, stages), coalesced = query_flights.do(
+            key, lambda: _run_statement(statement, args, config, origin, refs, key)
+        )
+        df = query_run.store(df, stages, coalesced)
+    df = query_run.shape(df)
+    query_run.finish(df)
+    return query_run.result(df)
 
-    # Convert params to appropriate format
-    if isinstance(params, dict):
-        if config.query_param_replace_mode:
-            for param, value in params.items():
-                query = query.replace(f"'{param}'", f"'{value}'")
-            params = []
+async def execute_sql_query_async(
+    query: str,
+    params: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    queries: Dict[str, Dict[str, Any]],
+    is_file: bool = True,
+    cache: Optional[ResultCache] = None,
+    origin: str = 'user',
+    refresh: bool = False,
+    cache_ttl: Optional[float] = None,
+    row_limit: Optional[int] = None,
+    rollup: Optional[Dict[str, Any]] = None,
+    sample: Optional[float] = None,
+    raise_errors: bool = False
+) -> pd.DataFrame:
+    """
+    Async variant of execute_sql_query.
+
+    Uses the source's get_connection_async() when it provides one and runs the
+    blocking get_connection() path on a worker thread otherwise. Cache,
+    coalescing and query history behave as in execute_sql_query.
+
+    Args:
+        query (str): SQL query to execute or query filename.
+        params (Union[List[Any], Dict[str, Any]]): Query parameters as list or dict.
+        config (Config): Configuration instance for database connection.
+        queries (Dict[str, Dict[str, Any]]): Dictionary of loaded queries.
+        is_file (bool): Whether query is a filename (True) or SQL string (False).
+        cache (Optional[ResultCache]): Result cache to read from and fill.
+        origin (str): Who asked for the run ('user' or 'warmup'), used as metrics label.
+        refresh (bool): Skip the cache lookup and store a fresh result.
+        cache_ttl (Optional[float]): Seconds the stored result stays valid.
+        row_limit (Optional[int]): Return at most this many rows.
+        rollup (Optional[Dict[str, Any]]): Normalized time-bucket rollup to apply.
+        sample (Optional[float]): Fraction of the first base table to read for an approximate result.
+        raise_errors (bool): Raise failures instead of returning an empty DataFrame.
+
+    Returns:
+        pd.DataFrame: Query results as a DataFrame.
+
+    Raises:
+        RuntimeError: With raise_errors, if the query, a query it references or
+            its statement fails.
+    """
+    if not query:
+        print("Query is None or empty.")
+        return pd.DataFrame()
+
+    query_run = _QueryRun(query, params, config, queries, is_file, cache, origin, refresh, cache_ttl, rollup,
+                          sample, raise_errors)
+    if not query_run.prepare(row_limit):
+        return pd.DataFrame()
+    df = query_run.cached()
+    if df is None:
+        if query_run.composed:
+            try:
+                query_run.refs = await asyncio.to_thread(upstream_results, *query_run.upstream_args())
+            except ValueError as e:
+                return query_run.upstream_failed(e)
+        statement, args, refs = query_run.statement, query_run.args, query_run.refs
+        if config.get_connection_async is not None and refs is None:
+            run_statement = lambda: _run_statement_async(statement, args, config, origin)
         else:
-            params = list(params.values())
+            # Temporary tables of referenced queries are loaded through the blocking connection
+            run_statement = lambda: asyncio.to_thread(_run_statement, statement, args, config, origin, refs)
+        (df, stages), coalesced = await query_flights.do_async(query_run.key, run_statement)
+        df = query_run.store(df, stages, coalesced)
+    df = query_run.shape(df)
+    if EXPLAIN_THRESHOLD_MS:
+        # Plan capture runs a blocking EXPLAIN, keep it off the event loop
+        await asyncio.to_thread(query_run.finish, df)
+    else:
+        query_run.finish(df)
+    return query_run.result(df)
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside quoted literals and identifiers and drop a trailing semicolon."""
+    normalized = SQL_SPACING_PATTERN.sub(lambda match: match.group() if match.group()[0] in '\'"' else ' ', sql)
+    return normalized.strip().rstrip(';').rstrip()
+
+def query_key(source: str, statement: str, args: Union[List[Any], Dict[str, Any]]) -> Tuple:
+    """
+    Build the identity of a query run from its source, SQL and arguments.
     
+    Args:
+        source (str): Source name.
+        statement (str): Driver statement.
+        args (Union[List[Any], Dict[str, Any]]): Driver arguments.
+    
+    Returns:
+        Tuple: Hashable key identifying the run.
+    """
+    if isinstance(args, dict):
+        args = sorted(args.items())
+    return source, normalize_sql(statement), repr(list(args or []))
+
+def _run_statement(
+    statement: str,
+    args: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    origin: str = 'user',
+    refs: Optional[Dict[str, pd.DataFrame]] = None,
+    key: Optional[Tuple] = None
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Execute a driver statement on a new connection and return a DataFrame with stage timings.
+
+    Results of referenced queries in refs are loaded into temporary tables first.
+    Runs with a key can be stopped with interrupt_run() while they execute.
+    """
+    start = time.perf_counter()
+    stages: Dict[str, Any] = {'error': None}
+    metrics.increment('query_executions', source=config.source, origin=origin)
+
     # Get connection
     conn = config.get_connection()
+    connected = time.perf_counter()
+    stages['connect_ms'] = (connected - start) * 1000
+    thread_id = threading.get_ident()
+    if key is not None:
+        _running_statements[thread_id] = (key, conn)
     
     # Execute query
     try:
-        df = pd.read_sql_query(query, conn, params=params)
-        return df
+        for table, frame in (refs or {}).items():
+            materialize(conn, table, frame, config.query_paramstyle)
+        df = pd.read_sql_query(statement, conn, params=args)
+        return df, stages
     except Exception as e:
         print(f"Query execution error: {e}")
-        return pd.DataFrame()
+        metrics.increment('query_errors', source=config.source, origin=origin)
+        stages['error'] = str(e)
+        return pd.DataFrame(), stages
+    finally:
+        _running_statements.pop(thread_id, None)
+        if refs:
+            drop_materialized(conn, list(refs))
+        conn.close()
+        stages['execute_ms'] = (time.perf_counter() - connected) * 1000
+        metrics.observe('query_duration_seconds', time.perf_counter() - start, source=config.source, origin=origin)
+
+def interrupt_run(thread_id: int, key: Tuple) -> bool:
+    """
+    Interrupt the statement a thread is executing, if it is the expected run.
+
+    Only drivers whose connections have interrupt() (sqlite3) or cancel()
+    can be interrupted, and runs that other callers wait on are left alone.
+    The interrupted run fails and its result is not cached.
+
+    Args:
+        thread_id (int): threading.get_ident() of the thread running the query.
+        key (Tuple): run_key of the run to interrupt; a thread that has moved on
+            to another statement is left alone.
+
+    Returns:
+        bool: True if the statement was interrupted.
+    """
+    running = _running_statements.get(thread_id)
+    if running is None or running[0] != key:
+        return False
+    _, conn = running
+    if query_flights.waiting(key):
+        return False
+    interrupt = getattr(conn, 'interrupt', None) or getattr(conn, 'cancel', None)
+    if interrupt is None:
+        return False
+    try:
+        interrupt()
+        return True
+    except Exception as e:
+        print(f"Error interrupting query: {e}")
+        return False
+
+async def _run_statement_async(
+    statement: str,
+    args: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    origin: str = 'user'
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Execute a driver statement on a connection from get_connection_async()."""
+    start = time.perf_counter()
+    stages: Dict[str, Any] = {'error': None}
+    metrics.increment('query_executions', source=config.source, origin=origin)
+
+    conn = await config.get_connection_async()
+    connected = time.perf_counter()
+    stages['connect_ms'] = (connected - start) * 1000
+
+    try:
+        cursor = await conn.execute(statement, args)
+        rows = await cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description or []]
+        return pd.DataFrame.from_records(rows, columns=columns), stages
+    except Exception as e:
+        print(f"Query execution error: {e}")
+        metrics.increment('query_errors', source=config.source, origin=origin)
+        stages['error'] = str(e)
+        return pd.DataFrame(), stages
+    finally:
+        await conn.close()
+        stages['execute_ms'] = (time.perf_counter() - connected) * 1000
+        metrics.observe('query_duration_seconds', time.perf_counter() - start, source=config.source, origin=origin)
+
+def stream_sql_query(
+    query: str,
+    params: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    queries: Dict[str, Dict[str, Any]],
+    is_file: bool = True,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    cache: Optional[ResultCache] = None,
+    rollup: Optional[Dict[str, Any]] = None
+) -> Iterator[Tuple[List[str], List[tuple]]]:
+    """
+    Execute a SQL query and yield its rows in chunks straight from the cursor.
+    
+    Only one chunk is held in memory at a time, so memory use does not grow
+    with the size of the result. A rolled-up result holds one row per bucket
+    and is computed whole before it is chunked.
+    
+    Args:
+        query (str): SQL query to execute or query filename.
+        params (Union[List[Any], Dict[str, Any]]): Query parameters as list or dict.
+        config (Config): Configuration instance for database connection.
+        queries (Dict[str, Dict[str, Any]]): Dictionary of loaded queries.
+        is_file (bool): Whether query is a filename (True) or SQL string (False).
+        chunk_size (int): Number of rows fetched per chunk.
+        cache (Optional[ResultCache]): Result cache serving referenced queries.
+        rollup (Optional[Dict[str, Any]]): Normalized rollup of the result.
+    
+    Yields:
+        Tuple[List[str], List[tuple]]: Column names and a chunk of rows. An empty
+            result yields the column names once with no rows.
+        
+    Raises:
+        KeyError: If the query file is not in the loaded queries.
+        ValueError: If a referenced query fails.
+        RuntimeError: If a rolled-up query fails.
+    """
+    if rollup:
+        df = execute_sql_query(query, params, config, queries, is_file, cache=cache, origin='export',
+                               rollup=rollup, raise_errors=True)
+        columns = list(df.columns)
+        rows = list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+        yield columns, rows[:chunk_size]
+        for start in range(chunk_size, len(rows), chunk_size):
+            yield columns, rows[start:start + chunk_size]
+        return
+    statement, args = resolve_statement(query, params, config, queries, is_file)
+    refs = {}
+    if is_file and queries[query].get('refs'):
+        refs = upstream_results(query, params, config, queries, cache, 'export', None)
+    conn = config.get_connection()
+    try:
+        for table, frame in refs.items():
+            materialize(conn, table, frame, config.query_paramstyle)
+        cursor = conn.cursor()
+        cursor.execute(statement, args)
+        columns = [desc[0] for desc in cursor.description or []]
+        rows = cursor.fetchmany(chunk_size)
+        yield columns, rows
+        while rows:
+            rows = cursor.fetchmany(chunk_size)
+            if rows:
+                yield columns, rows
+        cursor.close()
     finally:
-        conn.close() 
\ No newline at end of file
+        if refs:
+            drop_materialized(conn, list(refs))
+        conn.close()
@@ -1,10 +1,23 @@
-import sqlite3
 import re
+from rollup import SQLITE_DATE_BUCKETS
+from sampling import SQLITE_TABLE_SAMPLE
+from sqlite_connections import SQLiteConnectionFactory
 
 QUERY_PARAM_PATTERN = re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?')
 QUERY_PARAM_REPLACE_MODE = False
+DATE_BUCKET_SQL = SQLITE_DATE_BUCKETS
+TABLE_SAMPLE_SQL = SQLITE_TABLE_SAMPLE
+
+connections = SQLiteConnectionFactory('sample_data.db', anchor=__file__)
+
 def get_connection():
 
-    conn = sqlite3.connect('example/sample_data.db')
-    
-    return conn
\ No newline at end of file
+    return connections.connect()
+
+async def get_connection_async():
+
+    return await connections.connect_async()
+
+def release_connections():
+
+    connections.release()
@@ -0,0 +1,4 @@
+SELECT ticker, MIN(price) AS low, MAX(price) AS high, AVG(price) AS average, COUNT(*) AS days
+FROM {{ ref('stock_prices') }}
+WHERE date >= ?
+GROUP BY ticker;
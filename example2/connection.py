@@ -1,10 +1,15 @@
-import sqlite3
 import re
+from sqlite_connections import SQLiteConnectionFactory
 
 QUERY_PARAM_PATTERN = re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?')
 QUERY_PARAM_REPLACE_MODE = False
+
+connections = SQLiteConnectionFactory('../example/sample_data.db', anchor=__file__)
+
 def get_connection():
 
-    conn = sqlite3.connect('example/sample_data.db')
-    
-    return conn
\ No newline at end of file
+    return connections.connect()
+
+def release_connections():
+
+    connections.release()
@@ -0,0 +1,233 @@
+"""
+Query plan capture and index advice.
+
+Runs the driver's EXPLAIN for a statement, turns the plan into a tree, flags
+full table scans on large tables and suggests indexes for the predicate
+columns found by the source's QUERY_PARAM_PATTERN.
+"""
+
+import os
+import re
+import sqlite3
+from typing import Dict, List, Any, Set, Union, Optional
+import pandas as pd
+from config import Config
+from query_graph import materialize, drop_materialized
+from sampling import clause_froms, STRING_LITERAL_PATTERN
+
+# Tables with more rows than this are flagged when fully scanned
+EXPLAIN_LARGE_TABLE_ROWS = int(os.getenv('EXPLAIN_LARGE_TABLE_ROWS', '10000'))
+
+# Runs slower than this many milliseconds get their plan captured; 0 disables capture
+EXPLAIN_THRESHOLD_MS = float(os.getenv('EXPLAIN_THRESHOLD_MS', '0'))
+
+# Matches sqlite full scans, e.g. 'SCAN stock_prices' or 'SCAN TABLE stock_prices'
+SCAN_PATTERN = re.compile(r'^SCAN (?:TABLE )?(\w+)\b(?! USING (?:COVERING )?INDEX)', re.IGNORECASE)
+
+# Table references with optional alias, e.g. 'FROM stock_prices AS s', 'JOIN t b' or ', sectors'
+TABLE_REF_PATTERN = re.compile(r'(?:\bFROM|\bJOIN|,)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+# JOIN keywords, each followed by a table reference
+JOIN_PATTERN = re.compile(r'\bJOIN\b', re.IGNORECASE)
+
+# Parentheses, commas and the keywords that start or end the table list of a FROM clause
+FROM_LIST_TOKEN_PATTERN = re.compile(
+    r'\(|\)|,|\b(?:SELECT|FROM|WHERE|GROUP|ORDER|HAVING|LIMIT|UNION|EXCEPT|INTERSECT|WINDOW)\b', re.IGNORECASE
+)
+
+SQL_KEYWORDS = {
+    'where', 'join', 'left', 'right', 'inner', 'outer', 'full', 'cross', 'natural', 'on', 'using',
+    'group', 'order', 'limit', 'having', 'union', 'except', 'intersect', 'window', 'as', 'select', 'from'
+}
+
+def from_list_commas(sql: str) -> Set[int]:
+    """Return the positions of the commas separating tables in FROM clauses, not select lists or arguments."""
+    masked = STRING_LITERAL_PATTERN.sub(lambda match: ' ' * len(match.group()), sql)
+    froms = clause_froms(sql)
+    in_list = [False]
+    commas = set()
+    for token in FROM_LIST_TOKEN_PATTERN.finditer(masked):
+        word = token.group().upper()
+        if word == '(':
+            in_list.append(False)
+        elif word == ')':
+            if len(in_list) > 1:
+                in_list.pop()
+        elif word == ',':
+            if in_list[-1]:
+                commas.add(token.start())
+        else:
+            in_list[-1] = word == 'FROM' and token.start() in froms
+    return commas
+
+def table_aliases(sql: str) -> Dict[str, str]:
+    """
+    Map table aliases (and table names) in SQL to table names.
+
+    Args:
+        sql (str): SQL text.
+
+    Returns:
+        Dict[str, str]: Alias or table name -> table name.
+    """
+    # FROM inside function arguments and commas outside FROM clauses do not start table references
+    starts = clause_froms(sql) | from_list_commas(sql) | {match.start() for match in JOIN_PATTERN.finditer(sql)}
+    aliases = {}
+    for start in sorted(starts):
+        match = TABLE_REF_PATTERN.match(sql, start)
+        if match is None:
+            continue
+        table, alias = match.group(1), match.group(2)
+        if table.lower() in SQL_KEYWORDS:
+            continue
+        aliases.setdefault(table, table)
+        if alias and alias.lower() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+def scanned_tables(rows: List[Dict[str, Any]], sql: str) -> List[str]:
+    """
+    Return the tables a plan scans fully, resolving aliases.
+
+    Args:
+        rows (List[Dict[str, Any]]): Plan rows from explain_statement.
+        sql (str): SQL text the plan belongs to.
+
+    Returns:
+        List[str]: Unique table names in plan order.
+    """
+    aliases = table_aliases(sql)
+    names = [m.group(1) for m in (SCAN_PATTERN.match(row['detail']) for row in rows) if m]
+    return list(dict.fromkeys(aliases.get(name, name) for name in names))
+
+def _is_sqlite(conn: Any) -> bool:
+    return isinstance(conn, sqlite3.Connection)
+
+def explain_statement(
+    statement: str,
+    args: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    tables: Optional[Dict[str, pd.DataFrame]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Run the driver's EXPLAIN for a statement.
+
+    Uses 'EXPLAIN QUERY PLAN' for sqlite and the source's EXPLAIN_PREFIX
+    (default 'EXPLAIN') for other drivers.
+
+    Args:
+        statement (str): Driver statement.
+        args (Union[List[Any], Dict[str, Any]]): Driver arguments.
+        config (Config): Configuration instance for database connection.
+        tables (Optional[Dict[str, pd.DataFrame]]): Temporary tables the statement
+            reads, e.g. the upstream tables of a composed query; they are created
+            on the connection before EXPLAIN and dropped after it.
+
+    Returns:
+        List[Dict[str, Any]]: Plan rows with 'id', 'parent' and 'detail' keys.
+    """
+    conn = config.get_connection()
+    try:
+        for table, frame in (tables or {}).items():
+            materialize(conn, table, frame, config.query_paramstyle)
+        cursor = conn.cursor()
+        if _is_sqlite(conn):
+            cursor.execute(f'EXPLAIN QUERY PLAN {statement}', args)
+            return [{'id': row[0], 'parent': row[1], 'detail': row[3]} for row in cursor.fetchall()]
+
+        cursor.execute(f'{config.explain_prefix} {statement}', args)
+        return [{'id': i + 1, 'parent': 0, 'detail': ' '.join(str(v) for v in row)}
+                for i, row in enumerate(cursor.fetchall())]
+    finally:
+        if tables:
+            drop_materialized(conn, list(tables))
+        conn.close()
+
+def build_plan_tree(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Nest plan rows under their parents.
+
+    Args:
+        rows (List[Dict[str, Any]]): Plan rows from explain_statement.
+
+    Returns:
+        List[Dict[str, Any]]: Root nodes with 'detail' and 'children' keys.
+    """
+    nodes = {row['id']: {'detail': row['detail'], 'children': []} for row in rows}
+    roots = []
+    for row in rows:
+        parent = nodes.get(row['parent'])
+        (parent['children'] if parent is not None else roots).append(nodes[row['id']])
+    return roots
+
+def table_rows(conn: Any, table: str) -> Optional[int]:
+    """Return a cheap row count estimate for a sqlite table."""
+    try:
+        estimate = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0]
+        return int(estimate or 0)
+    except sqlite3.Error:
+        return None
+
+def _table_columns(conn: Any, table: str) -> List[str]:
+    try:
+        return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")').fetchall()]
+    except sqlite3.Error:
+        return []
+
+def analyze_plan(
+    rows: List[Dict[str, Any]],
+    sql: str,
+    config: Config,
+    large_table_rows: int = EXPLAIN_LARGE_TABLE_ROWS
+) -> Dict[str, List[str]]:
+    """
+    Flag full scans and suggest indexes for predicate columns.
+
+    Args:
+        rows (List[Dict[str, Any]]): Plan rows from explain_statement.
+        sql (str): SQL text the plan belongs to, searched with QUERY_PARAM_PATTERN.
+        config (Config): Configuration instance for database connection.
+        large_table_rows (int): Row count above which a scanned table is flagged.
+
+    Returns:
+        Dict[str, List[str]]: 'warnings' about scans and 'suggestions' of
+            CREATE INDEX statements.
+    """
+    warnings: List[str] = []
+    suggestions: List[str] = []
+    predicates = list(dict.fromkeys(m.group(1) for m in config.query_param_pattern.finditer(sql)))
+    scanned = scanned_tables(rows, sql)
+    if not scanned:
+        return {'warnings': warnings, 'suggestions': suggestions}
+
+    conn = config.get_connection()
+    try:
+        sqlite = _is_sqlite(conn)
+        for table in scanned:
+            size = table_rows(conn, table) if sqlite else None
+            if size is not None and size > large_table_rows:
+                warnings.append(f'Full scan of {table} (~{size:,} rows)')
+            elif size is None:
+                warnings.append(f'Full scan of {table}')
+
+            columns = _table_columns(conn, table) if sqlite else []
+            index_columns = [col for col in predicates if not columns or col in columns]
+            if index_columns:
+                suggestions.append(
+                    f"CREATE INDEX idx_{table}_{'_'.join(index_columns)} ON {table} ({', '.join(index_columns)});"
+                )
+    finally:
+        conn.close()
+    return {'warnings': warnings, 'suggestions': suggestions}
+
+def plan_text(rows: List[Dict[str, Any]]) -> str:
+    """Render plan rows as an indented text tree."""
+    lines = []
+
+    def walk(nodes, depth):
+        for node in nodes:
+            lines.append(f"{'  ' * depth}{node['detail']}")
+            walk(node['children'], depth + 1)
+
+    walk(build_plan_tree(rows), 0)
+    return '\n'.join(lines)
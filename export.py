@@ -0,0 +1,223 @@
+"""
+Server-side export of full query results.
+
+Results are streamed from the database cursor as chunked CSV or Parquet, so
+large exports go neither through the Dash callback layer nor the browser.
+Custom SQL is only exported with a token the app signs into its own export
+links, so a link crafted elsewhere cannot make the server run arbitrary SQL.
+"""
+
+import io
+import os
+import csv
+import hmac
+import json
+import hashlib
+import secrets
+from urllib.parse import urlencode
+from typing import Dict, List, Any, Iterator, Optional
+from flask import Flask, Response, request, stream_with_context
+from db_utils import stream_sql_query
+from rollup import normalize_rollup
+from sources import SourceRegistry
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+# Key signing custom SQL export links; set it when several server processes serve the app
+EXPORT_TOKEN_SECRET = os.getenv('EXPORT_TOKEN_SECRET') or secrets.token_hex(32)
+
+def export_token(source: str, sql: str) -> str:
+    """Return the token authorizing the export of a custom SQL statement."""
+    message = f'{source}\0{sql}'.encode('utf-8')
+    return hmac.new(EXPORT_TOKEN_SECRET.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object collecting bytes until they are drained."""
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        """Return and forget the bytes written since the last drain."""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def iter_csv(chunks: Iterator) -> Iterator[bytes]:
+    """
+    Encode streamed result chunks as CSV.
+
+    Args:
+        chunks (Iterator): Column names and row chunks from stream_sql_query.
+
+    Yields:
+        bytes: Encoded CSV data, one piece per chunk.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for columns, rows in chunks:
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+def _column_array(pa, name: str, values: List[Any], field: Any = None) -> Any:
+    """
+    Arrow array of a column's values, cast to the column's field once the schema is fixed.
+
+    Without a field the type is inferred, and columns that are empty or mixed
+    become strings. Values that do not fit a fixed type are written as strings
+    for string columns and as nulls otherwise.
+    """
+    try:
+        array = pa.array(values)
+        if field is None:
+            return array if not pa.types.is_null(array.type) else array.cast(pa.string())
+        return array.cast(field.type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        pass
+    if field is None or pa.types.is_string(field.type):
+        return pa.array([None if value is None else str(value) for value in values], pa.string())
+    fitted = []
+    for value in values:
+        try:
+            fitted.append(pa.array([value]).cast(field.type)[0].as_py())
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            fitted.append(None)
+    print(f"Parquet export: values of column {name} that do not fit {field.type} are written as null")
+    return pa.array(fitted, field.type)
+
+def iter_parquet(chunks: Iterator) -> Iterator[bytes]:
+    """
+    Encode streamed result chunks as Parquet, one row group per chunk.
+
+    The schema is fixed by the first chunk, so memory stays at one chunk
+    however long the result is. Column types are inferred from its values;
+    columns with only nulls in it, which the driver description does not
+    type, default to string. Later chunks are cast to the schema.
+
+    Args:
+        chunks (Iterator): Column names and row chunks from stream_sql_query.
+
+    Yields:
+        bytes: Encoded Parquet data, one piece per chunk plus the footer.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for columns, rows in chunks:
+        values = list(zip(*rows)) if rows else [[] for _ in columns]
+        if writer is None:
+            table = pa.Table.from_arrays([_column_array(pa, name, list(v)) for name, v in zip(columns, values)],
+                                         names=columns)
+            writer = pq.ParquetWriter(sink, table.schema)
+        else:
+            table = pa.Table.from_arrays([_column_array(pa, field.name, list(v), field)
+                                          for field, v in zip(writer.schema, values)], schema=writer.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+def export_url(fmt: str, source: str, query: str, params: Any, is_file: bool = True,
+               rollup: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build the export URL for a query run.
+
+    Args:
+        fmt (str): Export format, one of EXPORT_FORMATS.
+        source (str): Source name.
+        query (str): Query filename or SQL string.
+        params (Any): Query parameter values.
+        is_file (bool): Whether query is a filename (True) or SQL string (False).
+        rollup (Optional[Dict[str, Any]]): Rollup of the run; the export is rolled up the same way.
+
+    Returns:
+        str: Relative export URL.
+    """
+    args = {'source': source, 'query' if is_file else 'sql': query}
+    if params:
+        args['params'] = json.dumps(params)
+    if rollup:
+        args['rollup'] = json.dumps(rollup)
+    if not is_file:
+        args['token'] = export_token(source, query)
+    return f'/export/{fmt}?{urlencode(args)}'
+
+def register_export_routes(server: Flask, registry: SourceRegistry) -> None:
+    """
+    Register the streaming export route on the Flask server.
+
+    Args:
+        server (Flask): The Flask server behind the Dash application.
+        registry (SourceRegistry): Registry of the sources served by the application.
+    """
+    @server.route('/export/<fmt>')
+    def export_query(fmt: str) -> Response:
+        """Stream the full result of a saved or custom query, rolled up when the link carries a rollup."""
+        if fmt not in EXPORT_FORMATS:
+            return Response(f'Unsupported export format: {fmt}', status=400)
+        if fmt == 'parquet':
+            try:
+                import pyarrow.parquet  # noqa: F401
+            except ImportError:
+                return Response('Parquet export requires pyarrow', status=501)
+
+        query = request.args.get('query')
+        sql = request.args.get('sql')
+        if not query and not sql:
+            return Response('No query given', status=400)
+        if sql and not hmac.compare_digest(request.args.get('token', ''),
+                                           export_token(request.args.get('source'), sql)):
+            return Response('Custom SQL exports need a link from the app', status=403)
+
+        try:
+            context = registry.get(request.args.get('source'))
+            params: Optional[Dict[str, Any]] = json.loads(request.args.get('params') or 'null')
+            # Custom SQL is never rolled up
+            rollup = normalize_rollup(json.loads(request.args.get('rollup') or 'null')) if query else None
+            chunks = stream_sql_query(
+                query or sql, params or [], context.config, context.queries, is_file=bool(query),
+                cache=context.result_cache, rollup=rollup
+            )
+            # Start the query before sending headers so errors become a proper status
+            first = next(chunks)
+        except (ValueError, KeyError) as e:
+            return Response(str(e), status=400)
+        except Exception as e:
+            print(f"Export error: {e}")
+            return Response(f'Export failed: {e}', status=500)
+
+        def all_chunks():
+            yield first
+            yield from chunks
+
+        encode = iter_csv if fmt == 'csv' else iter_parquet
+        name = (query or 'custom_sql').rsplit('.', 1)[0].rsplit('/', 1)[-1]
+        return Response(
+            stream_with_context(encode(all_chunks())),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={'Content-Disposition': f'attachment; filename="{name}.{fmt}"'}
+        )
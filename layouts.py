@@ -3,8 +3,8 @@ Layout components for the Dash application.
 """
 
 from dash import html, dcc, dash_table
-from db_utils import load_queries, get_params
-from config import Config
+from sources import SourceRegistry
+from sampling import SAMPLE_FRACTIONS
 
 def create_sidebar_section(title: str, children: list) -> html.Div:
     """Create a styled sidebar section."""
@@ -44,20 +44,154 @@ def create_input(id: dict, placeholder: str = '', className: str = '') -> dcc.In
         }
     )
 
-def create_layout(config: Config) -> html.Div:
+def create_data_table(id: str) -> dash_table.DataTable:
+    """Create a styled read-only table for summary data."""
+    return dash_table.DataTable(
+        id=id,
+        page_size=20,
+        sort_action='native',
+        style_table={'overflowX': 'auto'},
+        style_cell={'textAlign': 'left', 'padding': '8px', 'backgroundColor': 'white', 'color': 'black'},
+        style_header={
+            'backgroundColor': 'rgb(240, 242, 245)',
+            'fontWeight': 'bold',
+            'border': '1px solid #e2e8f0',
+            'color': '#1f2937'
+        },
+        style_data={'border': '1px solid #e2e8f0'}
+    )
+
+def create_dropdown(id: str, placeholder: str, multi: bool = False, options: list = None, value=None) -> dcc.Dropdown:
+    """Create a styled dropdown."""
+    return dcc.Dropdown(
+        id=id,
+        options=options or [],
+        value=value,
+        multi=multi,
+        placeholder=placeholder,
+        className='mb-2 text-sm',
+        style={'color': 'black', 'backgroundColor': 'white'}
+    )
+
+def create_rollup_controls() -> html.Details:
+    """Create the controls for rolling a time series up into day, week or month buckets."""
+    return html.Details(
+        className='mt-4',
+        children=[
+            html.Summary('Rollup', className='text-sm font-medium cursor-pointer mb-2', style={'color': '#1f2937'}),
+            create_dropdown('rollup-date-column', 'Date column'),
+            create_dropdown(
+                'rollup-bucket', 'No rollup',
+                options=[{'label': bucket.title(), 'value': bucket} for bucket in ('day', 'week', 'month')]
+            ),
+            create_dropdown('rollup-group-by', 'Series columns', multi=True),
+            create_dropdown('rollup-measures', 'Measures', multi=True),
+            create_dropdown(
+                'rollup-functions', 'Aggregates', multi=True,
+                options=[{'label': function.upper(), 'value': function} for function in ('avg', 'sum', 'min', 'max', 'count')],
+                value=['avg']
+            )
+        ]
+    )
+
+def create_sample_control() -> dcc.Dropdown:
+    """Create the toggle between exact runs and approximate runs over a sample."""
+    return create_dropdown(
+        'sample-fraction', 'Exact results',
+        options=[{'label': f'Approximate: {fraction * 100:g}% sample', 'value': fraction}
+                 for fraction in SAMPLE_FRACTIONS]
+    )
+
+def create_refresh_control() -> dcc.Checklist:
+    """Create the option to skip cached results and run the query against the database."""
+    return dcc.Checklist(
+        id='refresh-results',
+        options=[{'label': ' Skip cached results', 'value': 'refresh'}],
+        value=[],
+        style={'color': '#1f2937'},
+        inputStyle={'marginRight': '5px'}
+    )
+
+def create_explain_tab() -> dcc.Tab:
+    """Create the tab showing query plans and index advice."""
+    return dcc.Tab(
+        label='Explain',
+        value='explain-tab',
+        className='py-2 px-4',
+        selected_className='border-b-2 border-blue-500 text-blue-500',
+        style={'backgroundColor': 'white', 'color': '#1f2937'},
+        selected_style={'backgroundColor': 'white', 'color': '#3b82f6'},
+        children=[
+            html.Div(id='explain-content', className='p-2', style={'color': '#1f2937'})
+        ]
+    )
+
+def create_performance_tab() -> dcc.Tab:
+    """Create the tab listing the slowest and most frequent queries."""
+    return dcc.Tab(
+        label='Query Performance',
+        value='performance-tab',
+        className='py-2 px-4',
+        selected_className='border-b-2 border-blue-500 text-blue-500',
+        style={'backgroundColor': 'white', 'color': '#1f2937'},
+        selected_style={'backgroundColor': 'white', 'color': '#3b82f6'},
+        children=[
+            html.Div(
+                className='space-y-4',
+                children=[
+                    create_button('Refresh', 'refresh-performance', 'mt-2'),
+                    html.H3('Slowest Queries (p95)', className='text-lg font-semibold mt-4', style={'color': '#1f2937'}),
+                    create_data_table('performance-slowest'),
+                    html.H3('Most Frequent Queries', className='text-lg font-semibold mt-4', style={'color': '#1f2937'}),
+                    create_data_table('performance-frequent'),
+                    html.H3('Captured Plans of Slow Runs', className='text-lg font-semibold mt-4', style={'color': '#1f2937'}),
+                    create_data_table('performance-plans')
+                ]
+            )
+        ]
+    )
+
+def create_profiling_tab() -> dcc.Tab:
+    """Create the tab listing callback profiles and their peak allocations."""
+    return dcc.Tab(
+        label='Profiling',
+        value='profiling-tab',
+        className='py-2 px-4',
+        selected_className='border-b-2 border-blue-500 text-blue-500',
+        style={'backgroundColor': 'white', 'color': '#1f2937'},
+        selected_style={'backgroundColor': 'white', 'color': '#3b82f6'},
+        children=[
+            html.Div(
+                className='space-y-4',
+                children=[
+                    create_button('Refresh', 'refresh-profiling', 'mt-2'),
+                    html.P(
+                        'Set CALLBACK_PROFILING=1, send an X-Profile: 1 header or set the '
+                        'profile_callbacks=1 cookie to profile callbacks.',
+                        className='text-sm mt-2', style={'color': '#4b5563'}
+                    ),
+                    html.H3('Callbacks', className='text-lg font-semibold mt-4', style={'color': '#1f2937'}),
+                    create_data_table('profiling-callbacks'),
+                    html.H3('Slowest Calls', className='text-lg font-semibold mt-4', style={'color': '#1f2937'}),
+                    create_data_table('profiling-slowest')
+                ]
+            )
+        ]
+    )
+
+def create_layout(registry: SourceRegistry) -> html.Div:
     """
     Create the main application layout.
     
+    Query options are filled by callbacks once a source is selected, so no
+    source is initialized while the layout is built.
+    
     Args:
-        config (Config): The application configuration instance.
+        registry (SourceRegistry): Registry of the sources served by the application.
         
     Returns:
         html.Div: The main application layout.
     """
-    # Load queries for this configuration
-    queries_dict = load_queries(config)
-    max_params = max(len(query['params']) for query in queries_dict.values()) if queries_dict else 0
-    
     return html.Div(
         className='flex h-screen bg-gray-100',
         style={
@@ -68,6 +202,11 @@ def create_layout(config: Config) -> html.Div:
             # Stores for state management
             dcc.Store(id='last-query-store'),
             dcc.Store(id='dataframe-store'),
+            dcc.Store(id='preflight-store'),
+            dcc.Store(id='catalog-store'),
+            dcc.Store(id='session-id', storage_type='session'),
+            dcc.Store(id='speculation-store'),
+            dcc.ConfirmDialog(id='preflight-confirm'),
             
             # Main container
             html.Div(
@@ -125,10 +264,23 @@ def create_layout(config: Config) -> html.Div:
                                     create_sidebar_section(
                                         "Select Query",
                                         [
+                                            dcc.Dropdown(
+                                                id='source-selector',
+                                                options=[{'label': s, 'value': s} for s in registry.sources],
+                                                value=registry.default_source,
+                                                clearable=False,
+                                                className='mb-4',
+                                                style={
+                                                    'display': 'block' if len(registry.sources) > 1 else 'none',
+                                                    'color': 'black',
+                                                    'backgroundColor': 'white'
+                                                }
+                                            ),
                                             dcc.Dropdown(
                                                 id='query-selector',
-                                                options=[{'label': k, 'value': k} for k in queries_dict.keys()],
-                                                placeholder='Select a query...',
+                                                options=[],
+                                                placeholder='Search queries by name, folder, parameter or SQL...',
+                                                search_order='original',
                                                 className='mb-4',
                                                 style={
                                                     'color': 'black',
@@ -137,7 +289,16 @@ def create_layout(config: Config) -> html.Div:
                                                 optionHeight=35
                                             ),
                                             html.Div(id='parameter-inputs', className='space-y-4'),
-                                            create_button('Run Query', 'run-query', 'mt-4 w-full')
+                                            create_rollup_controls(),
+                                            html.Div(create_sample_control(), className='mt-4'),
+                                            html.Div(create_refresh_control(), className='mt-2'),
+                                            html.Div(
+                                                className='flex space-x-2 mt-4',
+                                                children=[
+                                                    create_button('Run Query', 'run-query', 'flex-1'),
+                                                    create_button('Explain', 'explain-query')
+                                                ]
+                                            )
                                         ]
                                     ),
                                     
@@ -156,7 +317,13 @@ def create_layout(config: Config) -> html.Div:
                                                     'borderColor': '#d1d5db'
                                                 }
                                             ),
-                                            create_button('Run Custom SQL', 'run-custom-sql', 'mt-4 w-full')
+                                            html.Div(
+                                                className='flex space-x-2 mt-4',
+                                                children=[
+                                                    create_button('Run Custom SQL', 'run-custom-sql', 'flex-1'),
+                                                    create_button('Explain', 'explain-custom-sql')
+                                                ]
+                                            )
                                         ]
                                     ),
                                     
@@ -250,6 +417,18 @@ def create_layout(config: Config) -> html.Div:
                                                 style={'backgroundColor': 'white', 'color': '#1f2937'},
                                                 selected_style={'backgroundColor': 'white', 'color': '#3b82f6'},
                                                 children=[
+                                                    html.Div(
+                                                        id='preflight-notice',
+                                                        className='my-2 text-sm',
+                                                        style={'color': '#92400e'}
+                                                    ),
+                                                    html.Div(
+                                                        className='flex justify-end space-x-4 my-2 text-sm',
+                                                        children=[
+                                                            html.A('Export full result (CSV)', id='export-csv-link', href='', style={'display': 'none', 'color': '#2563eb'}),
+                                                            html.A('Export full result (Parquet)', id='export-parquet-link', href='', style={'display': 'none', 'color': '#2563eb'})
+                                                        ]
+                                                    ),
                                                     html.Div(
                                                         className='overflow-x-auto',
                                                         children=[
@@ -378,7 +557,10 @@ def create_layout(config: Config) -> html.Div:
                                                         ]
                                                     )
                                                 ]
-                                            )
+                                            ),
+                                            create_explain_tab(),
+                                            create_performance_tab(),
+                                            create_profiling_tab()
                                         ]
                                     )
                                 ]
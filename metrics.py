@@ -0,0 +1,93 @@
+"""
+In-process metrics for query execution and caching.
+
+Counters and timings are kept in memory per metric name and label set and
+can be read as a JSON snapshot from the /metrics route.
+"""
+
+import threading
+from typing import Dict, Any, Tuple
+
+class Metrics:
+    """Thread-safe registry of counters and timings."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._timings: Dict[Tuple[str, Tuple], Dict[str, float]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple]:
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """
+        Increase a counter.
+
+        Args:
+            name (str): Metric name.
+            value (float): Amount to add.
+            **labels (Any): Labels distinguishing series of the metric.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        """
+        Record one timing observation.
+
+        Args:
+            name (str): Metric name.
+            seconds (float): Observed duration in seconds.
+            **labels (Any): Labels distinguishing series of the metric.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            timing = self._timings.setdefault(key, {'count': 0, 'sum': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['sum'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+
+    def get(self, name: str, **labels: Any) -> float:
+        """Return the current value of a counter."""
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return all metrics as plain data.
+
+        Returns:
+            Dict[str, Any]: Counters and timings grouped by metric name.
+        """
+        with self._lock:
+            counters: Dict[str, list] = {}
+            for (name, labels), value in self._counters.items():
+                counters.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+            timings: Dict[str, list] = {}
+            for (name, labels), timing in self._timings.items():
+                timings.setdefault(name, []).append({'labels': dict(labels), **timing})
+        return {'counters': counters, 'timings': timings}
+
+    def reset(self) -> None:
+        """Clear all metrics."""
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+# Shared registry used by the whole application
+metrics = Metrics()
+
+def register_metrics_route(server: Any) -> None:
+    """
+    Expose the metrics snapshot on the Flask server.
+
+    Args:
+        server (Any): The Flask server behind the Dash application.
+    """
+    from flask import jsonify
+
+    @server.route('/metrics')
+    def metrics_snapshot():
+        """Return all metrics as JSON."""
+        return jsonify(metrics.snapshot())
@@ -0,0 +1,150 @@
+"""
+Distinct-value indexes for parameter autocomplete.
+
+The values a text parameter can take are loaded once per source with a
+lookup query, kept sorted in memory for a TTL and searched by prefix. The
+lookup query comes from PARAM_LOOKUPS in the source's connection.py or is
+inferred from the column the parameter pattern matched and the tables the
+saved query reads from.
+"""
+
+import os
+import bisect
+from typing import Dict, List, Any, Optional
+from config import Config
+from explain import table_aliases
+from metrics import metrics
+from result_cache import ResultCache
+from singleflight import SingleFlight
+
+PARAM_INDEX_ENABLED = os.getenv('PARAM_INDEX_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# Seconds a loaded value index stays valid
+PARAM_INDEX_TTL = float(os.getenv('PARAM_INDEX_TTL', '3600'))
+# Seconds a failed lookup is remembered before it is tried again
+PARAM_INDEX_MISS_TTL = float(os.getenv('PARAM_INDEX_MISS_TTL', '30'))
+# Maximum number of distinct values loaded per parameter
+PARAM_INDEX_MAX_VALUES = int(os.getenv('PARAM_INDEX_MAX_VALUES', '50000'))
+# Suggestions returned per search
+PARAM_SUGGESTIONS = int(os.getenv('PARAM_SUGGESTIONS', '20'))
+
+def lookup_queries(param_name: str, query_sql: str, config: Config,
+                   max_values: int = PARAM_INDEX_MAX_VALUES) -> List[str]:
+    """
+    Return candidate lookup queries for a parameter.
+
+    A lookup declared in PARAM_LOOKUPS wins; None there disables the index.
+    Otherwise one SELECT DISTINCT per table referenced by the query is
+    returned, to be tried in order until the column is found.
+
+    Args:
+        param_name (str): Parameter name, i.e. the column the pattern matched.
+        query_sql (str): SQL text of the saved query.
+        config (Config): Configuration instance for database connection.
+        max_values (int): Maximum number of values a lookup returns.
+
+    Returns:
+        List[str]: Lookup queries, empty if the parameter has no index.
+    """
+    if param_name in config.param_lookups:
+        lookup = config.param_lookups[param_name]
+        return [lookup] if lookup else []
+    tables = list(dict.fromkeys(table_aliases(query_sql).values()))
+    return [
+        f'SELECT DISTINCT {param_name} FROM {table} WHERE {param_name} IS NOT NULL LIMIT {max_values}'
+        for table in tables
+    ]
+
+class ParamIndex:
+    """
+    Per-source cache of sorted distinct parameter values.
+
+    Args:
+        ttl (float): Seconds a loaded index stays valid.
+        max_values (int): Maximum number of values loaded per parameter.
+        miss_ttl (float): Seconds a failed lookup is remembered.
+    """
+    def __init__(self, ttl: float = PARAM_INDEX_TTL, max_values: int = PARAM_INDEX_MAX_VALUES,
+                 miss_ttl: float = PARAM_INDEX_MISS_TTL):
+        self.max_values = max_values
+        self.miss_ttl = miss_ttl
+        self._cache = ResultCache(ttl=ttl, max_entries=256)
+        self._flights = SingleFlight()
+
+    def _load(self, lookups: List[str], config: Config) -> Optional[Dict[str, List[str]]]:
+        """Run the first working lookup and build the sorted index, or return None if every lookup fails."""
+        for lookup in lookups:
+            conn = config.get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(lookup)
+                values = sorted({str(row[0]) for row in cursor.fetchmany(self.max_values) if row[0] is not None},
+                                key=str.lower)
+                metrics.increment('param_index_loads', source=config.source)
+                return {'values': values, 'keys': [value.lower() for value in values]}
+            except Exception as e:
+                print(f"Parameter lookup failed: {e}")
+            finally:
+                conn.close()
+        return None
+
+    def get(self, param_name: str, query_sql: str, config: Config) -> Dict[str, List[str]]:
+        """
+        Return the index of a parameter, loading it on first use.
+
+        Args:
+            param_name (str): Parameter name.
+            query_sql (str): SQL text of the saved query.
+            config (Config): Configuration instance for database connection.
+
+        Returns:
+            Dict[str, List[str]]: Sorted 'values' and their lowercased 'keys'.
+        """
+        lookups = lookup_queries(param_name, query_sql, config, self.max_values)
+        if not lookups:
+            return {'values': [], 'keys': []}
+        key = (param_name, tuple(lookups))
+        index = self._cache.get(key)
+        if index is None:
+            loaded, _ = self._flights.do(key, lambda: self._load(lookups, config))
+            index = loaded or {'values': [], 'keys': []}
+            # A miss is kept briefly, so a parameter without an index is not retried on every
+            # keystroke but a lookup that failed on a passing database error is soon tried again
+            self._cache.put(key, index, ttl=None if loaded else self.miss_ttl)
+        return index
+
+    def search(
+        self,
+        param_name: str,
+        query_sql: str,
+        config: Config,
+        prefix: Optional[str],
+        limit: int = PARAM_SUGGESTIONS
+    ) -> List[str]:
+        """
+        Return indexed values starting with a prefix, case-insensitively.
+
+        Args:
+            param_name (str): Parameter name.
+            query_sql (str): SQL text of the saved query.
+            config (Config): Configuration instance for database connection.
+            prefix (Optional[str]): Text typed so far.
+            limit (int): Maximum number of suggestions.
+
+        Returns:
+            List[str]: Matching values in sorted order.
+        """
+        if not PARAM_INDEX_ENABLED:
+            return []
+        index = self.get(param_name, query_sql, config)
+        prefix = (prefix or '').lower()
+        start = bisect.bisect_left(index['keys'], prefix)
+        matches = []
+        for key, value in zip(index['keys'][start:start + limit], index['values'][start:start + limit]):
+            if not key.startswith(prefix):
+                break
+            matches.append(value)
+        return matches
+
+    def clear(self) -> None:
+        """Drop all loaded indexes."""
+        self._cache.clear()
@@ -0,0 +1,320 @@
+"""
+Sandboxed execution of generated plot code.
+
+VizroAI answers a plot request with Python code that builds a plotly figure.
+Running that code in the server process lets a slow or memory-hungry chart
+stall or kill the app, so it runs in a small pool of pre-warmed worker
+processes instead. Each plot gets a CPU-time and memory limit, and a worker
+that does not answer within the timeout is killed and replaced. The data
+frame is handed over as an Arrow IPC stream in shared memory, and the worker
+answers with the figure's JSON.
+
+Limits use rlimits and apply on Linux; elsewhere only the timeout does.
+"""
+
+import os
+import gc
+import time
+import queue
+import atexit
+import signal
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional, Tuple
+import orjson
+import pandas as pd
+import pyarrow as pa
+from metrics import metrics
+
+try:
+    import resource
+except ImportError:  # Windows has no rlimits; the timeout still applies
+    resource = None
+
+# Worker processes running generated plot code; 0 runs it in the server process
+PLOT_SANDBOX_WORKERS = int(os.getenv('PLOT_SANDBOX_WORKERS', '2'))
+# Seconds a plot may take before its worker is killed
+PLOT_SANDBOX_TIMEOUT = float(os.getenv('PLOT_SANDBOX_TIMEOUT', '30'))
+# CPU seconds a plot may use
+PLOT_SANDBOX_CPU_SECONDS = int(os.getenv('PLOT_SANDBOX_CPU_SECONDS', '20'))
+# Memory in MB a plot may allocate on top of the warmed-up worker
+PLOT_SANDBOX_MEMORY_MB = int(os.getenv('PLOT_SANDBOX_MEMORY_MB', '1024'))
+# Plots a worker runs before it is replaced by a fresh process
+PLOT_SANDBOX_MAX_JOBS = int(os.getenv('PLOT_SANDBOX_MAX_JOBS', '50'))
+
+# Function the generated code defines, as in VizroAI's ChartPlan.code
+CHART_NAME = 'custom_chart'
+
+class CPULimitExceeded(Exception):
+    """Raised in a worker when a plot uses up its CPU time."""
+
+def _on_cpu_limit(signum, frame):
+    raise CPULimitExceeded('plot code used up its CPU time')
+
+def _address_space() -> Optional[int]:
+    """Return the worker's virtual memory size in bytes, where /proc is available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _set_limits(cpu_seconds: int, memory_mb: int) -> None:
+    """Limit the next plot; rlimits count the whole process, so limits are set relative to now."""
+    if resource is None:
+        return
+    if cpu_seconds > 0:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        soft = int(usage.ru_utime + usage.ru_stime) + 1 + cpu_seconds
+        if hard == resource.RLIM_INFINITY or soft < hard:
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    size = _address_space()
+    if memory_mb > 0 and size is not None:
+        hard = resource.getrlimit(resource.RLIMIT_AS)[1]
+        soft = size + memory_mb * 1024 * 1024
+        if hard == resource.RLIM_INFINITY or soft < hard:
+            resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+def _clear_limits() -> None:
+    if resource is None:
+        return
+    for limit in (resource.RLIMIT_CPU, resource.RLIMIT_AS):
+        hard = resource.getrlimit(limit)[1]
+        resource.setrlimit(limit, (hard, hard))
+
+def share_frame(df: pd.DataFrame) -> Tuple[shared_memory.SharedMemory, int]:
+    """
+    Write a DataFrame as an Arrow IPC stream into a new shared memory block.
+
+    Args:
+        df (pd.DataFrame): Data for the plot.
+
+    Returns:
+        Tuple[shared_memory.SharedMemory, int]: The block, which the caller
+            unlinks, and the stream's size in bytes.
+    """
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Object columns mixing types, e.g. from JSON records, are sent as text
+        objects = df.select_dtypes('object').columns
+        table = pa.Table.from_pandas(df.astype({col: str for col in objects}), preserve_index=False)
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    size = sink.size()
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    buffer = pa.py_buffer(shm.buf)
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(buffer), table.schema) as writer:
+        writer.write_table(table)
+    del buffer
+    return shm, size
+
+def read_frame(name: str, size: int) -> pd.DataFrame:
+    """Read a DataFrame written by share_frame from shared memory."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        buffer = pa.py_buffer(shm.buf)[:size]
+        df = pa.ipc.open_stream(buffer).read_all().to_pandas()
+        del buffer
+        return df
+    finally:
+        shm.close()
+
+def run_plot_code(code: str, df: pd.DataFrame) -> str:
+    """Execute generated plot code in a fresh namespace and return the figure as JSON."""
+    namespace: Dict[str, Any] = {'__name__': 'generated_plot'}
+    exec(code, namespace)  # noqa: S102 - only ever called inside a sandbox worker
+    return namespace[CHART_NAME](df).to_json()
+
+def _worker_main(conn, cpu_seconds: int, memory_mb: int) -> None:
+    """Serve plot jobs from the pipe until it is closed."""
+    # Warm up the imports generated code uses, so a plot does not pay for them
+    import plotly.express  # noqa: F401
+    import plotly.graph_objects  # noqa: F401
+    if hasattr(signal, 'SIGXCPU'):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if job is None:
+            return
+        code, name, size = job
+        try:
+            df = read_frame(name, size)
+            _set_limits(cpu_seconds, memory_mb)
+            try:
+                result = ('ok', run_plot_code(code, df))
+            finally:
+                _clear_limits()
+        except Exception as e:
+            result = ('error', f'{type(e).__name__}: {e}')
+        df = None
+        gc.collect()
+        conn.send(result)
+
+class _Worker:
+    """One sandbox process and the pipe to it."""
+    def __init__(self, context, cpu_seconds: int, memory_mb: int):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, cpu_seconds, memory_mb),
+                                       name='plot-sandbox', daemon=True)
+        self.process.start()
+        child.close()
+        self.jobs = 0
+
+    def stop(self, kill: bool = False) -> None:
+        if not kill:
+            try:
+                self.conn.send(None)
+                self.process.join(1)
+            except (OSError, ValueError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(1)
+        self.conn.close()
+
+class PlotSandbox:
+    """
+    Pool of worker processes running generated plot code under limits.
+
+    Args:
+        workers (int): Worker processes; each runs one plot at a time.
+        timeout (float): Seconds a plot may take, including the wait for a free worker.
+        cpu_seconds (int): CPU seconds a plot may use; 0 disables the limit.
+        memory_mb (int): Memory a plot may allocate; 0 disables the limit.
+        max_jobs (int): Plots a worker runs before it is replaced.
+    """
+    def __init__(
+        self,
+        workers: int = PLOT_SANDBOX_WORKERS,
+        timeout: float = PLOT_SANDBOX_TIMEOUT,
+        cpu_seconds: int = PLOT_SANDBOX_CPU_SECONDS,
+        memory_mb: int = PLOT_SANDBOX_MEMORY_MB,
+        max_jobs: int = PLOT_SANDBOX_MAX_JOBS
+    ):
+        self.workers = workers
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_jobs = max_jobs
+        # spawn: workers must not inherit the server's threads and connections
+        self._context = multiprocessing.get_context('spawn')
+        self._idle: 'queue.Queue[_Worker]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._context, self.cpu_seconds, self.memory_mb)
+
+    def start(self) -> None:
+        """Start the workers, so they are warm when the first plot arrives."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for _ in range(self.workers):
+                self._idle.put(self._spawn())
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Stop all idle workers; busy ones are stopped when they are returned."""
+        with self._lock:
+            self._started = False
+            while True:
+                try:
+                    self._idle.get_nowait().stop()
+                except queue.Empty:
+                    break
+
+    def _return(self, worker: _Worker, broken: bool = False) -> None:
+        worker.jobs += 1
+        if broken or worker.jobs >= self.max_jobs:
+            worker.stop(kill=broken)
+            with self._lock:
+                if not self._started:
+                    return
+            worker = self._spawn()
+        with self._lock:
+            if self._started:
+                self._idle.put(worker)
+                return
+        worker.stop()
+
+    def run(self, code: str, df: pd.DataFrame, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run generated plot code on a worker.
+
+        Args:
+            code (str): Code defining custom_chart(data_frame), e.g. ChartPlan.code.
+            df (pd.DataFrame): Data for the plot.
+            timeout (Optional[float]): Seconds to wait; defaults to the pool's timeout.
+
+        Returns:
+            Dict[str, Any]: The plotly figure as a dict.
+
+        Raises:
+            TimeoutError: If no worker is free or the plot does not finish in time.
+            RuntimeError: If the plot code fails or its worker dies.
+        """
+        self.start()
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        # Write the frame before taking a worker, so a frame that cannot be shared does not keep one
+        shm, size = share_frame(df)
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            shm.close()
+            shm.unlink()
+            metrics.increment('plot_sandbox_runs', status='busy')
+            raise TimeoutError(f'No plot worker became free within {timeout:.0f} s')
+
+        start = time.perf_counter()
+        broken = False
+        try:
+            worker.conn.send((code, shm.name, size))
+            if not worker.conn.poll(max(deadline - time.monotonic(), 0)):
+                broken = True
+                metrics.increment('plot_sandbox_runs', status='timeout')
+                raise TimeoutError(f'Plot code did not finish within {timeout:.0f} s')
+            try:
+                status, payload = worker.conn.recv()
+            except (EOFError, OSError):
+                broken = True
+                metrics.increment('plot_sandbox_runs', status='crashed')
+                raise RuntimeError('Plot worker exited while running the plot code')
+        finally:
+            shm.close()
+            shm.unlink()
+            self._return(worker, broken)
+
+        metrics.increment('plot_sandbox_runs', status=status)
+        metrics.observe('plot_sandbox_seconds', time.perf_counter() - start)
+        if status != 'ok':
+            raise RuntimeError(payload)
+        return orjson.loads(payload)
+
+# Shared pool used by the VizroAI callback
+plot_sandbox = PlotSandbox()
+
+def render_figure(chart_plan: Any, df: pd.DataFrame) -> Any:
+    """
+    Build the figure of a VizroAI chart plan.
+
+    Args:
+        chart_plan (Any): Result of VizroAI.plot(..., return_elements=True).
+        df (pd.DataFrame): Data for the plot.
+
+    Returns:
+        Any: The figure as a dict from the sandbox, or a plotly Figure when
+            the sandbox is disabled.
+    """
+    if plot_sandbox.workers <= 0:
+        return chart_plan.get_fig_object(data_frame=df, vizro=False)
+    return plot_sandbox.run(chart_plan.code, df)
@@ -0,0 +1,226 @@
+"""
+Preflight cost estimation for queries before their results are fetched.
+
+The result cardinality is estimated within a strict time budget. Depending
+on the estimate and the configured policy the query then runs as is, runs
+with an automatic row limit, waits for the user's confirmation, or returns
+only a first page with the full result left to the streaming export.
+"""
+
+import os
+import re
+import math
+import time
+import sqlite3
+from typing import Dict, List, Any, Optional, Union
+import pandas as pd
+from config import Config
+from db_utils import resolve_statement, query_key, upstream_results
+from explain import explain_statement, scanned_tables, table_rows, table_aliases
+from query_graph import materialize, drop_materialized
+from result_cache import ResultCache, RESULT_CACHE_TTL
+from sampling import sample_statement
+
+PREFLIGHT_ENABLED = os.getenv('PREFLIGHT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# Milliseconds the row estimate may take before it is abandoned
+PREFLIGHT_BUDGET_MS = float(os.getenv('PREFLIGHT_BUDGET_MS', '200'))
+# Results estimated above this many rows are handled by the policy
+PREFLIGHT_ROW_LIMIT = int(os.getenv('PREFLIGHT_ROW_LIMIT', '100000'))
+# What to do with large results: 'limit', 'confirm' or 'stream'
+PREFLIGHT_POLICY = os.getenv('PREFLIGHT_POLICY', 'limit')
+# Rows sent to the browser in 'stream' mode
+PREFLIGHT_PAGE_ROWS = int(os.getenv('PREFLIGHT_PAGE_ROWS', '1000'))
+# Seconds a row estimate is reused; as long as results are cached by default
+PREFLIGHT_CACHE_TTL = float(os.getenv('PREFLIGHT_CACHE_TTL', str(RESULT_CACHE_TTL)))
+
+# Filters after which the size of a scanned table says little about the result size
+FILTER_PATTERN = re.compile(r'\b(?:WHERE|HAVING)\b', re.IGNORECASE)
+
+# Row estimates by statement, shared by the sources
+estimate_cache = ResultCache(ttl=PREFLIGHT_CACHE_TTL, max_entries=1024)
+
+def _count_sqlite(conn: sqlite3.Connection, statement: str, args: Any, budget_ms: float) -> Optional[int]:
+    """Count result rows, aborting once the time budget is spent."""
+    deadline = time.perf_counter() + budget_ms / 1000
+    conn.set_progress_handler(lambda: int(time.perf_counter() > deadline), 1000)
+    try:
+        inner = statement.strip().rstrip(';')
+        return conn.execute(f'SELECT COUNT(*) FROM ({inner})', args).fetchone()[0]
+    except sqlite3.OperationalError as e:
+        if 'interrupt' not in str(e).lower():
+            raise
+        return None
+    finally:
+        conn.set_progress_handler(None, 0)
+
+def _scan_upper_bound(conn: sqlite3.Connection, statement: str, args: Any, config: Config,
+                      tables: Optional[Dict[str, pd.DataFrame]] = None) -> Optional[int]:
+    """Estimate rows from the sizes of the tables the plan scans fully."""
+    rows = explain_statement(statement, args, config, tables)
+    sizes = [len(tables[table]) if tables and table in tables else table_rows(conn, table)
+             for table in scanned_tables(rows, statement)]
+    sizes = [size for size in sizes if size is not None]
+    return max(sizes) if sizes else None
+
+def estimate_rows(
+    statement: str,
+    args: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    budget_ms: float = PREFLIGHT_BUDGET_MS,
+    tables: Optional[Dict[str, pd.DataFrame]] = None
+) -> Dict[str, Any]:
+    """
+    Estimate the number of rows a statement returns.
+
+    Sources may provide ESTIMATE_ROWS(statement, args) in their connection
+    module, e.g. backed by driver statistics. For sqlite an exact COUNT(*) is
+    tried within the budget, falling back to the size of fully scanned tables
+    for statements without WHERE or HAVING; a filtered statement's estimate
+    is then unknown.
+
+    Args:
+        statement (str): Driver statement.
+        args (Union[List[Any], Dict[str, Any]]): Driver arguments.
+        config (Config): Configuration instance for database connection.
+        budget_ms (float): Time budget in milliseconds.
+        tables (Optional[Dict[str, pd.DataFrame]]): Temporary tables the statement
+            reads, e.g. upstream results of a composed query. They are loaded on
+            the sqlite connection first; ESTIMATE_ROWS cannot see them and is skipped.
+
+    Returns:
+        Dict[str, Any]: 'rows' (None if unknown) and the 'method' used.
+    """
+    if config.estimate_rows is not None and not tables:
+        return {'rows': config.estimate_rows(statement, args), 'method': 'source'}
+
+    conn = config.get_connection()
+    try:
+        if not isinstance(conn, sqlite3.Connection):
+            return {'rows': None, 'method': None}
+        for table, frame in (tables or {}).items():
+            materialize(conn, table, frame, config.query_paramstyle)
+        count = _count_sqlite(conn, statement, args, budget_ms)
+        if count is not None:
+            return {'rows': count, 'method': 'count'}
+        if FILTER_PATTERN.search(statement):
+            return {'rows': None, 'method': None}
+        return {'rows': _scan_upper_bound(conn, statement, args, config, tables), 'method': 'table-size'}
+    finally:
+        if tables:
+            drop_materialized(conn, list(tables))
+        conn.close()
+
+def estimate_composed(
+    statement: str,
+    args: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    upstream: Dict[str, pd.DataFrame],
+    row_limit: int = PREFLIGHT_ROW_LIMIT,
+    budget_ms: float = PREFLIGHT_BUDGET_MS
+) -> Dict[str, Any]:
+    """
+    Estimate the rows of a composed query from the upstream results it reads.
+
+    A statement reading only upstream tables returns at most the product of
+    their sizes, which settles small results at once. Otherwise the statement
+    is counted over the loaded upstream tables when they are small enough to
+    load quickly. If that gives no answer, the largest upstream result stands
+    in for the estimate, so a huge upstream result is never fetched unbounded.
+
+    Args:
+        statement (str): Driver statement reading the temporary tables.
+        args (Union[List[Any], Dict[str, Any]]): Driver arguments.
+        config (Config): Configuration instance for database connection.
+        upstream (Dict[str, pd.DataFrame]): Upstream results by temporary table.
+        row_limit (int): Row count above which the preflight policy applies.
+        budget_ms (float): Time budget of the count in milliseconds.
+
+    Returns:
+        Dict[str, Any]: 'rows' and the 'method' used.
+    """
+    sizes = [len(frame) for frame in upstream.values()]
+    only_upstream = set(table_aliases(statement).values()) <= set(upstream)
+    bound = math.prod(sizes) if only_upstream else None
+    if bound is not None and bound <= row_limit:
+        return {'rows': bound, 'method': 'upstream-size'}
+    if sum(sizes) <= row_limit:
+        estimate = estimate_rows(statement, args, config, budget_ms, tables=upstream)
+        if estimate['rows'] is not None:
+            return estimate
+    return {'rows': bound if bound is not None else max(sizes, default=0), 'method': 'upstream-size'}
+
+def preflight_query(
+    query: str,
+    params: Union[List[Any], Dict[str, Any]],
+    config: Config,
+    queries: Dict[str, Dict[str, Any]],
+    is_file: bool = True,
+    policy: str = PREFLIGHT_POLICY,
+    row_limit: int = PREFLIGHT_ROW_LIMIT,
+    sample: Optional[float] = None,
+    cache: Optional[ResultCache] = None,
+    refresh: bool = False
+) -> Dict[str, Any]:
+    """
+    Decide how to run a query based on its estimated result size.
+
+    Args:
+        query (str): SQL query or query filename.
+        params (Union[List[Any], Dict[str, Any]]): Query parameters as list or dict.
+        config (Config): Configuration instance for database connection.
+        queries (Dict[str, Dict[str, Any]]): Dictionary of loaded queries.
+        is_file (bool): Whether query is a filename (True) or SQL string (False).
+        policy (str): 'limit', 'confirm' or 'stream'.
+        row_limit (int): Row count above which the policy applies.
+        sample (Optional[float]): Fraction of an approximate run; its sampled
+            statement is estimated, since a large sample is fetched like any result.
+        cache (Optional[ResultCache]): Result cache of the source; a cached full
+            result is counted instead of estimated.
+        refresh (bool): Estimate again instead of reusing cached results and estimates.
+
+    Returns:
+        Dict[str, Any]: The estimate ('rows', 'method'), the 'action' to take
+            ('run', 'limit', 'confirm' or 'stream') and the 'row_limit' to apply.
+    """
+    decision = {'rows': None, 'method': None, 'action': 'run', 'row_limit': None}
+    if not PREFLIGHT_ENABLED or not query:
+        return decision
+    try:
+        composed = is_file and bool(queries.get(query, {}).get('refs'))
+        statement, args = resolve_statement(query, params, config, queries, is_file)
+        fraction = None
+        if sample:
+            statement, fraction = sample_statement(statement, sample, config.table_sample_sql, config.sample_tables)
+        key = query_key(config.source, statement, args)
+        if composed:
+            # As in result cache keys, composed queries change with their upstream SQL
+            key += (queries[query]['version'],)
+        cached = None if cache is None or refresh else cache.get(key)
+        estimate = None if refresh else estimate_cache.get(key)
+        if cached is not None:
+            # The full result is already at hand, e.g. prewarmed
+            estimate = {'rows': len(cached), 'method': 'cache'}
+        elif estimate is None and composed:
+            # Composed queries are estimated from their upstream results, which the run then takes from the cache
+            upstream = upstream_results(query, params, config, queries, cache, 'preflight', None)
+            estimate = estimate_composed(statement, args, config, upstream, row_limit)
+            estimate_cache.put(key, estimate)
+        elif estimate is None:
+            estimate = estimate_rows(statement, args, config)
+            if fraction and estimate['method'] == 'table-size' and estimate['rows'] is not None:
+                # Scanned table sizes bound the full result; the sample holds its fraction of it
+                estimate['rows'] = int(estimate['rows'] * fraction)
+            estimate_cache.put(key, estimate)
+        decision.update(estimate)
+    except Exception as e:
+        print(f"Preflight estimate error: {e}")
+        return decision
+
+    if decision['rows'] is None or decision['rows'] <= row_limit:
+        return decision
+    decision['action'] = policy
+    if policy == 'limit':
+        decision['row_limit'] = row_limit
+    elif policy == 'stream':
+        decision['row_limit'] = PREFLIGHT_PAGE_ROWS
+    return decision
@@ -0,0 +1,235 @@
+"""
+Usage-driven cache pre-warming.
+
+Saved query runs are counted per source, query file and parameter set. A
+background scheduler precomputes the most popular ones at startup and during
+off-peak windows, filling the result and report caches so the first analyst
+of the day does not pay the cold-cache cost.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+from db_utils import execute_sql_query
+from metrics import metrics
+from report_utils import create_report_data, report_key
+from result_diff import fingerprint_result
+from sources import SourceRegistry
+
+# Local database recording which saved queries are run
+USAGE_DB_PATH = os.getenv('USAGE_DB_PATH', 'cache/query_usage.db')
+
+PREWARM_ENABLED = os.getenv('PREWARM_ENABLED', '0').lower() in ('1', 'true', 'yes')
+# Number of most frequent query/parameter sets to precompute
+PREWARM_TOP_N = int(os.getenv('PREWARM_TOP_N', '10'))
+# Maximum warm-up queries running at the same time
+PREWARM_CONCURRENCY = int(os.getenv('PREWARM_CONCURRENCY', '2'))
+# Seconds between scheduled warm-up rounds
+PREWARM_INTERVAL = float(os.getenv('PREWARM_INTERVAL', '3600'))
+# Off-peak window for scheduled rounds, e.g. '01:00-06:00'; empty means any time
+PREWARM_WINDOW = os.getenv('PREWARM_WINDOW', '')
+# Seconds warmed results and reports stay cached
+PREWARM_RESULT_TTL = float(os.getenv('PREWARM_RESULT_TTL', str(12 * 3600)))
+
+class UsageTracker:
+    """
+    Persistent counts of saved query runs per parameter set.
+
+    Args:
+        path (str): Path of the SQLite database holding the counts.
+    """
+    def __init__(self, path: str = USAGE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        if not self._initialized:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS usage ('
+                'source TEXT, query TEXT, params TEXT, runs INTEGER, last_run REAL, '
+                'PRIMARY KEY (source, query, params))'
+            )
+            self._initialized = True
+        return conn
+
+    def record(self, source: str, query: str, params: Dict[str, Any]) -> None:
+        """
+        Count one run of a saved query.
+
+        Args:
+            source (str): Source name.
+            query (str): Query filename.
+            params (Dict[str, Any]): Parameter values of the run.
+        """
+        params_json = json.dumps(params or {}, sort_keys=True, default=str)
+        try:
+            with self._lock:
+                conn = self._connect()
+                try:
+                    with conn:
+                        conn.execute(
+                            'INSERT INTO usage VALUES (?, ?, ?, 1, ?) '
+                            'ON CONFLICT (source, query, params) '
+                            'DO UPDATE SET runs = runs + 1, last_run = excluded.last_run',
+                            (source, query, params_json, time.time())
+                        )
+                finally:
+                    conn.close()
+        except sqlite3.Error as e:
+            print(f"Error recording query usage: {e}")
+
+    def top(self, n: int, sources: Optional[List[str]] = None) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """
+        Return the most frequently run query/parameter sets.
+
+        Args:
+            n (int): Number of entries to return.
+            sources (Optional[List[str]]): Restrict to these sources.
+
+        Returns:
+            List[Tuple[str, str, Dict[str, Any]]]: (source, query, params) entries.
+        """
+        if not os.path.exists(self.path):
+            return []
+        with self._lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    'SELECT source, query, params FROM usage ORDER BY runs DESC, last_run DESC'
+                ).fetchall()
+            finally:
+                conn.close()
+        entries = [(source, query, json.loads(params)) for source, query, params in rows
+                   if sources is None or source in sources]
+        return entries[:n]
+
+# Shared tracker used by the query callbacks
+usage_tracker = UsageTracker()
+
+def in_window(window: str, now: Optional[datetime] = None) -> bool:
+    """
+    Check whether the current time falls into an 'HH:MM-HH:MM' window.
+
+    Args:
+        window (str): Time window; an empty window always matches. Windows may
+            wrap around midnight.
+        now (Optional[datetime]): Time to check. Defaults to the current time.
+
+    Returns:
+        bool: True if the time is inside the window.
+    """
+    if not window:
+        return True
+    now = now or datetime.now()
+    start, end = (datetime.strptime(part.strip(), '%H:%M').time() for part in window.split('-'))
+    current = now.time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+class PrewarmScheduler:
+    """
+    Precompute popular saved queries into the result and report caches.
+
+    Args:
+        registry (SourceRegistry): Registry of the served sources.
+        usage (UsageTracker): Usage counts deciding what to warm.
+        top_n (int): Number of query/parameter sets to warm per round.
+        concurrency (int): Maximum warm-up queries running at once.
+        interval (float): Seconds between scheduled rounds.
+        window (str): Off-peak window for scheduled rounds.
+        result_ttl (float): Seconds warmed entries stay cached.
+    """
+    def __init__(
+        self,
+        registry: SourceRegistry,
+        usage: UsageTracker = usage_tracker,
+        top_n: int = PREWARM_TOP_N,
+        concurrency: int = PREWARM_CONCURRENCY,
+        interval: float = PREWARM_INTERVAL,
+        window: str = PREWARM_WINDOW,
+        result_ttl: float = PREWARM_RESULT_TTL
+    ):
+        self.registry = registry
+        self.usage = usage
+        self.top_n = top_n
+        self.concurrency = max(concurrency, 1)
+        self.interval = interval
+        self.window = window
+        self.result_ttl = result_ttl
+        self._thread: Optional[threading.Thread] = None
+
+    def warm(self, source: str, query: str, params: Dict[str, Any]) -> bool:
+        """
+        Precompute one saved query and its report.
+
+        Args:
+            source (str): Source name.
+            query (str): Query filename.
+            params (Dict[str, Any]): Parameter values.
+
+        Returns:
+            bool: True if a non-empty result was cached.
+        """
+        from utils import unpack_to_dash
+
+        start = time.perf_counter()
+        try:
+            context = self.registry.get(source)
+            if query not in context.queries:
+                return False
+            df = execute_sql_query(
+                query, params, context.config, context.queries,
+                cache=context.result_cache, origin='warmup', refresh=True, cache_ttl=self.result_ttl
+            )
+            if df.empty:
+                return False
+
+            key = report_key(query, fingerprint_result(df))
+            report_content = unpack_to_dash(create_report_data(source, query, df))
+            context.report_cache.put(key, report_content, ttl=self.result_ttl)
+            metrics.increment('prewarm_runs', source=source)
+            return True
+        except Exception as e:
+            print(f"Error pre-warming {source}/{query}: {e}")
+            metrics.increment('prewarm_errors', source=source)
+            return False
+        finally:
+            metrics.observe('prewarm_duration_seconds', time.perf_counter() - start, source=source)
+
+    def run_once(self) -> int:
+        """
+        Warm the most popular query/parameter sets once.
+
+        Returns:
+            int: Number of entries warmed.
+        """
+        entries = self.usage.top(self.top_n, sources=self.registry.sources)
+        if not entries:
+            return 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='prewarm') as pool:
+            warmed = sum(pool.map(lambda entry: self.warm(*entry), entries))
+        print(f"Pre-warmed {warmed} of {len(entries)} popular queries")
+        return warmed
+
+    def start(self) -> None:
+        """Warm once in the background, then on schedule inside the off-peak window."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            self.run_once()
+            while True:
+                time.sleep(self.interval)
+                if in_window(self.window):
+                    self.run_once()
+
+        self._thread = threading.Thread(target=loop, name='prewarm-scheduler', daemon=True)
+        self._thread.start()
@@ -0,0 +1,260 @@
+"""
+Built-in data profiler used as the default report.
+
+Computes per-column statistics with vectorized numpy/pandas operations:
+null counts, distinct estimates (HyperLogLog), quantiles, top values,
+histograms and date ranges. Column blocks are profiled on a thread pool,
+since the heavy numpy and pandas kernels release the GIL.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+# Threads profiling column blocks in parallel
+PROFILE_WORKERS = int(os.getenv('PROFILE_WORKERS', str(min(os.cpu_count() or 1, 8))))
+# Most frequent values listed per column
+PROFILE_TOP_K = int(os.getenv('PROFILE_TOP_K', '5'))
+# Histogram bins per numeric or date column
+PROFILE_BINS = int(os.getenv('PROFILE_BINS', '20'))
+# Maximum number of histograms rendered
+PROFILE_MAX_HISTOGRAMS = int(os.getenv('PROFILE_MAX_HISTOGRAMS', '12'))
+# HyperLogLog precision; 2**p registers, relative error about 1.04 / sqrt(2**p)
+PROFILE_HLL_PRECISION = int(os.getenv('PROFILE_HLL_PRECISION', '14'))
+# Leading rows checked to decide whether a text column repeats its values
+PROFILE_CARDINALITY_SAMPLE = int(os.getenv('PROFILE_CARDINALITY_SAMPLE', '10000'))
+# Larger results are profiled on a random sample of this many rows (0 profiles every row)
+PROFILE_SAMPLE_ROWS = int(os.getenv('PROFILE_SAMPLE_ROWS', '500000'))
+
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+def hll_distinct(values: pd.Series, precision: int = PROFILE_HLL_PRECISION) -> int:
+    """
+    Estimate the number of distinct non-null values with HyperLogLog.
+
+    Args:
+        values (pd.Series): Column values without nulls.
+        precision (int): Number of index bits; uses 2**precision registers.
+
+    Returns:
+        int: Estimated distinct count.
+    """
+    if values.empty:
+        return 0
+    m = 1 << precision
+    hashes = pd.util.hash_pandas_object(values, index=False, categorize=False).to_numpy(dtype=np.uint64)
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    # rest has at most 64 - precision <= 53 bits, so its float64 exponent is its exact bit length
+    bit_length = np.frexp(rest.astype(np.float64))[1].astype(np.int64)
+    rank = (64 - precision) - bit_length + 1
+
+    registers = np.zeros(m, dtype=np.int64)
+    np.maximum.at(registers, index, rank)
+
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.power(2.0, -registers))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # Small range correction (linear counting)
+        estimate = m * np.log(m / zeros)
+    return int(round(min(estimate, len(values))))
+
+def _as_dates(series: pd.Series) -> Optional[pd.Series]:
+    """Return the non-null column as datetimes if it holds dates, e.g. ISO strings from sqlite."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if series.dtype != object:
+        return None
+    sample = series.head(100)
+    if sample.empty or not all(isinstance(v, str) for v in sample):
+        return None
+    if pd.to_datetime(sample, errors='coerce', format='ISO8601').isna().any():
+        return None
+    return pd.to_datetime(series, errors='coerce', format='ISO8601')
+
+def _repeats_values(values: pd.Series, sample_size: int = PROFILE_CARDINALITY_SAMPLE) -> bool:
+    """Guess from the leading rows whether a column holds few distinct values."""
+    sample = values.iloc[:sample_size]
+    return sample.nunique() < 0.5 * len(sample)
+
+def _counted_values(values: pd.Series, top_k: int) -> Tuple[int, List[Tuple[Any, int]]]:
+    """Exact distinct count and most frequent values from one factorization."""
+    codes, uniques = pd.factorize(values)
+    counts = np.bincount(codes, minlength=len(uniques))
+    top = np.argsort(-counts, kind='stable')[:top_k]
+    return len(uniques), [(uniques[i], int(counts[i])) for i in top]
+
+def _histogram(values: np.ndarray, bins: int) -> Dict[str, List[float]]:
+    counts, edges = np.histogram(values, bins=bins)
+    return {'counts': counts.tolist(), 'edges': edges.tolist()}
+
+def profile_column(
+    series: pd.Series,
+    top_k: int = PROFILE_TOP_K,
+    bins: int = PROFILE_BINS
+) -> Dict[str, Any]:
+    """
+    Profile a single column.
+
+    Args:
+        series (pd.Series): Column to profile.
+        top_k (int): Number of most frequent values to keep.
+        bins (int): Number of histogram bins.
+
+    Returns:
+        Dict[str, Any]: Column statistics; 'histogram' and 'top' are None when
+            not applicable.
+    """
+    count = len(series)
+    values = series.dropna()
+    dates = _as_dates(values)
+    counted = None
+    if dates is None and values.dtype == object and _repeats_values(values):
+        # Text with few distinct values: one factorization gives exact counts,
+        # cheaper than hashing every string and counting values separately
+        counted = _counted_values(values, top_k)
+    stats: Dict[str, Any] = {
+        'column': str(series.name),
+        'dtype': str(series.dtype),
+        'count': count,
+        'nulls': count - len(values),
+        'null_pct': round(100 * (count - len(values)) / count, 2) if count else 0.0,
+        'distinct': counted[0] if counted else hll_distinct(values if dates is None else dates.dropna()),
+        'min': None, 'max': None, 'mean': None, 'std': None,
+        'top': None, 'histogram': None
+    }
+    stats.update({f'p{int(q * 100)}': None for q in QUANTILES})
+    if values.empty:
+        return stats
+
+    if pd.api.types.is_bool_dtype(values):
+        pass
+    elif pd.api.types.is_numeric_dtype(values):
+        array = values.to_numpy(dtype=np.float64)
+        array = array[np.isfinite(array)]
+        if array.size:
+            quantiles = np.quantile(array, QUANTILES)
+            stats.update({
+                'min': array.min(), 'max': array.max(),
+                'mean': array.mean(), 'std': array.std(ddof=1) if array.size > 1 else 0.0
+            })
+            stats.update({f'p{int(q * 100)}': v for q, v in zip(QUANTILES, quantiles)})
+            stats['histogram'] = _histogram(array, bins)
+    elif dates is not None:
+        dates = dates.dropna()
+        if not dates.empty:
+            stats['min'], stats['max'] = str(dates.min()), str(dates.max())
+            stats['histogram'] = _histogram(dates.to_numpy(dtype='datetime64[ns]').astype(np.int64), bins)
+            stats['histogram']['dates'] = True
+
+    # Top values are meaningless for (nearly) unique columns such as IDs
+    if counted and stats['distinct'] < 0.9 * len(values):
+        stats['top'] = counted[1]
+    elif stats['distinct'] < 0.9 * len(values):
+        top = values.value_counts().head(top_k)
+        stats['top'] = [(value, int(n)) for value, n in top.items()]
+    return stats
+
+def _profile_block(df: pd.DataFrame, positions: List[int], top_k: int, bins: int) -> List[Dict[str, Any]]:
+    # By position, since column names may repeat
+    return [profile_column(df.iloc[:, i], top_k, bins) for i in positions]
+
+def profile_dataframe(
+    df: pd.DataFrame,
+    workers: int = PROFILE_WORKERS,
+    top_k: int = PROFILE_TOP_K,
+    bins: int = PROFILE_BINS
+) -> List[Dict[str, Any]]:
+    """
+    Profile every column of a DataFrame, running column blocks in parallel.
+
+    Args:
+        df (pd.DataFrame): Data to profile.
+        workers (int): Number of threads.
+        top_k (int): Number of most frequent values per column.
+        bins (int): Number of histogram bins.
+
+    Returns:
+        List[Dict[str, Any]]: Statistics per column in column order.
+    """
+    positions = list(range(len(df.columns)))
+    workers = max(1, min(workers, len(positions)))
+    if workers == 1:
+        return _profile_block(df, positions, top_k, bins)
+    blocks = [positions[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='profiler') as pool:
+        results = list(pool.map(lambda block: _profile_block(df, block, top_k, bins), blocks))
+    by_position = {i: stats for block, block_stats in zip(blocks, results) for i, stats in zip(block, block_stats)}
+    return [by_position[i] for i in positions]
+
+def _histogram_figure(stats: Dict[str, Any]) -> go.Figure:
+    histogram = stats['histogram']
+    edges = np.asarray(histogram['edges'])
+    centers = (edges[:-1] + edges[1:]) / 2
+    if histogram.get('dates'):
+        centers = pd.to_datetime(centers.astype(np.int64))
+    fig = go.Figure(go.Bar(x=centers, y=histogram['counts'], marker_line_width=0))
+    fig.update_layout(title=stats['column'], height=250, bargap=0.05, margin=dict(l=40, r=10, t=40, b=30))
+    return fig
+
+def sample_rows(df: pd.DataFrame, rows: int = PROFILE_SAMPLE_ROWS, seed: int = 0) -> pd.DataFrame:
+    """
+    Return a random sample of rows in their original order, or df itself if it is small enough.
+
+    Args:
+        df (pd.DataFrame): Data to sample.
+        rows (int): Sample size; 0 keeps every row.
+        seed (int): Seed of the random generator, so reports are reproducible.
+
+    Returns:
+        pd.DataFrame: The sampled rows.
+    """
+    if not rows or len(df) <= rows:
+        return df
+    positions = np.sort(np.random.default_rng(seed).choice(len(df), size=rows, replace=False))
+    return df.iloc[positions]
+
+def profile_report(df: pd.DataFrame, max_histograms: int = PROFILE_MAX_HISTOGRAMS,
+                   sample_size: int = PROFILE_SAMPLE_ROWS) -> Dict[str, Any]:
+    """
+    Build report data from a profile, ready for utils.unpack_to_dash.
+
+    Results above sample_size rows are profiled on a random sample, which keeps
+    a few million rows well under a second; counts, distinct values and top
+    values then describe the sample, as the overview title states.
+
+    Args:
+        df (pd.DataFrame): Data to profile.
+        max_histograms (int): Maximum number of histogram figures.
+        sample_size (int): Rows profiled at most; 0 profiles every row.
+
+    Returns:
+        Dict[str, Any]: Overview table, top values table and histograms.
+    """
+    sample = sample_rows(df, sample_size)
+    profile = profile_dataframe(sample)
+    overview = pd.DataFrame(
+        [{k: v for k, v in stats.items() if k not in ('top', 'histogram')} for stats in profile]
+    )
+    numeric = overview.select_dtypes('number').columns
+    overview[numeric] = overview[numeric].round(4)
+
+    top_values = pd.DataFrame([
+        {'column': stats['column'], 'value': str(value), 'count': n,
+         'share_pct': round(100 * n / stats['count'], 2)}
+        for stats in profile if stats['top'] for value, n in stats['top']
+    ])
+    title = f'Profile ({len(df):,} rows, {len(df.columns)} columns)'
+    if len(sample) < len(df):
+        title = f'Profile ({len(df):,} rows, {len(df.columns)} columns; statistics from a {len(sample):,}-row sample)'
+    report: Dict[str, Any] = {title: overview}
+    if not top_values.empty:
+        report['Top values'] = top_values
+    histograms = [_histogram_figure(stats) for stats in profile if stats['histogram']][:max_histograms]
+    if histograms:
+        report['Distributions'] = histograms
+    return report
@@ -0,0 +1,169 @@
+"""
+Composable saved queries.
+
+A saved query can read the result of another saved query of its source with
+{{ ref('name') }}. The reference is replaced by a temporary table that holds
+the upstream result, so a shared base query runs once, is kept in the result
+cache and is reused by every query built on it. Each query gets a version
+hash of its own SQL and the versions of everything upstream, which becomes
+part of its cache key: editing an upstream file invalidates all downstream
+results.
+"""
+
+import os
+import re
+import hashlib
+from typing import Dict, List, Any
+import pandas as pd
+
+# Matches {{ ref('stock_prices') }}, {{ ref("stock_prices.sql") }} or {{ ref('risk/var') }}
+REF_PATTERN = re.compile(r"\{\{\s*ref\(\s*['\"]([\w./\-]+)['\"]\s*\)\s*\}\}")
+
+# Upstream queries of one query that run at the same time
+REF_WORKERS = int(os.getenv('REF_WORKERS', '4'))
+
+def ref_filename(name: str) -> str:
+    """Return the query filename a reference points to."""
+    return name if name.endswith('.sql') else f'{name}.sql'
+
+def ref_table(filename: str) -> str:
+    """Return the temporary table name holding the result of a referenced query."""
+    return 'ref_' + re.sub(r'\W', '_', filename[:-len('.sql')] if filename.endswith('.sql') else filename)
+
+def find_refs(sql: str) -> List[str]:
+    """Return the query filenames referenced by SQL, in order of first use."""
+    return list(dict.fromkeys(ref_filename(name) for name in REF_PATTERN.findall(sql)))
+
+def expand_refs(sql: str) -> str:
+    """Replace references by the names of their temporary tables."""
+    return REF_PATTERN.sub(lambda match: ref_table(ref_filename(match.group(1))), sql)
+
+def link_queries(queries: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolve the references between loaded queries.
+
+    Every query gets 'refs' (direct references), 'upstream' (all queries it
+    depends on, dependencies first) and 'version'. Parameters of upstream
+    queries are added to the downstream query's parameters, so they are
+    asked for in the query panel. Queries with unknown or circular
+    references are dropped.
+
+    Args:
+        queries (Dict[str, Dict[str, Any]]): Loaded queries with their 'refs'.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The queries that can run.
+    """
+    resolved: Dict[str, List[str]] = {}
+    broken: Dict[str, str] = {}
+
+    def visit(name: str, path: List[str]) -> List[str]:
+        if name in resolved:
+            return resolved[name]
+        if name in path:
+            raise ValueError(f"circular reference {' -> '.join(path[path.index(name):] + [name])}")
+        if name not in queries or name in broken:
+            raise ValueError(f'unknown or broken reference {name}')
+        upstream: List[str] = []
+        for ref in queries[name]['refs']:
+            upstream.extend(visit(ref, path + [name]))
+            upstream.append(ref)
+        resolved[name] = list(dict.fromkeys(upstream))
+        return resolved[name]
+
+    for name in list(queries):
+        try:
+            visit(name, [])
+        except ValueError as e:
+            broken[name] = str(e)
+
+    for name, error in broken.items():
+        print(f'{name} not loaded due to error: {error}')
+    linked = {name: query for name, query in queries.items() if name not in broken}
+
+    for name in linked:
+        query = linked[name]
+        query['upstream'] = resolved[name]
+        query['params'] = list(query['template'].params)
+        names = {param['name'] for param in query['params']}
+        for upstream in query['upstream']:
+            for param in linked[upstream]['template'].params:
+                if param['name'] not in names:
+                    query['params'].append(param)
+                    names.add(param['name'])
+
+    def version(name: str) -> str:
+        query = linked[name]
+        if 'version' not in query:
+            text = query['query'] + ''.join(version(ref) for ref in query['refs'])
+            query['version'] = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+        return query['version']
+
+    for name in linked:
+        version(name)
+    return linked
+
+def param_query(queries: Dict[str, Dict[str, Any]], name: str, param_name: str) -> str:
+    """
+    Return the query whose own SQL holds a parameter.
+
+    A composed query asks for the parameters of its upstream queries too;
+    those are found in the upstream SQL, not in the composed query's.
+
+    Args:
+        queries (Dict[str, Dict[str, Any]]): Linked queries.
+        name (str): Query filename.
+        param_name (str): Parameter name.
+
+    Returns:
+        str: The query itself or the first upstream query with the parameter.
+    """
+    for candidate in [name, *queries[name].get('upstream', [])]:
+        if any(param['name'] == param_name for param in queries[candidate]['template'].params):
+            return candidate
+    return name
+
+SQL_TYPES = {'i': 'BIGINT', 'u': 'BIGINT', 'f': 'DOUBLE PRECISION', 'b': 'BOOLEAN', 'M': 'TIMESTAMP'}
+
+def _markers(count: int, paramstyle: str) -> str:
+    if paramstyle in ('format', 'pyformat'):
+        return ', '.join(['%s'] * count)
+    if paramstyle == 'numeric':
+        return ', '.join(f':{i + 1}' for i in range(count))
+    if paramstyle == 'named':
+        return ', '.join(f':c{i}' for i in range(count))
+    return ', '.join(['?'] * count)
+
+def materialize(conn, table: str, df: pd.DataFrame, paramstyle: str = 'qmark') -> None:
+    """
+    Load an upstream result into a temporary table on a connection.
+
+    Args:
+        conn: DB-API connection the downstream query runs on.
+        table (str): Temporary table name.
+        df (pd.DataFrame): Upstream result.
+        paramstyle (str): DB-API paramstyle of the driver.
+    """
+    columns = ', '.join(f'"{col}" {SQL_TYPES.get(df[col].dtype.kind, "TEXT")}' for col in df.columns)
+    cursor = conn.cursor()
+    cursor.execute(f'CREATE TEMPORARY TABLE {table} ({columns})')
+    if df.empty:
+        return
+    values = df.astype(object).where(df.notna(), None)
+    for col in df.columns:
+        if df[col].dtype.kind == 'M':
+            # Drivers such as sqlite bind ISO text rather than pandas timestamps
+            values[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S').where(df[col].notna(), None)
+    rows = list(values.itertuples(index=False, name=None))
+    if paramstyle == 'named':
+        rows = [{f'c{i}': value for i, value in enumerate(row)} for row in rows]
+    cursor.executemany(f'INSERT INTO {table} VALUES ({_markers(len(df.columns), paramstyle)})', rows)
+
+def drop_materialized(conn, tables: List[str]) -> None:
+    """Drop temporary tables, so connections that are reused stay clean."""
+    cursor = conn.cursor()
+    for table in tables:
+        try:
+            cursor.execute(f'DROP TABLE {table}')
+        except Exception:
+            pass
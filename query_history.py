@@ -0,0 +1,243 @@
+"""
+Persistent query history and slow-query log.
+
+Every execute_sql_query run is written to a local SQLite database under
+cache/ with its timings per stage, row count, size, cache status and error.
+Writes happen on a background thread so logging never delays a query.
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import threading
+import pandas as pd
+from typing import Dict, Any, Optional
+
+QUERY_HISTORY_PATH = os.getenv('QUERY_HISTORY_PATH', 'cache/query_history.db')
+QUERY_HISTORY_ENABLED = os.getenv('QUERY_HISTORY_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# Runs slower than this many milliseconds are flagged and printed as slow queries
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '1000'))
+# Runs older than this many days are pruned by the background writer (0 keeps them)
+QUERY_HISTORY_RETENTION_DAYS = float(os.getenv('QUERY_HISTORY_RETENTION_DAYS', '30'))
+# Only the newest runs up to this count are kept (0 for no limit)
+QUERY_HISTORY_MAX_ROWS = int(os.getenv('QUERY_HISTORY_MAX_ROWS', '100000'))
+# Days of runs the performance summary aggregates by default
+QUERY_HISTORY_SUMMARY_DAYS = float(os.getenv('QUERY_HISTORY_SUMMARY_DAYS', '7'))
+
+HISTORY_COLUMNS = [
+    'ts', 'source', 'query_name', 'sql_hash', 'params', 'origin', 'connect_ms', 'execute_ms',
+    'total_ms', 'rows', 'bytes', 'cache_hit', 'coalesced', 'slow', 'error', 'plan', 'sample'
+]
+
+# Saved queries by name, custom SQL by its hash
+QUERY_LABEL_SQL = "COALESCE(query_name, 'custom:' || COALESCE(sql_hash, ''))"
+
+def _percentile_sql(q: float) -> str:
+    """Linearly interpolated percentile over the ranked runs of a group, as pandas quantile computes it."""
+    position = f'(n - 1) * {q}'
+    lower = f'CAST({position} AS INTEGER)'
+    return (f'SUM(CASE WHEN pos = {lower} THEN total_ms * (1 - ({position} - {lower})) '
+            f'WHEN pos = {lower} + 1 THEN total_ms * ({position} - {lower}) ELSE 0 END)')
+
+SUMMARY_SQL = f"""
+WITH runs AS (
+    SELECT source, {QUERY_LABEL_SQL} AS query, total_ms, rows, bytes, cache_hit, slow, error
+    FROM query_history WHERE ts >= ?
+), ranked AS (
+    SELECT source, query, total_ms,
+           ROW_NUMBER() OVER (PARTITION BY source, query ORDER BY total_ms) - 1 AS pos,
+           COUNT(*) OVER (PARTITION BY source, query) AS n
+    FROM runs WHERE total_ms IS NOT NULL
+), percentiles AS (
+    SELECT source, query, {_percentile_sql(0.5)} AS p50_ms, {_percentile_sql(0.95)} AS p95_ms,
+           {_percentile_sql(0.99)} AS p99_ms
+    FROM ranked GROUP BY source, query
+)
+SELECT r.source, r.query, COUNT(*) AS runs, p.p50_ms, p.p95_ms, p.p99_ms, MAX(r.total_ms) AS max_ms,
+       AVG(r.rows) AS avg_rows, AVG(r.bytes) AS avg_bytes, AVG(r.cache_hit) AS cache_hit_rate,
+       COUNT(r.error) AS errors, SUM(r.slow) AS slow_runs
+FROM runs r LEFT JOIN percentiles p ON p.source IS r.source AND p.query = r.query
+GROUP BY r.source, r.query
+"""
+
+def sql_hash(sql: str) -> str:
+    """Return a short stable hash of normalized SQL text."""
+    return hashlib.sha1(' '.join(sql.split()).encode('utf-8')).hexdigest()[:16]
+
+class QueryHistory:
+    """
+    Background-written log of query runs.
+
+    Args:
+        path (str): Path of the SQLite database.
+        enabled (bool): Whether runs are recorded at all.
+        retention_days (float): Age in days after which runs are pruned; 0 keeps them.
+        max_rows (int): Number of newest runs kept; 0 for no limit.
+    """
+    def __init__(self, path: str = QUERY_HISTORY_PATH, enabled: bool = QUERY_HISTORY_ENABLED,
+                 retention_days: float = QUERY_HISTORY_RETENTION_DAYS, max_rows: int = QUERY_HISTORY_MAX_ROWS):
+        self.path = path
+        self.enabled = enabled
+        self.retention_days = retention_days
+        self.max_rows = max_rows
+        self._queue: 'queue.Queue[Dict[str, Any]]' = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS query_history ('
+            'ts REAL, source TEXT, query_name TEXT, sql_hash TEXT, params TEXT, origin TEXT, '
+            'connect_ms REAL, execute_ms REAL, total_ms REAL, rows INTEGER, bytes INTEGER, '
+            'cache_hit INTEGER, coalesced INTEGER, slow INTEGER, error TEXT, plan TEXT, sample REAL)'
+        )
+        # Logs written by older versions lack the newer columns
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(query_history)')}
+        for column in HISTORY_COLUMNS:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE query_history ADD COLUMN {column}')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_query_history_ts ON query_history (ts)')
+        return conn
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """
+        Queue one run for writing.
+
+        Args:
+            entry (Dict[str, Any]): Run details keyed by HISTORY_COLUMNS; missing
+                keys are stored as NULL.
+        """
+        if not self.enabled:
+            return
+        entry = dict(entry)
+        entry.setdefault('ts', time.time())
+        entry['slow'] = (entry.get('total_ms') or 0) >= SLOW_QUERY_MS
+        if entry['slow']:
+            label = entry.get('query_name') or f"custom:{entry.get('sql_hash')}"
+            print(f"Slow query {entry.get('source')}/{label}: {entry['total_ms']:.0f} ms, {entry.get('rows')} rows")
+        if not isinstance(entry.get('params'), (str, type(None))):
+            entry['params'] = json.dumps(entry['params'], sort_keys=True, default=str)
+        self._queue.put(entry)
+        self._ensure_writer()
+
+    def _ensure_writer(self) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='query-history', daemon=True)
+                self._writer.start()
+
+    def _write_loop(self) -> None:
+        conn = None
+        while True:
+            entries = [self._queue.get()]
+            while True:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    conn = self._connect()
+                with conn:
+                    conn.executemany(
+                        f"INSERT INTO query_history VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})",
+                        [tuple(entry.get(col) for col in HISTORY_COLUMNS) for entry in entries]
+                    )
+                    self._prune(conn)
+            except sqlite3.Error as e:
+                print(f"Error writing query history: {e}")
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        """Delete runs past the retention age and beyond the row limit, both cheap on the ts index and rowid."""
+        if self.retention_days:
+            conn.execute('DELETE FROM query_history WHERE ts < ?', [time.time() - self.retention_days * 86400])
+        if self.max_rows:
+            # Rows are appended, so rowids follow insertion order
+            conn.execute('DELETE FROM query_history WHERE rowid <= (SELECT MAX(rowid) FROM query_history) - ?',
+                         [self.max_rows])
+
+    def flush(self) -> None:
+        """Block until every queued run has been written."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def load(self, since: Optional[float] = None) -> pd.DataFrame:
+        """
+        Load recorded runs.
+
+        Args:
+            since (Optional[float]): Only runs after this Unix timestamp.
+
+        Returns:
+            pd.DataFrame: One row per run.
+        """
+        if not os.path.exists(self.path):
+            return pd.DataFrame(columns=HISTORY_COLUMNS)
+        conn = self._connect()
+        try:
+            return pd.read_sql_query(
+                'SELECT * FROM query_history WHERE ts >= ?', conn, params=[since or 0]
+            )
+        finally:
+            conn.close()
+
+    def _query(self, sql: str, params: list) -> pd.DataFrame:
+        if not os.path.exists(self.path):
+            return pd.DataFrame()
+        conn = self._connect()
+        try:
+            return pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+
+    def captured_plans(self, limit: int = 20) -> pd.DataFrame:
+        """
+        Return the most recent runs with a captured query plan.
+
+        Args:
+            limit (int): Maximum number of runs.
+
+        Returns:
+            pd.DataFrame: Time, source, query, latency and plan of each run.
+        """
+        runs = self._query(
+            f"SELECT ts, source, {QUERY_LABEL_SQL} AS query, total_ms, plan FROM query_history "
+            'WHERE plan IS NOT NULL ORDER BY ts DESC LIMIT ?', [limit]
+        )
+        if runs.empty:
+            return pd.DataFrame()
+        runs['time'] = pd.to_datetime(runs['ts'], unit='s').dt.strftime('%Y-%m-%d %H:%M:%S')
+        return runs[['time', 'source', 'query', 'total_ms', 'plan']].round({'total_ms': 1})
+
+    def summary(self, since: Optional[float] = None) -> pd.DataFrame:
+        """
+        Aggregate recorded runs per query with percentile latencies.
+
+        The aggregation runs in SQLite, so only one row per query is loaded.
+
+        Args:
+            since (Optional[float]): Only runs after this Unix timestamp; defaults
+                to the last QUERY_HISTORY_SUMMARY_DAYS days.
+
+        Returns:
+            pd.DataFrame: One row per source and query with run counts,
+                latency percentiles, average rows and size, cache hit rate
+                and error count.
+        """
+        if since is None:
+            since = time.time() - QUERY_HISTORY_SUMMARY_DAYS * 86400
+        summary = self._query(SUMMARY_SQL, [since])
+        if summary.empty:
+            return pd.DataFrame()
+        return summary.round({'p50_ms': 1, 'p95_ms': 1, 'p99_ms': 1, 'max_ms': 1, 'avg_rows': 0,
+                              'avg_bytes': 0, 'cache_hit_rate': 2})
+
+# Shared history used by execute_sql_query
+query_history = QueryHistory()
@@ -0,0 +1,103 @@
+"""
+Report data generation shared by the dashboard and background jobs.
+
+This module does not import Dash; rendering report data into components is
+left to utils.unpack_to_dash, report_to_html renders it as static HTML for
+headless runs.
+"""
+
+import html
+import importlib
+import pandas as pd
+import plotly.graph_objects as go
+from profiler import profile_report
+from typing import Any, Optional, Tuple
+
+def report_name(query_name: str) -> str:
+    """Return the report module name for a query filename; 'risk/var.sql' maps to reports/risk/var.py."""
+    return query_name.replace('.sql', '').replace('/', '.')
+
+def create_report_data(source: str, query_name: Optional[str], df: pd.DataFrame) -> Any:
+    """
+    Build report data for a query result.
+
+    Uses the query's create_report function from {source}/reports when it
+    exists and falls back to the built-in profiler otherwise.
+
+    Args:
+        source (str): Source module name.
+        query_name (Optional[str]): Query filename, or None for custom SQL.
+        df (pd.DataFrame): Query result.
+
+    Returns:
+        Any: Report data to be unpacked into components.
+    """
+    report_data = None
+    if query_name:
+        name = report_name(query_name)
+        try:
+            report_module = importlib.import_module(f'{source}.reports.{name}')
+            if hasattr(report_module, 'create_report'):
+                report_data = report_module.create_report(df)
+        except ImportError:
+            print(f"No custom report module found for {name}")
+
+    # Fallback to the built-in profile if no custom report
+    if report_data is None:
+        report_data = profile_report(df)
+    return report_data
+
+def report_to_html(report_data: Any, title: str = '') -> str:
+    """
+    Render report data as a standalone HTML page.
+
+    Mirrors utils.unpack_to_dash: dict keys become headings, lists are
+    rendered item by item, DataFrames become tables and figures are embedded
+    with plotly.js loaded from its CDN.
+
+    Args:
+        report_data (Any): Report data from create_report_data.
+        title (str): Page title.
+
+    Returns:
+        str: The HTML document.
+    """
+    parts = []
+    plotlyjs = 'cdn'
+
+    def render(data):
+        nonlocal plotlyjs
+        if isinstance(data, dict):
+            for key, value in data.items():
+                parts.append(f'<h5>{html.escape(str(key))}</h5>')
+                render(value)
+        elif isinstance(data, list):
+            for item in data:
+                render(item)
+        elif isinstance(data, pd.DataFrame):
+            parts.append(data.to_html(index=False, border=0))
+        elif isinstance(data, go.Figure):
+            # plotly.js is loaded once per page
+            parts.append(data.to_html(full_html=False, include_plotlyjs=plotlyjs))
+            plotlyjs = False
+        else:
+            parts.append(f'<pre>{html.escape(str(data))}</pre>')
+
+    render(report_data)
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title></head>'
+            f'<body><h3>{html.escape(title)}</h3>{"".join(parts)}</body></html>')
+
+def report_key(query_name: Optional[str], fingerprint: Optional[dict]) -> Optional[Tuple]:
+    """
+    Build the report cache key for a query result.
+
+    Args:
+        query_name (Optional[str]): Query filename.
+        fingerprint (Optional[dict]): Fingerprint of the result from result_diff.
+
+    Returns:
+        Optional[Tuple]: Cache key, or None if the result cannot be identified.
+    """
+    if not query_name or not fingerprint:
+        return None
+    return query_name, fingerprint['rows'], tuple(fingerprint['blocks'])
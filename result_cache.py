@@ -0,0 +1,83 @@
+"""
+In-memory caches for query results and generated reports.
+
+Entries expire after a time-to-live and the least recently used entries are
+evicted once a cache is full.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+# Seconds a cached query result stays valid
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', '600'))
+
+# Maximum number of results kept per source
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '64'))
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with per-entry expiry.
+
+    Args:
+        ttl (float): Default seconds an entry stays valid.
+        max_entries (int): Maximum number of entries kept.
+    """
+    def __init__(self, ttl: float = RESULT_CACHE_TTL, max_entries: int = RESULT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Return a cached value, or None if it is missing or expired.
+
+        Args:
+            key (Hashable): Cache key.
+
+        Returns:
+            Optional[Any]: The cached value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value.
+
+        Args:
+            key (Hashable): Cache key.
+            value (Any): Value to cache.
+            ttl (Optional[float]): Seconds the entry stays valid. Defaults to the cache TTL.
+        """
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Remove one entry."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
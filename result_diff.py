@@ -0,0 +1,107 @@
+"""
+Result diffing utilities for sending partial updates of query results.
+
+A compact fingerprint of every result is kept in the browser next to the
+query. When the same query is run again, the new result is compared with the
+fingerprint block by block so only changed, appended or removed rows have to
+be sent back.
+"""
+
+import hashlib
+import pandas as pd
+from typing import Dict, List, Optional, Any
+
+# Number of rows hashed into one fingerprint block
+ROW_BLOCK_SIZE = 500
+
+# Above this share of touched rows a full replacement is cheaper than a patch
+MAX_PATCH_RATIO = 0.5
+
+def _row_hashes(df: pd.DataFrame) -> Any:
+    """Return one 64-bit hash per row of the DataFrame."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+def _block_digest(hashes: Any) -> str:
+    """Return a short digest of a block of row hashes."""
+    return hashlib.blake2b(hashes.tobytes(), digest_size=8).hexdigest()
+
+def fingerprint_result(df: pd.DataFrame, block_size: int = ROW_BLOCK_SIZE) -> Dict[str, Any]:
+    """
+    Build a compact fingerprint of a query result.
+
+    Args:
+        df (pd.DataFrame): Query result.
+        block_size (int): Number of rows per fingerprint block.
+
+    Returns:
+        Dict[str, Any]: Row count, column names and per-block digests.
+    """
+    hashes = _row_hashes(df)
+    return {
+        'rows': len(df),
+        'columns': [str(col) for col in df.columns],
+        'block_size': block_size,
+        'blocks': [_block_digest(hashes[i:i + block_size]) for i in range(0, len(df), block_size)]
+    }
+
+def diff_result(previous: Optional[Dict[str, Any]], df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """
+    Compare a new result with the fingerprint of the previous one.
+
+    Args:
+        previous (Optional[Dict[str, Any]]): Fingerprint of the previous result.
+        df (pd.DataFrame): New query result.
+
+    Returns:
+        Optional[Dict[str, Any]]: Row operations with keys 'replace' (list of
+            (start, end) row ranges), 'append_from', 'delete_from' and
+            'old_rows', or None when the result should be sent as a full
+            replacement.
+    """
+    if not previous or not previous.get('blocks'):
+        return None
+    if previous.get('columns') != [str(col) for col in df.columns]:
+        return None
+
+    old_rows = previous['rows']
+    new_rows = len(df)
+    block_size = previous['block_size']
+    hashes = _row_hashes(df)
+
+    replace = []
+    for b, digest in enumerate(previous['blocks']):
+        start = b * block_size
+        end = min(start + block_size, old_rows)
+        if end > new_rows:
+            # The old block extends past the new result; rows up to the end are compared
+            # against the truncated block and anything beyond is deleted below.
+            end = new_rows
+            if start < end:
+                replace.append((start, end))
+            continue
+        if _block_digest(hashes[start:end]) != digest:
+            replace.append((start, end))
+
+    # Merge adjacent ranges into larger row spans
+    merged: List[List[int]] = []
+    for start, end in replace:
+        if merged and merged[-1][1] == start:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    touched = sum(end - start for start, end in merged)
+    touched += max(new_rows - old_rows, 0) + max(old_rows - new_rows, 0)
+    if touched > MAX_PATCH_RATIO * max(new_rows, 1):
+        return None
+
+    return {
+        'replace': [tuple(span) for span in merged],
+        'append_from': old_rows if new_rows > old_rows else None,
+        'delete_from': new_rows if new_rows < old_rows else None,
+        'old_rows': old_rows
+    }
+
+def is_unchanged(diff: Dict[str, Any]) -> bool:
+    """Return True if a diff carries no row operations."""
+    return not diff['replace'] and diff['append_from'] is None and diff['delete_from'] is None
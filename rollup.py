@@ -0,0 +1,142 @@
+"""
+Time-bucket rollups of query results.
+
+A rollup groups a result by a date column truncated to a day, week or month
+bucket, plus optional series columns, and aggregates measure columns. When
+the source declares DATE_BUCKET_SQL the rollup is pushed down into SQL as a
+GROUP BY around the saved query, so only the aggregated rows are fetched;
+otherwise the full result is aggregated in pandas. Buckets are labelled with
+their first day as an ISO date string; weeks start on Monday.
+"""
+
+import re
+from typing import Dict, List, Any, Optional
+import pandas as pd
+
+ROLLUP_BUCKETS = ('day', 'week', 'month')
+ROLLUP_FUNCTIONS = ('avg', 'sum', 'min', 'max', 'count')
+
+# Bucket expressions for sqlite, which stores dates as ISO text
+SQLITE_DATE_BUCKETS = {
+    'day': "date({column})",
+    'week': "date({column}, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', {column})"
+}
+
+# Bucket expressions for databases with date_trunc, e.g. PostgreSQL and DuckDB
+DATE_TRUNC_BUCKETS = {
+    'day': "CAST(date_trunc('day', {column}) AS DATE)",
+    'week': "CAST(date_trunc('week', {column}) AS DATE)",
+    'month': "CAST(date_trunc('month', {column}) AS DATE)"
+}
+
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_]\w*$')
+
+PANDAS_FUNCTIONS = {'avg': 'mean', 'sum': 'sum', 'min': 'min', 'max': 'max', 'count': 'count'}
+
+def normalize_rollup(spec: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Validate a rollup specification from the query panel.
+
+    Args:
+        spec (Optional[Dict[str, Any]]): 'date_column', 'bucket', 'measures',
+            'functions' and 'group_by' as entered.
+
+    Returns:
+        Optional[Dict[str, Any]]: The cleaned specification, or None when no
+            rollup is asked for (no date column, bucket or measure).
+
+    Raises:
+        ValueError: If a column name is not a plain identifier or a bucket or
+            function is unknown.
+    """
+    if not spec or not spec.get('date_column') or not spec.get('bucket') or not spec.get('measures'):
+        return None
+    if spec['bucket'] not in ROLLUP_BUCKETS:
+        raise ValueError(f"Unknown rollup bucket: {spec['bucket']}")
+    functions = list(spec.get('functions') or ['avg'])
+    for function in functions:
+        if function not in ROLLUP_FUNCTIONS:
+            raise ValueError(f'Unknown rollup function: {function}')
+    group_by = [col for col in spec.get('group_by') or [] if col != spec['date_column']]
+    measures = [col for col in spec['measures'] if col != spec['date_column'] and col not in group_by]
+    for column in [spec['date_column'], *group_by, *measures]:
+        if not IDENTIFIER_PATTERN.match(column):
+            raise ValueError(f'Rollup column must be a plain identifier: {column}')
+    if not measures:
+        return None
+    return {'date_column': spec['date_column'], 'bucket': spec['bucket'],
+            'measures': measures, 'functions': functions, 'group_by': group_by}
+
+def rollup_key(rollup: Dict[str, Any]) -> tuple:
+    """Return a hashable key of a rollup specification."""
+    return (rollup['date_column'], rollup['bucket'], tuple(rollup['measures']),
+            tuple(rollup['functions']), tuple(rollup['group_by']))
+
+def output_column(function: str, measure: str) -> str:
+    """Name of the aggregate column of a measure."""
+    return f'{function}_{measure}'
+
+def rollup_statement(statement: str, rollup: Dict[str, Any], bucket_sql: Dict[str, str],
+                     aggregates: Optional[List[str]] = None) -> str:
+    """
+    Wrap a statement in a GROUP BY over its truncated date column.
+
+    Args:
+        statement (str): Driver statement of the query.
+        rollup (Dict[str, Any]): Normalized rollup specification.
+        bucket_sql (Dict[str, str]): Bucket expressions with a {column} placeholder.
+        aggregates (Optional[List[str]]): Aggregate expressions over 'rolled' to select
+            instead of the rollup's functions of its measures.
+
+    Returns:
+        str: The rollup statement; placeholders keep their order.
+    """
+    inner = statement.strip().rstrip(';')
+    bucket = bucket_sql[rollup['bucket']].format(column=f"rolled.{rollup['date_column']}")
+    keys = [bucket, *(f'rolled.{col}' for col in rollup['group_by'])]
+    aggregates = aggregates or [
+        f'{function.upper()}(rolled.{measure}) AS {output_column(function, measure)}'
+        for measure in rollup['measures'] for function in rollup['functions']
+    ]
+    select = [f"{bucket} AS {rollup['date_column']}", *(f'rolled.{col} AS {col}' for col in rollup['group_by'])]
+    return (f"SELECT {', '.join(select + aggregates)} FROM ({inner}) AS rolled "
+            f"GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}")
+
+def bucket_dates(dates: pd.Series, bucket: str) -> pd.Series:
+    """Truncate dates to their bucket and label them as ISO date strings."""
+    parsed = pd.to_datetime(dates, errors='coerce')
+    if bucket == 'day':
+        start = parsed.dt.normalize()
+    elif bucket == 'week':
+        start = parsed.dt.normalize() - pd.to_timedelta(parsed.dt.weekday, unit='D')
+    else:
+        start = parsed.dt.to_period('M').dt.start_time
+    return start.dt.strftime('%Y-%m-%d')
+
+def rollup_frame(df: pd.DataFrame, rollup: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Aggregate a fetched result like rollup_statement does in SQL.
+
+    Args:
+        df (pd.DataFrame): Full query result.
+        rollup (Dict[str, Any]): Normalized rollup specification.
+
+    Returns:
+        pd.DataFrame: One row per bucket and series, ordered by them.
+
+    Raises:
+        KeyError: If a rollup column is not in the result.
+    """
+    missing = [col for col in [rollup['date_column'], *rollup['group_by'], *rollup['measures']] if col not in df.columns]
+    if missing:
+        raise KeyError(f"Rollup columns not in result: {', '.join(missing)}")
+    keys = [rollup['date_column'], *rollup['group_by']]
+    frame = df[rollup['group_by'] + rollup['measures']].copy()
+    frame.insert(0, rollup['date_column'], bucket_dates(df[rollup['date_column']], rollup['bucket']))
+    grouped = frame.groupby(keys, dropna=False, sort=True)[rollup['measures']].agg(
+        {measure: [PANDAS_FUNCTIONS[function] for function in rollup['functions']] for measure in rollup['measures']}
+    )
+    grouped.columns = [output_column(function, measure)
+                       for measure in rollup['measures'] for function in rollup['functions']]
+    return grouped.reset_index()
@@ -2,11 +2,11 @@
 REM Activate virtual environment
 call venv\Scripts\activate.bat
 
-REM Run the app with optional source parameter
+REM Run the app with optional source parameters
 if "%1"=="" (
     python app.py
 ) else (
-    python app.py %1
+    python app.py %*
 )
 
 REM Keep the window open if there's an error
@@ -0,0 +1,245 @@
+"""
+Approximate exploration by sampled execution.
+
+An approximate run reads a random sample of the first base table its SQL
+selects from instead of the whole table. The source's TABLE_SAMPLE_SQL
+wraps the table in a TABLESAMPLE clause or a random-row predicate, and a
+SAMPLE_TABLES entry points it at a sample table maintained next to it,
+which is the fastest option. Joined tables are read in full, so a sampled
+fact table still joins to complete dimension tables.
+
+Without a rollup a sampled run returns the sampled rows. With one, each
+aggregate is scaled back to the full table and a '<aggregate>_se' column
+next to it holds its standard error under Bernoulli sampling of rows;
+'sample_rows' counts the sampled rows behind each bucket. MIN and MAX are
+those of the sample and carry no error estimate.
+"""
+
+import os
+import re
+from typing import Dict, List, Any, Optional, Set, Tuple
+import numpy as np
+import pandas as pd
+from rollup import bucket_dates, output_column
+
+# Comma-separated sample fractions offered by the query panel
+SAMPLE_FRACTIONS = tuple(float(f) for f in os.getenv('SAMPLE_FRACTIONS', '0.001,0.01,0.1').split(','))
+
+# Sampled table for sqlite: a random-row predicate, read in one pass over the table
+SQLITE_TABLE_SAMPLE = '(SELECT * FROM {table} WHERE abs(random() % 1000000) < {per_million}) AS {alias}'
+
+# Sampled table for databases with TABLESAMPLE, e.g. PostgreSQL, DuckDB and SQL Server
+TABLESAMPLE_BERNOULLI = '{table} AS {alias} TABLESAMPLE BERNOULLI ({percent})'
+
+# Sampled table reading whole pages, faster but clustered; PostgreSQL and DuckDB
+TABLESAMPLE_SYSTEM = '{table} AS {alias} TABLESAMPLE SYSTEM ({percent})'
+
+# Table after FROM with optional alias, e.g. 'FROM stock_prices AS s'
+FROM_TABLE_PATTERN = re.compile(r'\bFROM\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+# Parentheses, SELECT and FROM keywords, for telling FROM clauses from FROM inside
+# function arguments such as EXTRACT(year FROM date) or IS DISTINCT FROM
+CLAUSE_TOKEN_PATTERN = re.compile(r'\(|\)|\bSELECT\b|\bDISTINCT\s+FROM\b|\bFROM\b', re.IGNORECASE)
+
+# Quoted string literals, whose text is not SQL
+STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+
+# Names of common table expressions, e.g. 'WITH recent AS (' or ', c(x) AS ('
+CTE_NAME_PATTERN = re.compile(r'(?:\bWITH(?:\s+RECURSIVE)?|,)\s+(\w+)\s*(?:\([^)]*\))?\s+AS\s*\(', re.IGNORECASE)
+
+# Words that can follow a table name but are not an alias
+NON_ALIASES = {
+    'where', 'join', 'left', 'right', 'inner', 'outer', 'full', 'cross', 'natural', 'on', 'using', 'group',
+    'order', 'limit', 'having', 'union', 'except', 'intersect', 'window', 'tablesample', 'offset', 'fetch'
+}
+
+def normalize_fraction(fraction: Any) -> Optional[float]:
+    """
+    Validate a sample fraction from the query panel.
+
+    Args:
+        fraction (Any): Fraction as entered; empty means an exact run.
+
+    Returns:
+        Optional[float]: The fraction, or None for an exact run.
+
+    Raises:
+        ValueError: If the fraction is not between 0 and 1.
+    """
+    if fraction in (None, '', 0):
+        return None
+    fraction = float(fraction)
+    if not 0 < fraction < 1:
+        raise ValueError(f'Sample fraction must be between 0 and 1: {fraction}')
+    return fraction
+
+def clause_froms(statement: str) -> Set[int]:
+    """
+    Return the positions of the FROM keywords that start a FROM clause.
+
+    A FROM counts when the parentheses around it hold a SELECT, i.e. it belongs
+    to the statement or a subquery rather than to function arguments.
+    """
+    masked = STRING_LITERAL_PATTERN.sub(lambda match: ' ' * len(match.group()), statement)
+    selects = [False]
+    positions = set()
+    for token in CLAUSE_TOKEN_PATTERN.finditer(masked):
+        word = token.group().upper()
+        if word == '(':
+            selects.append(False)
+        elif word == ')':
+            if len(selects) > 1:
+                selects.pop()
+        elif word == 'SELECT':
+            selects[-1] = True
+        elif word == 'FROM' and selects[-1]:
+            positions.add(token.start())
+    return positions
+
+def sampled_table(statement: str) -> Optional[re.Match]:
+    """Return the FROM reference of the first base table in a statement, skipping CTE names."""
+    ctes = {name.lower() for name in CTE_NAME_PATTERN.findall(statement)}
+    froms = clause_froms(statement)
+    for match in FROM_TABLE_PATTERN.finditer(statement):
+        if match.start() in froms and match.group(1).lower() not in ctes:
+            return match
+    return None
+
+def sample_statement(
+    statement: str,
+    fraction: float,
+    table_sample_sql: Optional[str],
+    sample_tables: Optional[Dict[str, Tuple[str, float]]] = None
+) -> Tuple[str, float]:
+    """
+    Rewrite a statement to read a sample of its first base table.
+
+    Args:
+        statement (str): Driver statement.
+        fraction (float): Fraction of rows to read.
+        table_sample_sql (Optional[str]): Sampled table template with {table},
+            {alias}, {percent} and {per_million} placeholders.
+        sample_tables (Optional[Dict[str, Tuple[str, float]]]): Maintained sample
+            tables and their fractions by base table; they take precedence.
+
+    Returns:
+        Tuple[str, float]: The sampled statement and the fraction it reads.
+
+    Raises:
+        ValueError: If the statement reads no table or the source cannot sample it.
+    """
+    match = sampled_table(statement)
+    if match is None:
+        raise ValueError('Approximate runs need a query that selects from a table')
+    table, alias = match.group(1), match.group(2)
+    if alias and alias.lower() in NON_ALIASES:
+        alias = None
+    end = match.end(2) if alias else match.end(1)
+    maintained = {name.lower(): entry for name, entry in (sample_tables or {}).items()}
+    if table.lower() in maintained:
+        sample_table, fraction = maintained[table.lower()]
+        sampled = f'{sample_table} AS {alias or table}'
+    elif table_sample_sql:
+        sampled = table_sample_sql.format(table=table, alias=alias or table, percent=round(fraction * 100, 6),
+                                          per_million=int(round(fraction * 1000000)))
+    else:
+        raise ValueError('This source does not support approximate runs')
+    return statement[:match.start(1)] + sampled + statement[end:], fraction
+
+def refresh_sample_table(conn: Any, table: str, sample_table: str, fraction: float, table_sample_sql: str) -> int:
+    """
+    Rebuild a maintained sample table from its base table.
+
+    Args:
+        conn (Any): Writable DB-API connection.
+        table (str): Base table.
+        sample_table (str): Sample table to replace.
+        fraction (float): Fraction of rows to keep.
+        table_sample_sql (str): Sampled table template of the source.
+
+    Returns:
+        int: Rows in the new sample table.
+    """
+    sampled, _ = sample_statement(f'SELECT * FROM {table}', fraction, table_sample_sql)
+    cursor = conn.cursor()
+    cursor.execute(f'DROP TABLE IF EXISTS {sample_table}')
+    cursor.execute(f'CREATE TABLE {sample_table} AS {sampled}')
+    cursor.execute(f'SELECT COUNT(*) FROM {sample_table}')
+    rows = cursor.fetchone()[0]
+    conn.commit()
+    return rows
+
+def moment_columns(measure: str) -> Tuple[str, str, str]:
+    """Names of the count, sum and sum of squares columns of a measure."""
+    return f'n__{measure}', f's__{measure}', f'ss__{measure}'
+
+def moment_aggregates(rollup: Dict[str, Any]) -> List[str]:
+    """SQL aggregates over 'rolled' that estimate_frame turns into scaled aggregates."""
+    aggregates = ['COUNT(*) AS sample_rows']
+    for measure in rollup['measures']:
+        n, s, ss = moment_columns(measure)
+        aggregates += [f'COUNT(rolled.{measure}) AS {n}', f'SUM(rolled.{measure}) AS {s}',
+                       f'SUM(rolled.{measure} * rolled.{measure}) AS {ss}']
+        aggregates += [f'{function.upper()}(rolled.{measure}) AS {output_column(function, measure)}'
+                       for function in rollup['functions'] if function in ('min', 'max')]
+    return aggregates
+
+def moments_frame(df: pd.DataFrame, rollup: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Compute in pandas what moment_aggregates computes in SQL.
+
+    Raises:
+        KeyError: If a rollup column is not in the result.
+    """
+    missing = [col for col in [rollup['date_column'], *rollup['group_by'], *rollup['measures']] if col not in df.columns]
+    if missing:
+        raise KeyError(f"Rollup columns not in result: {', '.join(missing)}")
+    keys = [rollup['date_column'], *rollup['group_by']]
+    frame = df[rollup['group_by']].copy()
+    frame.insert(0, rollup['date_column'], bucket_dates(df[rollup['date_column']], rollup['bucket']))
+    frame['sample_rows'] = 1
+    aggregations = {'sample_rows': ('sample_rows', 'count')}
+    for measure in rollup['measures']:
+        n, s, ss = moment_columns(measure)
+        values = pd.to_numeric(df[measure], errors='coerce')
+        frame[measure] = values
+        frame[ss] = values * values
+        aggregations.update({n: (measure, 'count'), s: (measure, 'sum'), ss: (ss, 'sum')})
+        aggregations.update({output_column(function, measure): (measure, function)
+                             for function in rollup['functions'] if function in ('min', 'max')})
+    return frame.groupby(keys, dropna=False, sort=True).agg(**aggregations).reset_index()
+
+def estimate_frame(moments: pd.DataFrame, rollup: Dict[str, Any], fraction: float) -> pd.DataFrame:
+    """
+    Scale sampled moments to full-table aggregates with standard errors.
+
+    Args:
+        moments (pd.DataFrame): Buckets with the columns of moment_aggregates.
+        rollup (Dict[str, Any]): Normalized rollup specification.
+        fraction (float): Fraction of rows the sample holds.
+
+    Returns:
+        pd.DataFrame: Buckets with '<aggregate>' and '<aggregate>_se' columns and 'sample_rows'.
+    """
+    result = moments[[rollup['date_column'], *rollup['group_by']]].copy()
+    keep = 1 - fraction
+    for measure in rollup['measures']:
+        n_col, s_col, ss_col = moment_columns(measure)
+        n = moments[n_col].astype(float)
+        s = moments[s_col].astype(float).fillna(0.0)
+        ss = moments[ss_col].astype(float).fillna(0.0)
+        for function in rollup['functions']:
+            column = output_column(function, measure)
+            if function == 'count':
+                estimate, error = n / fraction, np.sqrt(n * keep) / fraction
+            elif function == 'sum':
+                estimate, error = s / fraction, np.sqrt(ss * keep) / fraction
+            elif function == 'avg':
+                variance = (ss - s * s / n.where(n > 0)) / (n - 1).where(n > 1)
+                estimate, error = s / n.where(n > 0), np.sqrt(variance.clip(lower=0) * keep / n)
+            else:
+                estimate, error = moments[column], np.nan
+            result[column] = estimate
+            result[f'{column}_se'] = error
+    result['sample_rows'] = moments['sample_rows'].astype(int)
+    return result
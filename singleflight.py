@@ -0,0 +1,120 @@
+"""
+Single-flight coalescing of identical concurrent calls.
+
+The first caller for a key runs the work; callers arriving with the same key
+while it is in flight wait on the same future and share its result.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, Any
+
+class SingleFlight:
+    """Coalesce identical concurrent calls by key."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._waiters: Dict[Hashable, int] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers with the same key.
+
+        Args:
+            key (Hashable): Identity of the call.
+            fn (Callable[[], Any]): Work to run if no identical call is in flight.
+
+        Returns:
+            Tuple[Any, bool]: The result and whether this caller waited on
+                another caller's run instead of running fn itself.
+
+        Raises:
+            Exception: Any exception raised by fn, for the leader and all waiters.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self._waiters[key] = self._waiters.get(key, 0) + 1
+
+        if not leader:
+            try:
+                return future.result(), True
+            finally:
+                self._leave(key)
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Async variant of do; waiters await instead of blocking their thread.
+
+        Sync and async callers share the same in-flight calls, also across
+        event loops.
+
+        Args:
+            key (Hashable): Identity of the call.
+            fn (Callable[[], Awaitable[Any]]): Coroutine function to run if no
+                identical call is in flight.
+
+        Returns:
+            Tuple[Any, bool]: The result and whether this caller waited on
+                another caller's run.
+
+        Raises:
+            Exception: Any exception raised by fn, for the leader and all waiters.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self._waiters[key] = self._waiters.get(key, 0) + 1
+
+        if not leader:
+            try:
+                return await asyncio.wrap_future(future), True
+            finally:
+                self._leave(key)
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _leave(self, key: Hashable) -> None:
+        with self._lock:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def waiting(self, key: Hashable) -> int:
+        """Return the number of callers waiting on another caller's run of key."""
+        with self._lock:
+            return self._waiters.get(key, 0)
+
+    def in_flight(self) -> int:
+        """Return the number of keys currently being computed."""
+        with self._lock:
+            return len(self._in_flight)
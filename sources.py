@@ -0,0 +1,286 @@
+"""
+Source registry for serving several source modules from one application.
+
+Each source's connection module, query catalog and caches are initialized
+lazily on first use and dropped again once the source has been idle for
+longer than the configured timeout.
+"""
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+from config import Config, init_config
+from db_utils import load_queries, result_columns, query_files
+from result_cache import ResultCache
+from param_index import ParamIndex
+from catalog_index import CatalogIndex, CATALOG_SEARCH_LIMIT
+
+# Seconds a source may stay unused before its state is dropped
+SOURCE_IDLE_TIMEOUT = float(os.getenv('SOURCE_IDLE_TIMEOUT', '1800'))
+# Seconds between checks of a source's query files for changes; 0 disables reloading
+QUERY_RELOAD_INTERVAL = float(os.getenv('QUERY_RELOAD_INTERVAL', '5'))
+# Result-column probes running at once while a catalog is shipped to the browser
+CATALOG_PROBE_WORKERS = int(os.getenv('CATALOG_PROBE_WORKERS', '4'))
+
+class SourceContext:
+    """
+    Runtime state of one source module.
+
+    Args:
+        config (Config): Configuration of the source.
+        queries (Dict[str, Dict[str, Any]]): Loaded query catalog of the source.
+    """
+    def __init__(self, config: Config, queries: Dict[str, Dict[str, Any]]):
+        self.config = config
+        self.queries = queries
+        self.max_params = max((len(query['params']) for query in queries.values()), default=0)
+        # Per-source caches, keyed by cache name
+        self.caches: Dict[str, Any] = {
+            'results': ResultCache(),
+            'reports': ResultCache(),
+            'param_values': ParamIndex()
+        }
+        self.catalog_index = CatalogIndex()
+        self.catalog_index.update(queries)
+        # Bumped on every reload, so a browser holding an older catalog knows to fetch it again
+        self.catalog_version = 1
+        self.last_used = time.monotonic()
+        self._catalog_checked = self.last_used
+        # Held while the query files are checked, so concurrent requests do not walk them twice
+        self._reload_lock = threading.Lock()
+        self._catalog_signature = self.catalog_signature()
+
+    @property
+    def result_cache(self) -> ResultCache:
+        """Cache of query results keyed by source, statement and arguments."""
+        return self.caches['results']
+
+    @property
+    def report_cache(self) -> ResultCache:
+        """Cache of rendered reports keyed by query and result fingerprint."""
+        return self.caches['reports']
+
+    @property
+    def param_index(self) -> ParamIndex:
+        """Distinct-value indexes for parameter autocomplete."""
+        return self.caches['param_values']
+
+    @property
+    def source(self) -> str:
+        """Name of the source module."""
+        return self.config.source
+
+    def catalog_signature(self) -> tuple:
+        """Return the names, modification times and sizes of the source's query files."""
+        try:
+            return tuple((name, stat.st_mtime_ns, stat.st_size)
+                         for name, _, stat in query_files(self.config.queries_path))
+        except OSError:
+            return ()
+
+    def refresh_queries(self, interval: float = QUERY_RELOAD_INTERVAL) -> bool:
+        """
+        Reload the query catalog if a query file changed since it was loaded.
+
+        Only changed files are read and compiled again, and only their entries
+        in the search index are rebuilt. Results of composed queries are keyed
+        by the version of their upstream queries, so a changed upstream file
+        makes every downstream result miss the cache. While one thread checks
+        the files, others return at once and keep using the loaded catalog.
+
+        Args:
+            interval (float): Seconds between checks of the query files.
+
+        Returns:
+            bool: Whether the catalog was reloaded.
+        """
+        now = time.monotonic()
+        if not interval or now - self._catalog_checked < interval:
+            return False
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._catalog_checked = now
+            signature = self.catalog_signature()
+            if signature == self._catalog_signature:
+                return False
+            self.queries = load_queries(self.config, self.queries)
+            self.catalog_index.update(self.queries)
+            self.max_params = max((len(query['params']) for query in self.queries.values()), default=0)
+            self._catalog_signature = signature
+            self.catalog_version += 1
+            print(f'Source {self.source} reloaded with {len(self.queries)} queries')
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def _columns(self, name: str) -> List[str]:
+        """Return the result columns of a query, probed once per loaded catalog."""
+        query = self.queries[name]
+        if 'columns' not in query:
+            try:
+                query['columns'] = result_columns(name, self.config, self.queries)
+            except Exception as e:
+                print(f'Column lookup error for {name}: {e}')
+                query['columns'] = []
+        return query['columns']
+
+    def search_queries(self, text: str, limit: int = CATALOG_SEARCH_LIMIT) -> List[str]:
+        """Return the query filenames best matching a search over names, folders, parameters and SQL."""
+        return self.catalog_index.search(text, limit)
+
+    def catalog(self, names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Return catalog entries as plain data for the browser.
+
+        The parameter panel and rollup options are rendered from them without
+        a server round trip when the selected query changes. Sources with many
+        queries ship the entries of the listed queries only, as the user
+        searches for them.
+
+        Args:
+            names (Optional[List[str]]): Queries to include. Defaults to all.
+
+        Returns:
+            Dict[str, Any]: 'queries' mapping each query filename to its
+                'params' (name and type) and result 'columns', 'max_params'
+                and the catalog 'version'.
+        """
+        names = sorted(self.queries) if names is None else [name for name in names if name in self.queries]
+        with ThreadPoolExecutor(max_workers=max(CATALOG_PROBE_WORKERS, 1), thread_name_prefix='catalog') as pool:
+            columns = list(pool.map(self._columns, names))
+        return {
+            'queries': {
+                name: {
+                    'params': [{'name': param['name'], 'type': param['type']} for param in self.queries[name]['params']],
+                    'columns': cols
+                }
+                for name, cols in zip(names, columns)
+            },
+            'max_params': self.max_params,
+            'version': self.catalog_version
+        }
+
+    def close(self) -> None:
+        """Release the source's connections and caches."""
+        connection_module = sys.modules.get(f'{self.source}.connection')
+        release = getattr(connection_module, 'release_connections', None)
+        if callable(release):
+            try:
+                release()
+            except Exception as e:
+                print(f'Error releasing connections for source {self.source}: {e}')
+        for cache in self.caches.values():
+            if hasattr(cache, 'clear'):
+                cache.clear()
+        self.queries = {}
+        self.catalog_index = CatalogIndex()
+
+class SourceRegistry:
+    """
+    Registry of the sources served by the application.
+
+    Args:
+        sources (List[str]): Names of the source modules that may be served.
+        idle_timeout (float): Seconds after which an unused source is dropped.
+
+    Raises:
+        ValueError: If no source is given.
+    """
+    def __init__(self, sources: List[str], idle_timeout: float = SOURCE_IDLE_TIMEOUT):
+        if not sources:
+            raise ValueError('At least one source must be configured')
+        self.sources = list(dict.fromkeys(sources))
+        self.idle_timeout = idle_timeout
+        self._contexts: Dict[str, SourceContext] = {}
+        self._lock = threading.RLock()
+        self._sweeper: Optional[threading.Thread] = None
+
+    @property
+    def default_source(self) -> str:
+        """Source selected when the application starts."""
+        return self.sources[0]
+
+    def get(self, source: Optional[str] = None) -> SourceContext:
+        """
+        Return the context of a source, initializing it on first use.
+
+        Args:
+            source (Optional[str]): Source name. Defaults to the default source.
+
+        Returns:
+            SourceContext: The initialized source context.
+
+        Raises:
+            ValueError: If the source is not served by this registry.
+        """
+        source = source or self.default_source
+        if source not in self.sources:
+            raise ValueError(f'Unknown source: {source}')
+
+        with self._lock:
+            context = self._contexts.get(source)
+            created = context is None
+            if created:
+                config = init_config(source)
+                context = SourceContext(config, load_queries(config))
+                self._contexts[source] = context
+                print(f'Source {source} initialized with {len(context.queries)} queries')
+            context.last_used = time.monotonic()
+        # The query files are checked outside the registry lock, so a slow walk of one
+        # source's files does not hold up requests for the others
+        if not created:
+            context.refresh_queries()
+        self.evict_idle()
+        return context
+
+    def loaded_sources(self) -> List[str]:
+        """Return the names of the currently initialized sources."""
+        with self._lock:
+            return list(self._contexts)
+
+    def evict_idle(self) -> List[str]:
+        """
+        Drop every source that has been idle longer than the timeout.
+
+        Returns:
+            List[str]: Names of the dropped sources.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [name for name, context in self._contexts.items()
+                    if now - context.last_used > self.idle_timeout]
+            for name in idle:
+                self._drop(name)
+        return idle
+
+    def _drop(self, source: str) -> None:
+        """Close a source context and unload its modules."""
+        context = self._contexts.pop(source)
+        context.close()
+        for module_name in [m for m in sys.modules if m == source or m.startswith(f'{source}.')]:
+            del sys.modules[module_name]
+        print(f'Source {source} dropped after being idle')
+
+    def start_sweeper(self, interval: Optional[float] = None) -> None:
+        """
+        Start a daemon thread that periodically drops idle sources.
+
+        Args:
+            interval (Optional[float]): Seconds between sweeps. Defaults to a
+                quarter of the idle timeout.
+        """
+        if self._sweeper is not None:
+            return
+        interval = interval or max(self.idle_timeout / 4, 1.0)
+
+        def sweep():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+
+        self._sweeper = threading.Thread(target=sweep, name='source-sweeper', daemon=True)
+        self._sweeper.start()
@@ -0,0 +1,186 @@
+"""
+Speculative prefetch of the selected query.
+
+While an analyst fills in the parameters of a saved query, the query can
+already run: once every parameter holds a value and the values have been
+stable for a short debounce, the run starts on a small pool of low-priority
+threads and its result lands in the result cache. "Run Query" with the same
+values then hits the cache, or joins the run if it is still in flight.
+
+Each user has at most SPECULATION_PER_USER runs; a newer one cancels the
+oldest. Cancelled runs that have not started are dropped and running ones
+are interrupted where the driver allows it. Queries whose SQL contains
+'-- speculate: off' and queries that preflight flags as huge are never run
+speculatively.
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from db_utils import execute_sql_query, interrupt_run, run_key
+from metrics import metrics
+from preflight import preflight_query
+from sources import SourceRegistry
+
+SPECULATION_ENABLED = os.getenv('SPECULATION_ENABLED', '0').lower() in ('1', 'true', 'yes')
+# Seconds the parameter values must stay unchanged before a run starts
+SPECULATION_DEBOUNCE = float(os.getenv('SPECULATION_DEBOUNCE', '0.8'))
+# Speculative runs per user at the same time
+SPECULATION_PER_USER = int(os.getenv('SPECULATION_PER_USER', '1'))
+# Threads running speculative queries for all users
+SPECULATION_WORKERS = int(os.getenv('SPECULATION_WORKERS', '2'))
+# Nice increment of the speculation threads, where the OS supports per-thread priorities
+SPECULATION_NICE = int(os.getenv('SPECULATION_NICE', '10'))
+
+# Opt-out comment in a saved query, e.g. -- speculate: off
+SPECULATE_OFF_PATTERN = re.compile(r'--\s*speculate\s*:\s*(?:off|false|no)\b', re.IGNORECASE)
+
+def speculation_allowed(query_sql: str) -> bool:
+    """Return whether a saved query may run speculatively."""
+    return not SPECULATE_OFF_PATTERN.search(query_sql or '')
+
+def params_complete(params: Dict[str, Any]) -> bool:
+    """Return whether every parameter holds a value."""
+    return all(value not in (None, '', []) for value in params.values())
+
+def _lower_priority() -> None:
+    """Lower the calling thread's CPU priority; Linux schedules threads individually."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), SPECULATION_NICE)
+    except (AttributeError, OSError):
+        pass
+
+class SpeculativeRun:
+    """One scheduled run and its cancellation state."""
+    def __init__(self, user: str, source: str, query: str, params: Dict[str, Any],
+                 rollup: Optional[Dict[str, Any]] = None, sample: Optional[float] = None):
+        self.user = user
+        self.source = source
+        self.query = query
+        self.params = params
+        self.rollup = rollup
+        self.sample = sample
+        self.cancelled = threading.Event()
+        self.thread_id: Optional[int] = None
+        self.key: Optional[Tuple] = None
+        self.future = None
+
+    def same_as(self, other: 'SpeculativeRun') -> bool:
+        return (self.source, self.query, self.params, self.rollup, self.sample) == \
+            (other.source, other.query, other.params, other.rollup, other.sample)
+
+class Speculator:
+    """
+    Debounces parameter changes per user and prefetches the query they describe.
+
+    Args:
+        registry (SourceRegistry): Registry of the served sources.
+        debounce (float): Seconds the values must be stable before a run starts.
+        per_user (int): Runs a user may have scheduled or running.
+        workers (int): Threads running speculative queries.
+    """
+    def __init__(
+        self,
+        registry: SourceRegistry,
+        debounce: float = SPECULATION_DEBOUNCE,
+        per_user: int = SPECULATION_PER_USER,
+        workers: int = SPECULATION_WORKERS
+    ):
+        self.registry = registry
+        self.debounce = debounce
+        self.per_user = max(per_user, 1)
+        self._pool = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='speculate',
+                                        initializer=_lower_priority)
+        self._lock = threading.Lock()
+        self._timers: Dict[str, threading.Timer] = {}
+        self._runs: Dict[str, List[SpeculativeRun]] = {}
+
+    def schedule(self, run: SpeculativeRun) -> None:
+        """Start the run once the user's values have not changed for the debounce."""
+        with self._lock:
+            timer = self._timers.pop(run.user, None)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.debounce, self._submit, args=(run,))
+            timer.daemon = True
+            self._timers[run.user] = timer
+        timer.start()
+
+    def _submit(self, run: SpeculativeRun) -> None:
+        with self._lock:
+            if self._timers.get(run.user) is threading.current_thread():
+                del self._timers[run.user]
+            runs = self._runs.setdefault(run.user, [])
+            if any(active.same_as(run) for active in runs):
+                return
+            while len(runs) >= self.per_user:
+                self._cancel(runs.pop(0))
+            runs.append(run)
+            run.future = self._pool.submit(self._run, run)
+        metrics.increment('speculative_runs', status='started')
+
+    def _cancel(self, run: SpeculativeRun) -> None:
+        run.cancelled.set()
+        if run.future is not None and run.future.cancel():
+            status = 'dropped'
+        elif run.thread_id is not None and run.key is not None and interrupt_run(run.thread_id, run.key):
+            status = 'interrupted'
+        else:
+            status = 'superseded'
+        metrics.increment('speculative_runs', status=status)
+
+    def cancel(self, user: str) -> None:
+        """Cancel the pending and running speculative runs of a user."""
+        with self._lock:
+            timer = self._timers.pop(user, None)
+            if timer is not None:
+                timer.cancel()
+            for run in self._runs.pop(user, []):
+                self._cancel(run)
+
+    def active(self, user: str) -> List[SpeculativeRun]:
+        """Return the scheduled and running runs of a user."""
+        with self._lock:
+            return list(self._runs.get(user, []))
+
+    def _run(self, run: SpeculativeRun) -> None:
+        """Prefetch one query into the result cache."""
+        run.thread_id = threading.get_ident()
+        try:
+            if run.cancelled.is_set():
+                return
+            context = self.registry.get(run.source)
+            query = context.queries.get(run.query)
+            if query is None or not speculation_allowed(query['query']):
+                metrics.increment('speculative_runs', status='skipped')
+                return
+            # Run exactly what "Run Query" would, so the result is cached under the same key
+            decision = {'action': 'run', 'row_limit': None}
+            if run.rollup is None:
+                decision = preflight_query(run.query, run.params, context.config, context.queries, sample=run.sample,
+                                           cache=context.result_cache)
+            if decision['action'] == 'confirm':
+                metrics.increment('speculative_runs', status='skipped')
+                return
+            if run.cancelled.is_set():
+                return
+            # Cancelling interrupts the thread only while it still runs this key
+            run.key = run_key(run.query, run.params, context.config, context.queries,
+                              row_limit=decision['row_limit'], rollup=run.rollup, sample=run.sample)
+            df = execute_sql_query(run.query, run.params, context.config, context.queries,
+                                   cache=context.result_cache, origin='speculative',
+                                   row_limit=decision['row_limit'], rollup=run.rollup, sample=run.sample)
+            if not run.cancelled.is_set():
+                metrics.increment('speculative_runs', status='completed' if len(df.columns) else 'failed')
+        except Exception as e:
+            print(f"Speculative run error: {e}")
+        finally:
+            run.thread_id = None
+            with self._lock:
+                runs = self._runs.get(run.user, [])
+                if run in runs:
+                    runs.remove(run)
+                if not runs:
+                    self._runs.pop(run.user, None)
@@ -0,0 +1,198 @@
+"""
+Tuned sqlite connections for sqlite-backed sources.
+
+A plain sqlite3.connect() per query pays for opening the file, parsing the
+schema and warming a small page cache every time. The factory here opens
+the database with a larger page cache and memory-mapped reads, read-only by
+default, and keeps closed connections in a pool: the next query, on any
+thread, takes an idle one instead of opening the file again. Request threads,
+the threads running referenced queries and the async path all share it.
+Paths are resolved relative to the source package, so the app does not
+depend on the working directory:
+
+    connections = SQLiteConnectionFactory('sample_data.db', anchor=__file__)
+
+    def get_connection():
+        return connections.connect()
+
+    def release_connections():
+        connections.release()
+"""
+
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Set
+from async_sqlite import AsyncSQLiteConnection, offload
+
+# Bytes of the database file read through a memory map; 0 disables mmap
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+# Page cache per connection in KiB
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536'))
+# Whether closed connections are pooled for reuse instead of opening one per query
+SQLITE_SHARED_CONNECTIONS = os.getenv('SQLITE_SHARED_CONNECTIONS', '1').lower() in ('1', 'true', 'yes')
+# Idle connections kept per database; more are closed when they are returned
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', '8'))
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Connection handed out from a factory's pool.
+
+    Query code closes its connection after every run; for a pooled
+    connection that close returns it to the pool, and release() really
+    closes it.
+    """
+    factory: Optional['SQLiteConnectionFactory'] = None
+
+    def close(self) -> None:
+        if self.factory is None:
+            super().close()
+        else:
+            self.factory._checkin(self)
+
+    def release(self) -> None:
+        """Really close the connection."""
+        self.factory = None
+        super().close()
+
+class SQLiteConnectionFactory:
+    """
+    Opens tuned connections to one sqlite database.
+
+    Args:
+        path (str): Database file, relative to the directory of anchor unless absolute.
+        anchor (Optional[str]): File of the source package, usually __file__ of its connection.py.
+        read_only (bool): Open the file with mode=ro, so queries cannot modify it.
+        wal (bool): Switch the database to write-ahead logging on first use, so
+            readers are not blocked while another process refreshes the data.
+            This changes the file and needs write access to it and its directory.
+        mmap_size (int): Bytes read through a memory map; 0 disables mmap.
+        cache_size_kb (int): Page cache per connection in KiB.
+        shared (bool): Pool closed connections for reuse.
+        pool_size (int): Idle connections kept in the pool.
+        timeout (float): Seconds to wait for a locked database.
+    """
+    def __init__(
+        self,
+        path: str,
+        anchor: Optional[str] = None,
+        read_only: bool = True,
+        wal: bool = False,
+        mmap_size: int = SQLITE_MMAP_SIZE,
+        cache_size_kb: int = SQLITE_CACHE_SIZE_KB,
+        shared: bool = SQLITE_SHARED_CONNECTIONS,
+        pool_size: int = SQLITE_POOL_SIZE,
+        timeout: float = 5.0
+    ):
+        if anchor and not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(os.path.abspath(anchor)), path)
+        self.path = os.path.normpath(path)
+        self.read_only = read_only
+        self.wal = wal
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self.shared = shared
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._wal_checked = False
+        self._idle: List[PooledConnection] = []
+        # Every pooled connection, idle or in use, so release() can close them all
+        self._connections: Set[PooledConnection] = set()
+
+    @property
+    def uri(self) -> str:
+        """URI the database is opened with."""
+        mode = 'ro' if self.read_only else 'rw'
+        return f'file:{self.path}?mode={mode}'
+
+    def _enable_wal(self) -> None:
+        """Switch the database file to WAL once; the mode is stored in the file."""
+        with self._lock:
+            if self._wal_checked:
+                return
+            self._wal_checked = True
+            try:
+                conn = sqlite3.connect(f'file:{self.path}?mode=rw', uri=True, timeout=self.timeout)
+                try:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f'Could not enable WAL for {self.path}: {e}')
+
+    def _open(self, factory=sqlite3.Connection, check_same_thread: bool = True) -> sqlite3.Connection:
+        if self.wal and not self._wal_checked:
+            self._enable_wal()
+        conn = sqlite3.connect(self.uri, uri=True, timeout=self.timeout, factory=factory,
+                               check_same_thread=check_same_thread)
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size={-int(self.cache_size_kb)}')
+        # Temporary tables, e.g. of referenced queries, stay in memory
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Return a connection for the calling thread.
+
+        Returns:
+            sqlite3.Connection: An idle pooled connection or a new one; closing
+                it returns it to the pool. A new plain connection if sharing
+                is disabled.
+        """
+        if not self.shared:
+            return self._open()
+        conn = self._checkout()
+        if conn is None:
+            # Pooled connections move between threads, one thread at a time
+            conn = self._open(PooledConnection, check_same_thread=False)
+            conn.factory = self
+            with self._lock:
+                self._connections.add(conn)
+        return conn
+
+    async def connect_async(self) -> AsyncSQLiteConnection:
+        """Return a tuned connection for the async query path, from the pool when sharing."""
+        if not self.shared:
+            conn = await offload(lambda: self._open(check_same_thread=False))
+        else:
+            conn = self._checkout() or await offload(self.connect)
+        return AsyncSQLiteConnection(conn)
+
+    def _checkout(self) -> Optional[PooledConnection]:
+        with self._lock:
+            return self._idle.pop() if self._idle else None
+
+    def _checkin(self, conn: PooledConnection) -> None:
+        """Return a closed connection to the pool, or really close it if the pool is full or was released."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.factory = None
+        with self._lock:
+            keep = conn.factory is self and conn in self._connections and len(self._idle) < self.pool_size
+            if keep:
+                self._idle.append(conn)
+            else:
+                self._connections.discard(conn)
+        if not keep:
+            conn.release()
+
+    def release(self) -> None:
+        """
+        Close the pooled connections; new queries open new ones.
+
+        Idle connections are closed at once, connections still running a query
+        when they are returned.
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+            self._connections = set()
+        for conn in idle:
+            try:
+                conn.release()
+            except sqlite3.Error as e:
+                print(f'Error closing sqlite connection: {e}')
@@ -0,0 +1,7 @@
+import pytest
+from query_history import query_history
+
+@pytest.fixture(autouse=True, scope='session')
+def query_history_path(tmp_path_factory):
+    """Keep runs executed by the tests out of the repository's cache/query_history.db."""
+    query_history.path = str(tmp_path_factory.mktemp('history') / 'query_history.db')
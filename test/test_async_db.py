@@ -0,0 +1,59 @@
+import asyncio
+import re
+import sqlite3
+from types import SimpleNamespace
+from async_sqlite import connect_async
+from db_utils import execute_sql_query_async
+from query_history import query_history
+from result_cache import ResultCache
+
+def make_db(tmp_path):
+    path = str(tmp_path / 'async.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE prices (ticker TEXT, price REAL)')
+    conn.executemany('INSERT INTO prices VALUES (?, ?)', [('A', 1.0), ('B', 2.0), ('A', 3.0)])
+    conn.commit()
+    conn.close()
+    return path
+
+def make_config(path, use_async=True):
+    async def get_connection_async():
+        return await connect_async(path)
+
+    return SimpleNamespace(
+        source='test',
+        get_connection=lambda: sqlite3.connect(path),
+        get_connection_async=get_connection_async if use_async else None,
+        query_param_pattern=re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?')
+    )
+
+def test_adapter_runs_statements_off_the_loop(tmp_path):
+    path = make_db(tmp_path)
+
+    async def main():
+        conn = await connect_async(path)
+        cursor = await conn.execute('SELECT ticker, price FROM prices WHERE ticker = ?', ['A'])
+        rows = await cursor.fetchall()
+        await conn.close()
+        return [d[0] for d in cursor.description], rows
+
+    columns, rows = asyncio.run(main())
+    assert columns == ['ticker', 'price']
+    assert rows == [('A', 1.0), ('A', 3.0)]
+
+def test_async_query_uses_cache_and_thread_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_history, 'enabled', False)
+    path = make_db(tmp_path)
+    cache = ResultCache()
+    sql = 'SELECT * FROM prices ORDER BY price'
+
+    for use_async in (True, False):
+        cache.clear()
+        config = make_config(path, use_async)
+        df = asyncio.run(execute_sql_query_async(sql, [], config, {}, is_file=False, cache=cache))
+        assert list(df['price']) == [1.0, 2.0, 3.0]
+        assert len(cache) == 1
+
+    config.get_connection = None  # a cache hit must not connect
+    df = asyncio.run(execute_sql_query_async(sql, [], config, {}, is_file=False, cache=cache, row_limit=None))
+    assert len(df) == 3
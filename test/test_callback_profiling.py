@@ -0,0 +1,72 @@
+import os
+import json
+import time
+import asyncio
+import tracemalloc
+from flask import Flask
+import callback_profiling
+from callback_profiling import ProfileStore, profile_callback
+
+def slow_callback(n):
+    data = [list(range(1000)) for _ in range(n)]
+    time.sleep(0.05)
+    return len(data)
+
+def test_profiled_call_writes_speedscope_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(callback_profiling, 'CALLBACK_PROFILING', True)
+    store = ProfileStore(directory=str(tmp_path), keep=5)
+    assert profile_callback('slow_callback', slow_callback, store)(200) == 200
+
+    entry, = store.slowest()
+    assert entry['duration_ms'] >= 50
+    assert entry['peak_bytes'] > 1000 * 200 * 8
+    with open(tmp_path / entry['file']) as file:
+        document = json.load(file)
+    profile, = document['profiles']
+    assert profile['type'] == 'sampled' and profile['samples']
+    frames = document['shared']['frames']
+    assert any(frames[i]['name'] == 'slow_callback' for i in profile['samples'][0])
+    assert not tracemalloc.is_tracing()
+
+def test_only_slowest_profiles_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(callback_profiling, 'CALLBACK_PROFILING', True)
+    store = ProfileStore(directory=str(tmp_path), keep=2)
+    for delay in (0.03, 0.001, 0.02, 0.01):
+        profile_callback('sleep', time.sleep, store)(delay)
+
+    slowest = [e['duration_ms'] for e in store.slowest()]
+    assert len(slowest) == 2 and slowest[0] >= 30 and 20 <= slowest[1] < 30
+    assert sorted(os.listdir(tmp_path)) == sorted(e['file'] for e in store.slowest())
+    summary, = store.summary()
+    assert summary['calls'] == 4
+
+def test_unprofiled_calls_pass_through(tmp_path):
+    store = ProfileStore(directory=str(tmp_path))
+    assert profile_callback('slow_callback', slow_callback, store)(1) == 1
+    assert store.summary() == [] and os.listdir(tmp_path) == []
+
+def test_async_callbacks_stay_async(tmp_path, monkeypatch):
+    monkeypatch.setattr(callback_profiling, 'CALLBACK_PROFILING', True)
+    store = ProfileStore(directory=str(tmp_path))
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return 'done'
+
+    wrapped = profile_callback('fetch', fetch, store)
+    assert asyncio.iscoroutinefunction(wrapped)
+    assert asyncio.run(wrapped()) == 'done'
+    assert store.summary()[0]['callback'] == 'fetch'
+
+def test_keep_zero_records_summaries_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(callback_profiling, 'CALLBACK_PROFILING', True)
+    store = ProfileStore(directory=str(tmp_path), keep=0)
+    profile_callback('sleep', time.sleep, store)(0.001)
+    assert store.slowest() == [] and store.summary()[0]['calls'] == 1
+
+def test_request_profiling_needs_to_be_allowed(monkeypatch):
+    app = Flask(__name__)
+    with app.test_request_context(headers={'X-Profile': '1'}):
+        assert not callback_profiling.profiling_requested()
+        monkeypatch.setattr(callback_profiling, 'CALLBACK_PROFILING_ALLOW_REQUEST', True)
+        assert callback_profiling.profiling_requested()
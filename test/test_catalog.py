@@ -0,0 +1,74 @@
+import os
+import json
+import shutil
+import subprocess
+import pytest
+from sources import SourceRegistry
+
+CATALOG_JS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'catalog.js')
+
+def run_clientside(function, *args, triggered=()):
+    """Call a function of assets/catalog.js under node and return its result."""
+    context = {'triggered': [{'prop_id': prop_id} for prop_id in triggered]}
+    script = (
+        f"global.window = {{dash_clientside: {{no_update: 'NO_UPDATE', callback_context: {json.dumps(context)}}}}};"
+        f"require({json.dumps(CATALOG_JS)});"
+        f"const result = window.dash_clientside.catalog.{function}(...{json.dumps(args)});"
+        "console.log(JSON.stringify(result));"
+    )
+    return json.loads(subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True).stdout)
+
+def test_catalog_lists_params_and_columns():
+    catalog = SourceRegistry(['example']).get().catalog()
+    assert catalog['max_params'] == 2
+    assert catalog['queries']['stock_prices.sql'] == {
+        'params': [{'name': 'ticker', 'type': 'text'}],
+        'columns': ['date', 'ticker', 'price']
+    }
+    # Composed queries are probed against empty upstream tables
+    assert catalog['queries']['stock_price_range.sql']['columns'] == ['ticker', 'low', 'high', 'average', 'days']
+    json.dumps(catalog)
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_parameter_slots_are_rendered_from_the_catalog():
+    catalog = {'queries': {'q.sql': {'params': [{'name': 'date', 'type': 'date'}], 'columns': ['Trade_Date', 'price']}}}
+    divs, labels, texts, dates, text_values, date_values, batches = run_clientside(
+        'render_parameters', 'q.sql', catalog, [['batch'], []], ['AAPL', None], [None, None]
+    )
+    assert [div['display'] for div in divs] == ['block', 'none']
+    assert labels == ['date (date)', '']
+    assert [text['display'] for text in texts] == ['none', 'none']
+    assert [date['display'] for date in dates] == ['block', 'none']
+    assert text_values == [None, 'NO_UPDATE']
+    assert date_values == ['NO_UPDATE', 'NO_UPDATE']
+    assert batches == [[], 'NO_UPDATE']
+
+    options, date_column, _, group_by, _, measures = run_clientside('rollup_options', 'q.sql', catalog)
+    assert [option['value'] for option in options] == ['Trade_Date', 'price']
+    assert date_column == 'Trade_Date' and group_by == [] and measures == []
+    assert run_clientside('rollup_options', None, catalog)[:2] == [[], None]
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_catalog_update_for_the_same_query_keeps_values():
+    catalog = {'queries': {'q.sql': {'params': [{'name': 'ticker', 'type': 'text'}], 'columns': ['date', 'price']}}}
+    divs, labels, _, _, text_values, date_values, batches = run_clientside(
+        'render_parameters', 'q.sql', catalog, [['batch'], []], ['AAPL', None], [None, None],
+        triggered=['catalog-store.data']
+    )
+    assert [div['display'] for div in divs] == ['block', 'none'] and labels == ['ticker (text)', '']
+    assert text_values == ['NO_UPDATE', 'NO_UPDATE'] and batches == ['NO_UPDATE', 'NO_UPDATE']
+    options, date_column, _, group_by, _, _ = run_clientside('rollup_options', 'q.sql', catalog,
+                                                             triggered=['catalog-store.data'])
+    assert len(options) == 2 and date_column == 'NO_UPDATE' and group_by == 'NO_UPDATE'
+    assert run_clientside('render_parameters', 'q.sql', catalog, [[]], ['AAPL'], [None],
+                          triggered=['query-selector.value', 'catalog-store.data'])[4] == [None]
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_batched_date_parameter_takes_its_dates_as_text():
+    catalog = {'queries': {'q.sql': {'params': [{'name': 'date', 'type': 'date'}], 'columns': ['date']}}}
+    _, _, texts, dates, text_values, date_values, batches = run_clientside(
+        'render_parameters', 'q.sql', catalog, [['batch']], [None], ['2024-01-31'],
+        triggered=['{"index":0,"type":"param-batch"}.value']
+    )
+    assert texts[0]['display'] == 'block' and dates[0]['display'] == 'none'
+    assert text_values == date_values == batches == ['NO_UPDATE']
@@ -0,0 +1,78 @@
+import os
+import re
+import sqlite3
+from types import SimpleNamespace
+from catalog_index import CatalogIndex
+from db_utils import load_queries, execute_sql_query
+from sources import SourceContext
+
+QUERIES = {
+    'prices.sql': 'SELECT * FROM prices WHERE ticker = ?',
+    'risk/var.sql': 'SELECT desk, SUM(pnl) AS value_at_risk FROM pnl WHERE desk = ? GROUP BY desk',
+    'risk/limits/exposure.sql': "SELECT * FROM {{ ref('risk/var') }} WHERE value_at_risk > 100",
+    'notes.sql': '-- var of the fx book\nSELECT * FROM fx_pnl'
+}
+
+def make_context(tmp_path):
+    db = str(tmp_path / 'risk.db')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE pnl (desk TEXT, pnl REAL)')
+    conn.executemany('INSERT INTO pnl VALUES (?, ?)', [('fx', 60), ('fx', 70), ('rates', 20)])
+    conn.commit()
+    conn.close()
+    folder = tmp_path / 'queries'
+    for name, sql in QUERIES.items():
+        (folder / name).parent.mkdir(parents=True, exist_ok=True)
+        (folder / name).write_text(sql)
+    config = SimpleNamespace(
+        source='risk', queries_path=str(folder), get_connection=lambda: sqlite3.connect(db), get_connection_async=None,
+        query_param_pattern=re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?'), query_param_replace_mode=False,
+        query_paramstyle='qmark', date_bucket_sql=None
+    )
+    return SourceContext(config, load_queries(config)), folder
+
+def test_subfolders_are_loaded_and_searchable(tmp_path):
+    context, _ = make_context(tmp_path)
+    assert sorted(context.queries) == ['notes.sql', 'prices.sql', 'risk/limits/exposure.sql', 'risk/var.sql']
+    df = execute_sql_query('risk/limits/exposure.sql', {'desk': 'fx'}, context.config, context.queries)
+    assert df['value_at_risk'].tolist() == [130]
+
+    # Filename beats folder, folder and parameters beat SQL text, which includes references
+    assert context.search_queries('var') == ['risk/var.sql', 'notes.sql', 'risk/limits/exposure.sql']
+    assert context.search_queries('risk') == ['risk/limits/exposure.sql', 'risk/var.sql']
+    # Every word must match, by prefix; exposure inherits the desk parameter of risk/var
+    assert context.search_queries('desk expo') == ['risk/limits/exposure.sql']
+    assert context.search_queries('tick') == ['prices.sql']
+    assert context.search_queries('nothing here') == []
+    assert context.search_queries('', limit=2) == ['notes.sql', 'prices.sql']
+
+    catalog = context.catalog(['risk/var.sql'])
+    assert list(catalog['queries']) == ['risk/var.sql']
+    assert catalog['queries']['risk/var.sql']['columns'] == ['desk', 'value_at_risk']
+
+def test_reload_recompiles_and_reindexes_changed_files_only(tmp_path):
+    context, folder = make_context(tmp_path)
+    template = context.queries['prices.sql']['template']
+    (folder / 'notes.sql').unlink()
+    (folder / 'risk' / 'var.sql').write_text('SELECT desk, SUM(pnl) AS stress_loss FROM pnl WHERE desk = ? GROUP BY desk')
+    stat = os.stat(folder / 'risk' / 'var.sql')
+    os.utime(folder / 'risk' / 'var.sql', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert context.catalog(['prices.sql'])['version'] == 1
+    assert context.refresh_queries(interval=1e-9)
+    assert context.catalog(['prices.sql'])['version'] == 2
+    assert context.queries['prices.sql']['template'] is template
+    assert 'notes.sql' not in context.queries
+    assert context.search_queries('stress') == ['risk/var.sql']
+    assert context.search_queries('fx') == []
+
+def test_index_updates_are_incremental():
+    queries = {f'q{i}.sql': {'query': f'SELECT * FROM t{i}', 'params': [], 'signature': (i, 1)} for i in range(1000)}
+    index = CatalogIndex()
+    assert index.update(queries) == 1000
+    assert index.update(queries) == 0
+    queries['q7.sql'] = {'query': 'SELECT * FROM t7', 'params': [{'name': 'region'}], 'signature': (7, 2)}
+    del queries['q8.sql']
+    assert index.update(queries) == 2
+    assert index.search('region') == ['q7.sql']
+    assert len(index.search('t', limit=25)) == 25 and len(index) == 999
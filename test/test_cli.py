@@ -0,0 +1,71 @@
+import sys
+import sqlite3
+import subprocess
+import pandas as pd
+from cli import parse_args, build_jobs, run
+from query_history import query_history
+
+def make_source(tmp_path):
+    source = tmp_path / 'clisource'
+    (source / 'queries').mkdir(parents=True)
+    (source / '__init__.py').write_text('')
+    db = str(tmp_path / 'cli.db')
+    (source / 'connection.py').write_text(
+        'import re, sqlite3\n'
+        "QUERY_PARAM_PATTERN = re.compile(r'(\\w+)\\s*(?:[=><!]+)\\s*\\?')\n"
+        'QUERY_PARAM_REPLACE_MODE = False\n'
+        f'def get_connection():\n    return sqlite3.connect({db!r})\n'
+    )
+    (source / 'queries' / 'prices.sql').write_text('SELECT * FROM prices WHERE ticker = ?')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE prices (ticker TEXT, price REAL)')
+    conn.executemany('INSERT INTO prices VALUES (?, ?)', [('A', 1.0), ('B', 2.0), ('A', 3.0)])
+    conn.commit()
+    conn.close()
+
+def test_queries_run_once_per_parameter_set():
+    args = parse_args(['run', '--query', 'a.sql', '--query', 'b.sql',
+                       '--params', '{"x": 1}', '--params', '{"x": 2}'])
+    jobs = build_jobs(args)
+    assert [(job['query'], job['params']) for job in jobs] == [
+        ('a.sql', {'x': 1}), ('a.sql', {'x': 2}), ('b.sql', {'x': 1}), ('b.sql', {'x': 2})
+    ]
+    assert len({job['name'] for job in jobs}) == 4
+
+def test_run_writes_results_reports_and_exit_code(tmp_path, monkeypatch, capsys):
+    make_source(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(query_history, 'enabled', False)
+    jobs = tmp_path / 'jobs.json'
+    jobs.write_text('[{"query": "prices.sql", "params": {"ticker": "A"}, "name": "a"},'
+                    ' {"query": "missing.sql", "name": "missing"}]')
+
+    code = run(parse_args(['run', '--source', 'clisource', '--jobs', str(jobs),
+                           '--format', 'csv', '--report', '--out', 'out']))
+
+    assert code == 1
+    assert list(pd.read_csv(tmp_path / 'out' / 'a.csv')['price']) == [1.0, 3.0]
+    assert '<h3>a</h3>' in (tmp_path / 'out' / 'a.html').read_text()
+    assert '2 jobs, 1 failed' in capsys.readouterr().out
+
+def test_cli_does_not_import_dash():
+    check = 'import sys, cli; sys.exit(any(m == "dash" or m.startswith("dash.") for m in sys.modules))'
+    assert subprocess.run([sys.executable, '-c', check]).returncode == 0
+
+def test_failed_query_or_reference_fails_the_job(tmp_path, monkeypatch, capsys):
+    make_source(tmp_path)
+    queries = tmp_path / 'clisource' / 'queries'
+    (queries / 'broken.sql').write_text('SELECT * FROM no_such_table')
+    (queries / 'downstream.sql').write_text("SELECT * FROM {{ ref('broken') }}")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(query_history, 'enabled', False)
+
+    code = run(parse_args(['run', '--source', 'clisource', '--query', 'broken.sql', '--query', 'downstream.sql',
+                           '--format', 'csv', '--out', 'out']))
+
+    out = capsys.readouterr().out
+    assert code == 1
+    assert '2 jobs, 2 failed' in out and 'no such table: no_such_table' in out
+    assert not (tmp_path / 'out').exists() or not any((tmp_path / 'out').iterdir())
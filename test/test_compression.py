@@ -0,0 +1,57 @@
+import gzip
+import pytest
+from flask import Flask, Response
+import compression
+from compression import compress_response
+
+def make_client(monkeypatch, brotli_available=False):
+    if not brotli_available:
+        monkeypatch.setattr(compression, 'brotli', None)
+    server = Flask(__name__)
+    server.after_request(lambda response: compress_response(response, min_bytes=100))
+
+    @server.route('/big')
+    def big():
+        return {'data': [{'ticker': 'AAPL', 'price': i} for i in range(200)]}
+
+    @server.route('/small')
+    def small():
+        return {'ok': True}
+
+    @server.route('/stream')
+    def stream():
+        return Response((b'x' * 1000 for _ in range(3)), mimetype='text/csv')
+
+    return server.test_client()
+
+def test_large_json_is_gzipped_when_accepted(monkeypatch):
+    client = make_client(monkeypatch)
+    plain = client.get('/big')
+    assert 'Content-Encoding' not in plain.headers
+
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain.data
+    assert len(response.data) < len(plain.data) / 4
+
+def test_small_and_streamed_responses_are_left_alone(monkeypatch):
+    client = make_client(monkeypatch)
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    streamed = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in streamed.headers
+    assert len(streamed.data) == 3000
+
+def test_brotli_is_preferred_when_installed(monkeypatch):
+    pytest.importorskip('brotli')
+    client = make_client(monkeypatch, brotli_available=True)
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert compression.brotli.decompress(response.data) == client.get('/big').data
+
+def test_registering_compression_keeps_the_plotly_json_engine():
+    import plotly.io as pio
+    engine = pio.json.config.default_engine
+    compression.register_compression(Flask(__name__))
+    assert pio.json.config.default_engine == engine
+    assert compression.configure_json_engine('') == engine
@@ -0,0 +1,61 @@
+import re
+import sqlite3
+from types import SimpleNamespace
+from explain import explain_statement, build_plan_tree, analyze_plan, table_aliases
+
+def make_config(path):
+    return SimpleNamespace(
+        get_connection=lambda: sqlite3.connect(path),
+        query_param_pattern=re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?'),
+        explain_prefix='EXPLAIN'
+    )
+
+def test_full_scan_is_flagged_with_index_suggestion(tmp_path):
+    path = str(tmp_path / 'plan.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE prices (ticker TEXT, price REAL)')
+    conn.executemany('INSERT INTO prices VALUES (?, ?)', [('T%d' % i, i) for i in range(50)])
+    conn.commit()
+    conn.close()
+    config = make_config(path)
+    sql = 'SELECT * FROM prices WHERE ticker = ?'
+
+    rows = explain_statement(sql, ['T1'], config)
+    analysis = analyze_plan(rows, sql, config, large_table_rows=10)
+
+    assert build_plan_tree(rows)[0]['detail'].startswith('SCAN')
+    assert analysis['warnings'] == ['Full scan of prices (~50 rows)']
+    assert analysis['suggestions'] == ['CREATE INDEX idx_prices_ticker ON prices (ticker);']
+
+def test_indexed_lookup_is_not_flagged(tmp_path):
+    path = str(tmp_path / 'plan.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE prices (ticker TEXT, price REAL)')
+    conn.execute('CREATE INDEX idx_prices_ticker ON prices (ticker)')
+    conn.close()
+    config = make_config(path)
+    sql = 'SELECT * FROM prices WHERE ticker = ?'
+
+    analysis = analyze_plan(explain_statement(sql, ['T1'], config), sql, config, large_table_rows=0)
+    assert analysis == {'warnings': [], 'suggestions': []}
+
+def test_plan_rows_nest_under_parents():
+    rows = [
+        {'id': 2, 'parent': 0, 'detail': 'CO-ROUTINE sub'},
+        {'id': 5, 'parent': 2, 'detail': 'SCAN t'},
+        {'id': 9, 'parent': 0, 'detail': 'SCAN sub'}
+    ]
+    tree = build_plan_tree(rows)
+    assert [node['detail'] for node in tree] == ['CO-ROUTINE sub', 'SCAN sub']
+    assert tree[0]['children'][0]['detail'] == 'SCAN t'
+
+def test_table_aliases_resolve_to_tables():
+    sql = 'SELECT * FROM prices AS p JOIN tickers t ON p.ticker = t.ticker, sectors WHERE 1'
+    assert table_aliases(sql) == {'prices': 'prices', 'p': 'prices', 'tickers': 'tickers',
+                                  't': 'tickers', 'sectors': 'sectors'}
+
+def test_column_lists_and_function_arguments_are_not_tables():
+    assert table_aliases('SELECT ticker, price FROM stock_prices WHERE ticker = ?') == {'stock_prices': 'stock_prices'}
+    sql = ("SELECT ticker, MIN(price) AS low, EXTRACT(year FROM date) AS y, 'a, b' AS s "
+           "FROM prices p, (SELECT a, b FROM t) AS sub, sectors WHERE x IN (1, 2) GROUP BY ticker, y")
+    assert table_aliases(sql) == {'prices': 'prices', 'p': 'prices', 't': 't', 'sectors': 'sectors'}
@@ -0,0 +1,95 @@
+import io
+import re
+import sqlite3
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+from flask import Flask
+from db_utils import load_queries
+from export import iter_csv, iter_parquet, export_url, register_export_routes
+from rollup import normalize_rollup
+
+CHUNKS = [(['n', 'label'], [(i, f'row {i}') for i in range(start, start + 3)]) for start in (0, 3, 6)]
+
+def test_csv_export_writes_header_once_and_one_piece_per_chunk():
+    pieces = list(iter_csv(iter(CHUNKS)))
+    assert len(pieces) == 3
+    df = pd.read_csv(io.BytesIO(b''.join(pieces)))
+    assert list(df.columns) == ['n', 'label']
+    assert df['n'].tolist() == list(range(9))
+
+def test_parquet_export_writes_row_group_per_chunk():
+    pytest.importorskip('pyarrow')
+    data = b''.join(iter_parquet(iter(CHUNKS)))
+    df = pd.read_parquet(io.BytesIO(data))
+    assert df['label'].tolist() == [f'row {i}' for i in range(9)]
+
+def test_parquet_export_fixes_the_schema_after_the_first_chunk():
+    pytest.importorskip('pyarrow')
+    chunks = [(['n', 'label'], [(1, None), (2, None)]), (['n', 'label'], [(2.5, None)]),
+              (['n', 'label'], [(3, 'x')]), (['n', 'label'], [(4, 5)])]
+    pieces = list(iter_parquet(iter(chunks)))
+    assert len(pieces) == 5
+    df = pd.read_parquet(io.BytesIO(b''.join(pieces)))
+    assert df['n'].tolist()[:2] == [1, 2] and pd.isna(df['n'][2]) and df['n'].tolist()[3:] == [3, 4]
+    assert df['label'].tolist() == [None, None, None, 'x', '5']
+
+def test_parquet_export_streams_all_null_columns():
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    chunks = [(['n', 'empty'], [(i, None) for i in range(start, start + 100)]) for start in range(0, 1000, 100)]
+    pieces = []
+    for piece in iter_parquet(iter(chunks)):
+        # Each chunk is written as it arrives instead of waiting for a value
+        pieces.append(piece)
+        assert piece
+    assert len(pieces) == 11
+    table = pq.read_table(io.BytesIO(b''.join(pieces)))
+    assert table.schema.field('empty').type == pa.string()
+    assert table.num_rows == 1000 and table.column('empty').null_count == 1000
+
+def test_custom_sql_export_needs_the_app_token(tmp_path):
+    path = str(tmp_path / 'export.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE t (n INTEGER)')
+    conn.executemany('INSERT INTO t VALUES (?)', [(1,), (2,)])
+    conn.commit()
+    conn.close()
+    config = SimpleNamespace(source='test', get_connection=lambda: sqlite3.connect(path), get_connection_async=None,
+                             query_param_pattern=re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?'), query_param_replace_mode=False,
+                             query_paramstyle='qmark')
+    context = SimpleNamespace(config=config, queries={}, result_cache=None)
+    server = Flask(__name__)
+    register_export_routes(server, SimpleNamespace(get=lambda source=None: context))
+    client = server.test_client()
+
+    assert client.get('/export/csv?source=test&sql=SELECT+n+FROM+t').status_code == 403
+    url = export_url('csv', 'test', 'SELECT n FROM t', [], is_file=False)
+    assert client.get(url.replace('FROM+t', 'FROM+t+WHERE+n+%3E+1')).status_code == 403
+    response = client.get(url)
+    assert response.status_code == 200 and response.data.decode().split() == ['n', '1', '2']
+
+def test_rolled_up_export_matches_the_rolled_up_run(tmp_path):
+    path = str(tmp_path / 'prices.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE prices (date TEXT, ticker TEXT, close REAL)')
+    conn.executemany('INSERT INTO prices VALUES (?, ?, ?)',
+                     [('2024-01-02', 'A', 1.0), ('2024-01-03', 'A', 3.0), ('2024-02-01', 'A', None)])
+    conn.commit()
+    conn.close()
+    config = SimpleNamespace(source='test', get_connection=lambda: sqlite3.connect(path), get_connection_async=None,
+                             query_param_pattern=re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?'), query_param_replace_mode=False,
+                             query_paramstyle='qmark', date_bucket_sql=None, queries_path=str(tmp_path))
+    (tmp_path / 'prices.sql').write_text('SELECT * FROM prices')
+    context = SimpleNamespace(config=config, queries=load_queries(config), result_cache=None)
+    server = Flask(__name__)
+    register_export_routes(server, SimpleNamespace(get=lambda source=None: context))
+    client = server.test_client()
+
+    rollup = normalize_rollup({'date_column': 'date', 'bucket': 'month', 'measures': ['close'], 'functions': ['avg']})
+    response = client.get(export_url('csv', 'test', 'prices.sql', [], rollup=rollup))
+    assert response.status_code == 200
+    df = pd.read_csv(io.BytesIO(response.data))
+    assert list(df.columns) == ['date', 'avg_close'] and df['avg_close'].tolist()[0] == 2.0
+    assert df['avg_close'].isna().tolist() == [False, True]
+    assert client.get(export_url('csv', 'test', 'prices.sql', [], rollup=dict(rollup, bucket='hour'))).status_code == 400
@@ -0,0 +1,89 @@
+import re
+import time
+import sqlite3
+from types import SimpleNamespace
+from param_index import ParamIndex, lookup_queries
+from db_utils import compile_query
+from query_graph import link_queries, expand_refs, find_refs, param_query
+
+def make_config(path, lookups=None):
+    return SimpleNamespace(
+        source='test',
+        get_connection=lambda: sqlite3.connect(path),
+        query_param_pattern=re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?'),
+        param_lookups=lookups or {}
+    )
+
+def make_db(tmp_path):
+    path = str(tmp_path / 'params.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE prices (ticker TEXT, price REAL)')
+    conn.executemany('INSERT INTO prices VALUES (?, ?)',
+                     [('AAPL', 1), ('AMZN', 2), ('aal', 3), ('MSFT', 4), ('AAPL', 5), (None, 6)])
+    conn.commit()
+    conn.close()
+    return path
+
+def test_lookup_is_inferred_from_query_tables(tmp_path):
+    config = make_config(make_db(tmp_path))
+    assert lookup_queries('ticker', 'SELECT * FROM prices p WHERE ticker = ?', config, 10) == [
+        'SELECT DISTINCT ticker FROM prices WHERE ticker IS NOT NULL LIMIT 10'
+    ]
+    # Columns listed in the SELECT are not tables
+    assert lookup_queries('ticker', 'SELECT ticker, MIN(price) AS low FROM prices WHERE ticker = ? GROUP BY ticker',
+                          config, 10) == ['SELECT DISTINCT ticker FROM prices WHERE ticker IS NOT NULL LIMIT 10']
+    config.param_lookups = {'ticker': 'SELECT symbol FROM tickers', 'price': None}
+    assert lookup_queries('ticker', 'SELECT * FROM prices', config) == ['SELECT symbol FROM tickers']
+    assert lookup_queries('price', 'SELECT * FROM prices', config) == []
+
+def test_prefix_search_is_case_insensitive_and_loads_once(tmp_path):
+    path = make_db(tmp_path)
+    calls = []
+
+    def connect():
+        calls.append(1)
+        return sqlite3.connect(path)
+
+    config = make_config(path)
+    config.get_connection = connect
+    index = ParamIndex()
+    sql = 'SELECT * FROM prices WHERE ticker = ?'
+    assert index.search('ticker', sql, config, 'aa') == ['aal', 'AAPL']
+    assert index.search('ticker', sql, config, 'AM') == ['AMZN']
+    assert index.search('ticker', sql, config, '', limit=2) == ['aal', 'AAPL']
+    assert index.search('ticker', sql, config, 'x') == []
+    assert len(calls) == 1
+
+def test_failed_lookup_tries_next_table_and_caches_miss_briefly(tmp_path):
+    path = make_db(tmp_path)
+    config = make_config(path)
+    index = ParamIndex(miss_ttl=0.05)
+    sql = 'SELECT * FROM missing m JOIN prices p ON 1 WHERE ticker = ?'
+    assert index.search('ticker', sql, config, 'MS') == ['MSFT']
+    assert index.search('nope', sql, config, '') == []
+    index.clear()
+    assert index.search('ticker', sql, config, 'MS') == ['MSFT']
+
+    # The miss is retried once its short TTL has passed, e.g. after the table was created
+    assert index.search('ticker', 'SELECT * FROM missing WHERE ticker = ?', config, '') == []
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE missing AS SELECT * FROM prices')
+    conn.commit()
+    conn.close()
+    assert index.search('ticker', 'SELECT * FROM missing WHERE ticker = ?', config, '') == []
+    time.sleep(0.1)
+    assert index.search('ticker', 'SELECT * FROM missing WHERE ticker = ?', config, 'MS') == ['MSFT']
+
+def test_inherited_parameter_is_looked_up_in_the_upstream_query(tmp_path):
+    config = SimpleNamespace(query_param_pattern=re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?'), query_param_replace_mode=False,
+                             query_paramstyle='qmark', param_lookups={})
+    sql = {'prices.sql': 'SELECT * FROM prices WHERE ticker = ?',
+           'moves.sql': "SELECT AVG(price) AS avg_price FROM {{ ref('prices') }} WHERE price > ?"}
+    queries = link_queries({name: {'query': text, 'template': compile_query(expand_refs(text), config),
+                                   'refs': find_refs(text)} for name, text in sql.items()})
+    assert [param['name'] for param in queries['moves.sql']['params']] == ['price', 'ticker']
+    assert param_query(queries, 'moves.sql', 'price') == 'moves.sql'
+    assert param_query(queries, 'moves.sql', 'ticker') == 'prices.sql'
+    assert lookup_queries('ticker', queries['prices.sql']['template'].sql, config) == [
+        'SELECT DISTINCT ticker FROM prices WHERE ticker IS NOT NULL LIMIT 50000'
+    ]
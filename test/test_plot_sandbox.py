@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+from plot_sandbox import PlotSandbox, share_frame, read_frame
+
+CHART = "import plotly.express as px\n\ndef custom_chart(data_frame):\n    return px.bar(data_frame, x='ticker', y='price')\n"
+FRAME = pd.DataFrame({'ticker': ['AAPL', 'MSFT'], 'price': [1.5, 2.5], 'date': pd.to_datetime(['2024-01-01', '2024-01-02'])})
+
+def test_frames_round_trip_through_shared_memory():
+    shm, size = share_frame(FRAME)
+    try:
+        pd.testing.assert_frame_equal(read_frame(shm.name, size), FRAME, check_dtype=False)
+    finally:
+        shm.close()
+        shm.unlink()
+
+def test_sandbox_runs_plots_and_survives_failures():
+    sandbox = PlotSandbox(workers=1, timeout=15, cpu_seconds=2, memory_mb=256)
+    try:
+        fig = sandbox.run(CHART, FRAME)
+        assert fig['data'][0]['type'] == 'bar'
+
+        with pytest.raises(RuntimeError, match='ZeroDivisionError'):
+            sandbox.run('def custom_chart(data_frame):\n    return 1 / 0\n', FRAME)
+        with pytest.raises(RuntimeError, match='MemoryError'):
+            sandbox.run('def custom_chart(data_frame):\n    return bytearray(4 * 1024 ** 3)\n', FRAME)
+        with pytest.raises(TimeoutError):
+            sandbox.run('import time\n\ndef custom_chart(data_frame):\n    time.sleep(30)\n', FRAME, timeout=1)
+
+        # The killed worker was replaced
+        assert sandbox.run(CHART, FRAME)['data'][0]['type'] == 'bar'
+    finally:
+        sandbox.stop()
+
+def test_frame_that_cannot_be_shared_keeps_the_worker_free():
+    sandbox = PlotSandbox(workers=1, timeout=15)
+    try:
+        with pytest.raises(Exception):
+            sandbox.run(CHART, pd.DataFrame({'z': [1 + 2j]}))
+        assert sandbox.run(CHART, FRAME, timeout=5)['data'][0]['type'] == 'bar'
+    finally:
+        sandbox.stop()
@@ -0,0 +1,105 @@
+import re
+import sqlite3
+from types import SimpleNamespace
+import pandas as pd
+from db_utils import limit_statement, query_key, load_queries, execute_sql_query
+from preflight import estimate_rows, preflight_query
+from result_cache import ResultCache
+
+def make_config(tmp_path, rows=500):
+    path = str(tmp_path / 'preflight.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE t (n INTEGER)')
+    conn.executemany('INSERT INTO t VALUES (?)', [(i,) for i in range(rows)])
+    conn.commit()
+    conn.close()
+    return SimpleNamespace(
+        source=str(tmp_path),
+        get_connection=lambda: sqlite3.connect(path),
+        query_param_pattern=re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?'),
+        query_param_replace_mode=False,
+        query_paramstyle='qmark',
+        explain_prefix='EXPLAIN',
+        estimate_rows=None
+    )
+
+def test_large_result_gets_automatic_limit(tmp_path):
+    config = make_config(tmp_path)
+    decision = preflight_query('SELECT * FROM t WHERE n > ?', [10], config, {}, is_file=False,
+                               policy='limit', row_limit=100)
+    assert decision['rows'] == 489
+    assert decision['method'] == 'count'
+    assert decision['action'] == 'limit'
+    assert decision['row_limit'] == 100
+
+def test_small_result_runs_unchanged(tmp_path):
+    config = make_config(tmp_path)
+    decision = preflight_query('SELECT * FROM t WHERE n < ?', [5], config, {}, is_file=False, row_limit=100)
+    assert decision['action'] == 'run'
+    assert decision['row_limit'] is None
+
+def test_approximate_run_is_estimated_on_its_sample(tmp_path):
+    config = make_config(tmp_path)
+    conn = config.get_connection()
+    conn.execute('CREATE TABLE t_sample AS SELECT * FROM t WHERE n % 10 = 0')
+    conn.commit()
+    conn.close()
+    config.table_sample_sql, config.sample_tables = None, {'t': ('t_sample', 0.1)}
+    decision = preflight_query('SELECT * FROM t', [], config, {}, is_file=False, row_limit=40, sample=0.1)
+    assert decision['rows'] == 50 and decision['action'] == 'limit'
+
+def test_count_over_budget_falls_back_to_table_size(tmp_path):
+    config = make_config(tmp_path, rows=2000)
+    estimate = estimate_rows('SELECT * FROM t a, t b, t c', [], config, budget_ms=1)
+    assert estimate == {'rows': 2000, 'method': 'table-size'}
+
+def test_filtered_statement_over_budget_has_no_estimate(tmp_path):
+    config = make_config(tmp_path, rows=2000)
+    estimate = estimate_rows('SELECT * FROM t a, t b, t c WHERE a.n = 7', [], config, budget_ms=1)
+    assert estimate == {'rows': None, 'method': None}
+
+def test_cached_results_and_estimates_skip_the_database(tmp_path):
+    config = make_config(tmp_path)
+    connect = config.get_connection
+    connections = []
+    config.get_connection = lambda: connections.append(1) or connect()
+    cache = ResultCache()
+    cache.put(query_key(config.source, 'SELECT * FROM t WHERE n > ?', [10]), pd.DataFrame({'n': range(300)}))
+    decision = preflight_query('SELECT * FROM t WHERE n > ?', [10], config, {}, is_file=False, row_limit=100, cache=cache)
+    assert decision['rows'] == 300 and decision['method'] == 'cache' and decision['action'] == 'limit'
+    assert not connections
+
+    for _ in range(2):
+        decision = preflight_query('SELECT * FROM t WHERE n < ?', [10], config, {}, is_file=False, cache=cache)
+        assert decision['rows'] == 10
+    assert len(connections) == 1
+    preflight_query('SELECT * FROM t WHERE n < ?', [10], config, {}, is_file=False, cache=cache, refresh=True)
+    assert len(connections) == 2
+
+def test_composed_queries_are_estimated_from_their_upstream_results(tmp_path):
+    config = make_config(tmp_path)
+    folder = tmp_path / 'queries'
+    folder.mkdir()
+    for name, sql in {'all.sql': 'SELECT * FROM t', 'big.sql': "SELECT * FROM {{ ref('all') }}",
+                      'joined.sql': "SELECT a.n FROM {{ ref('all') }} a JOIN t b ON a.n = b.n WHERE b.n < ?"}.items():
+        (folder / name).write_text(sql)
+    config.queries_path, config.get_connection_async, config.date_bucket_sql = str(folder), None, None
+    queries = load_queries(config)
+    cache = ResultCache()
+
+    # A huge upstream result is not fetched unbounded
+    decision = preflight_query('big.sql', [], config, queries, row_limit=100, cache=cache)
+    assert decision['rows'] == 500 and decision['method'] == 'upstream-size' and decision['row_limit'] == 100
+    df = execute_sql_query('big.sql', [], config, queries, cache=cache, row_limit=decision['row_limit'])
+    assert len(df) == 100
+    assert preflight_query('big.sql', [], config, queries, row_limit=1000)['action'] == 'run'
+
+    # Queries joining base tables are counted over the loaded upstream tables when they are small
+    decision = preflight_query('joined.sql', {'n': 7}, config, queries, row_limit=1000, cache=cache)
+    assert decision['rows'] == 7 and decision['method'] == 'count' and decision['action'] == 'run'
+    decision = preflight_query('joined.sql', {'n': 300}, config, queries, row_limit=100, cache=cache)
+    assert decision['rows'] == 500 and decision['action'] == 'limit'
+
+def test_limit_statement_keeps_placeholders():
+    assert limit_statement('SELECT * FROM t WHERE n > ?;', 10) == \
+        'SELECT * FROM (SELECT * FROM t WHERE n > ?) AS limited LIMIT 10'
@@ -0,0 +1,35 @@
+from datetime import datetime
+from metrics import metrics
+from prewarm import UsageTracker, PrewarmScheduler, in_window
+from sources import SourceRegistry
+
+def test_usage_tracker_orders_by_run_count(tmp_path):
+    usage = UsageTracker(str(tmp_path / 'usage.db'))
+    usage.record('example', 'stock_prices.sql', {'ticker': 'AAPL'})
+    usage.record('example', 'revenue.sql', {'revenue': '1000'})
+    usage.record('example', 'revenue.sql', {'revenue': '1000'})
+
+    assert usage.top(2) == [
+        ('example', 'revenue.sql', {'revenue': '1000'}),
+        ('example', 'stock_prices.sql', {'ticker': 'AAPL'})
+    ]
+    assert usage.top(5, sources=['example2']) == []
+
+def test_window_wraps_around_midnight():
+    assert in_window('')
+    assert in_window('22:00-04:00', datetime(2024, 1, 1, 23, 30))
+    assert in_window('22:00-04:00', datetime(2024, 1, 1, 3, 0))
+    assert not in_window('22:00-04:00', datetime(2024, 1, 1, 12, 0))
+
+def test_warm_up_fills_result_and_report_caches(tmp_path):
+    usage = UsageTracker(str(tmp_path / 'usage.db'))
+    usage.record('example', 'stock_prices.sql', {'ticker': 'AAPL'})
+    registry = SourceRegistry(['example'])
+
+    warmed = PrewarmScheduler(registry, usage, concurrency=1).run_once()
+
+    context = registry.get('example')
+    assert warmed == 1
+    assert len(context.result_cache) == 1
+    assert len(context.report_cache) == 1
+    assert metrics.get('prewarm_runs', source='example') >= 1
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from profiler import hll_distinct, profile_column, profile_dataframe, profile_report
+
+def test_hll_estimate_is_close_to_exact_count():
+    values = pd.Series(np.arange(200000) % 50000)
+    assert abs(hll_distinct(values) - 50000) / 50000 < 0.03
+    assert hll_distinct(pd.Series(['a', 'b', 'a'])) == 2
+    assert hll_distinct(pd.Series([], dtype=float)) == 0
+
+def test_numeric_column_stats():
+    series = pd.Series([1.0, 2.0, None, 4.0, 4.0], name='x')
+    stats = profile_column(series, top_k=1, bins=3)
+    assert stats['nulls'] == 1 and stats['null_pct'] == 20.0
+    assert stats['min'] == 1.0 and stats['max'] == 4.0 and stats['p50'] == 3.0
+    assert stats['top'] == [(4.0, 2)]
+    assert sum(stats['histogram']['counts']) == 4
+
+def test_date_strings_are_profiled_as_dates():
+    series = pd.Series(['2024-01-02', '2024-03-01', '2023-12-31'], name='date')
+    stats = profile_column(series)
+    assert stats['min'] == '2023-12-31 00:00:00' and stats['max'] == '2024-03-01 00:00:00'
+    assert stats['histogram']['dates']
+
+def test_parallel_profile_keeps_column_order():
+    df = pd.DataFrame({c: np.random.rand(100) for c in 'abcdef'})
+    assert [s['column'] for s in profile_dataframe(df, workers=4)] == list('abcdef')
+
+def test_repeated_column_names_are_profiled_by_position():
+    df = pd.DataFrame([[1.0, 'x', 5.0], [2.0, 'y', 7.0]], columns=['a', 'b', 'a'])
+    for workers in (1, 3):
+        profile = profile_dataframe(df, workers=workers)
+        assert [s['column'] for s in profile] == ['a', 'b', 'a']
+        assert [s['max'] for s in profile] == [2.0, None, 7.0]
+
+def test_repeated_text_values_are_counted_exactly():
+    series = pd.Series(['b', 'a', None, 'b', 'c', 'b', 'a'] * 1000, name='desk')
+    stats = profile_column(series, top_k=2)
+    assert stats['distinct'] == 3 and stats['nulls'] == 1000
+    assert stats['top'] == [('b', 3000), ('a', 2000)]
+
+def test_report_feeds_unpack_to_dash():
+    df = pd.DataFrame({'ticker': ['A', 'B', 'A'], 'price': [1.0, 2.0, 3.0]})
+    report = profile_report(df)
+    overview = report['Profile (3 rows, 2 columns)']
+    assert list(overview['column']) == ['ticker', 'price']
+    assert set(report['Top values']['column']) == {'ticker'}
+    assert len(report['Distributions']) == 1
+
+def test_large_results_are_profiled_on_a_sample():
+    df = pd.DataFrame({'n': np.arange(10000), 'desk': ['a', 'b'] * 5000})
+    report = profile_report(df, sample_size=1000)
+    overview = report['Profile (10,000 rows, 2 columns; statistics from a 1,000-row sample)']
+    assert overview['count'].tolist() == [1000, 1000]
+    assert 0 <= overview.loc[0, 'min'] and overview.loc[0, 'max'] < 10000
+    assert profile_report(df, sample_size=0)['Profile (10,000 rows, 2 columns)']['count'].tolist() == [10000, 10000]
@@ -0,0 +1,133 @@
+import re
+import time
+import sqlite3
+from types import SimpleNamespace
+import pandas as pd
+import db_utils
+from db_utils import load_queries, execute_sql_query, resolve_statement, upstream_tables
+from explain import explain_statement
+from query_history import query_history
+from query_graph import expand_refs, find_refs, materialize
+from result_cache import ResultCache
+from sources import SourceContext
+
+QUERIES = {
+    'base.sql': "SELECT * FROM prices WHERE ticker = ?",
+    'high.sql': "SELECT * FROM {{ ref('base') }} WHERE price >= ?",
+    'low.sql': "SELECT * FROM {{ ref('base.sql') }} WHERE price < 3",
+    'both.sql': "SELECT h.price FROM {{ ref('high') }} h JOIN {{ ref('low') }} l ON h.ticker = l.ticker",
+    'loop_a.sql': "SELECT * FROM {{ ref('loop_b') }}",
+    'loop_b.sql': "SELECT * FROM {{ ref('loop_a') }}",
+    'missing.sql': "SELECT * FROM {{ ref('nowhere') }}"
+}
+
+def make_source(tmp_path, queries=QUERIES):
+    db = str(tmp_path / 'prices.db')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE prices (ticker TEXT, price REAL)')
+    conn.executemany('INSERT INTO prices VALUES (?, ?)', [('AAPL', 1), ('AAPL', 2), ('AAPL', 5), ('MSFT', 4)])
+    conn.commit()
+    conn.close()
+    folder = tmp_path / 'queries'
+    folder.mkdir(exist_ok=True)
+    for name, sql in queries.items():
+        (folder / name).write_text(sql)
+    connections = []
+
+    def get_connection():
+        connections.append(1)
+        return sqlite3.connect(db)
+
+    config = SimpleNamespace(
+        source='test', queries_path=str(folder), get_connection=get_connection, get_connection_async=None,
+        query_param_pattern=re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?'), query_param_replace_mode=False,
+        query_paramstyle='qmark', date_bucket_sql=None
+    )
+    return config, connections
+
+def test_refs_are_found_and_expanded():
+    sql = "SELECT * FROM {{ ref('base') }} JOIN {{ref(\"other.sql\")}} USING (id) JOIN {{ ref('base') }}"
+    assert find_refs(sql) == ['base.sql', 'other.sql']
+    assert expand_refs(sql) == 'SELECT * FROM ref_base JOIN ref_other USING (id) JOIN ref_base'
+
+def test_graph_merges_params_and_drops_broken_queries(tmp_path, capsys):
+    config, _ = make_source(tmp_path)
+    queries = load_queries(config)
+    assert set(queries) == {'base.sql', 'high.sql', 'low.sql', 'both.sql'}
+    assert 'circular reference' in capsys.readouterr().out
+    assert queries['both.sql']['upstream'] == ['base.sql', 'high.sql', 'low.sql']
+    assert [p['name'] for p in queries['both.sql']['params']] == ['ticker', 'price']
+    assert [p['name'] for p in queries['base.sql']['params']] == ['ticker']
+
+def test_shared_upstream_runs_once_and_is_cached(tmp_path):
+    config, connections = make_source(tmp_path)
+    queries = load_queries(config)
+    cache = ResultCache()
+    df = execute_sql_query('both.sql', {'ticker': 'AAPL', 'price': 2}, config, queries, cache=cache)
+    assert sorted(df['price']) == [2, 2, 5, 5]
+    # base, high, low and both each ran on one connection
+    assert len(connections) == 4
+
+    high = execute_sql_query('high.sql', {'ticker': 'AAPL', 'price': 2}, config, queries, cache=cache)
+    assert sorted(high['price']) == [2, 5] and len(connections) == 4
+
+def test_refresh_reruns_upstream_queries(tmp_path):
+    config, _ = make_source(tmp_path)
+    queries = load_queries(config)
+    cache = ResultCache()
+    params = {'ticker': 'AAPL', 'price': 2}
+    assert len(execute_sql_query('high.sql', params, config, queries, cache=cache)) == 2
+    conn = sqlite3.connect(str(tmp_path / 'prices.db'))
+    conn.execute("INSERT INTO prices VALUES ('AAPL', 9)")
+    conn.commit()
+    conn.close()
+    assert len(execute_sql_query('high.sql', params, config, queries, cache=cache)) == 2
+    assert len(execute_sql_query('high.sql', params, config, queries, cache=cache, refresh=True)) == 3
+
+def test_upstream_change_invalidates_downstream(tmp_path):
+    config, _ = make_source(tmp_path)
+    cache = ResultCache()
+    queries = load_queries(config)
+    before = execute_sql_query('high.sql', {'ticker': 'AAPL', 'price': 0}, config, queries, cache=cache)
+    (tmp_path / 'queries' / 'base.sql').write_text("SELECT * FROM prices WHERE ticker = ? AND price > 1")
+    reloaded = load_queries(config)
+    assert reloaded['high.sql']['version'] != queries['high.sql']['version']
+    after = execute_sql_query('high.sql', {'ticker': 'AAPL', 'price': 0}, config, reloaded, cache=cache)
+    assert len(before) == 3 and len(after) == 2
+
+def test_failed_upstream_fails_downstream(tmp_path):
+    config, _ = make_source(tmp_path, {'base.sql': 'SELECT * FROM nowhere', 'top.sql': "SELECT * FROM {{ ref('base') }}"})
+    queries = load_queries(config)
+    assert execute_sql_query('top.sql', {}, config, queries).empty
+
+def test_materialize_binds_timestamps_as_text():
+    conn = sqlite3.connect(':memory:')
+    df = pd.DataFrame({'day': pd.to_datetime(['2024-01-02', None]), 'n': [1, 2], 'x': [0.5, None]})
+    materialize(conn, 'ref_days', df)
+    assert conn.execute('SELECT * FROM ref_days ORDER BY n').fetchall() == [('2024-01-02 00:00:00', 1, 0.5), (None, 2, None)]
+
+def test_changed_query_files_reload_the_catalog(tmp_path):
+    config, _ = make_source(tmp_path)
+    context = SourceContext(config, load_queries(config))
+    version = context.queries['high.sql']['version']
+    time.sleep(0.01)
+    assert not context.refresh_queries(interval=0.001)
+    (tmp_path / 'queries' / 'base.sql').write_text("SELECT * FROM prices WHERE ticker = ? AND price > 1")
+    time.sleep(0.01)
+    assert context.refresh_queries(interval=0.001)
+    assert context.queries['high.sql']['version'] != version
+
+def test_composed_query_is_explained_over_its_upstream_tables(tmp_path, monkeypatch):
+    config, _ = make_source(tmp_path)
+    queries = load_queries(config)
+    statement, args = resolve_statement('high.sql', {'ticker': 'AAPL', 'price': 2}, config, queries)
+    rows = explain_statement(statement, args, config, upstream_tables('high.sql', config, queries))
+    assert any('ref_base' in row['detail'] for row in rows)
+
+    # Slow runs capture the plan of a composed query too
+    recorded = []
+    monkeypatch.setattr(db_utils, 'EXPLAIN_THRESHOLD_MS', 1e-9)
+    monkeypatch.setattr(query_history, 'record', recorded.append)
+    df = execute_sql_query('high.sql', {'ticker': 'AAPL', 'price': 2}, config, queries)
+    assert df['price'].tolist() == [2, 5]
+    assert 'ref_base' in recorded[-1]['plan']
@@ -0,0 +1,51 @@
+import time
+import pandas as pd
+from query_history import QueryHistory
+
+def test_summary_reports_percentiles_per_query(tmp_path):
+    history = QueryHistory(str(tmp_path / 'history.db'))
+    for ms in range(1, 101):
+        history.record({'source': 'example', 'query_name': 'stock_prices.sql', 'total_ms': float(ms), 'rows': 10})
+    history.record({'source': 'example', 'sql_hash': 'abc', 'total_ms': 5.0, 'rows': 0, 'error': 'no such table'})
+    history.flush()
+
+    summary = history.summary().set_index('query')
+    saved = summary.loc['stock_prices.sql']
+    assert saved['runs'] == 100
+    assert saved['p50_ms'] == 50.5
+    assert saved['p99_ms'] >= 99
+    assert summary.loc['custom:abc', 'errors'] == 1
+
+def test_disabled_history_records_nothing(tmp_path):
+    history = QueryHistory(str(tmp_path / 'history.db'), enabled=False)
+    history.record({'source': 'example', 'total_ms': 1.0})
+    history.flush()
+    assert history.load().empty
+
+def test_writer_prunes_old_and_excess_runs(tmp_path):
+    history = QueryHistory(str(tmp_path / 'history.db'), retention_days=1, max_rows=10)
+    now = time.time()
+    history.record({'source': 'example', 'query_name': 'old.sql', 'total_ms': 1.0, 'ts': now - 2 * 86400})
+    for i in range(25):
+        history.record({'source': 'example', 'query_name': 'new.sql', 'total_ms': float(i), 'ts': now + i})
+    history.flush()
+
+    runs = history.load()
+    assert len(runs) == 10
+    assert sorted(runs['total_ms']) == [float(i) for i in range(15, 25)]
+
+def test_summary_defaults_to_recent_runs_and_matches_pandas_percentiles(tmp_path):
+    history = QueryHistory(str(tmp_path / 'history.db'), retention_days=0, max_rows=0)
+    latencies = [3.0, 40.0, 7.5, 12.0, 90.0, 1.0, 55.0]
+    for ms in latencies:
+        history.record({'source': 'example', 'query_name': 'q.sql', 'total_ms': ms, 'cache_hit': ms < 10})
+    history.record({'source': 'example', 'query_name': 'stale.sql', 'total_ms': 1.0, 'ts': 0})
+    history.flush()
+
+    summary = history.summary().set_index('query')
+    assert list(summary.index) == ['q.sql']
+    row = summary.loc['q.sql']
+    for column, q in [('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99)]:
+        assert row[column] == round(pd.Series(latencies).quantile(q), 1)
+    assert row['cache_hit_rate'] == round(3 / 7, 2)
+    assert 'stale.sql' in history.summary(since=0)['query'].tolist()
@@ -0,0 +1,78 @@
+import re
+import sqlite3
+import pytest
+from db_utils import QueryTemplate
+
+PATTERN = re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?')
+
+def test_repeated_parameter_is_bound_per_placeholder():
+    sql = "SELECT * FROM t WHERE date >= ? AND ticker = ? AND date <= ?"
+    template = QueryTemplate(sql, PATTERN)
+
+    assert [p['name'] for p in template.params] == ['date', 'ticker']
+    assert template.param_positions == {'date': [0, 2], 'ticker': [1]}
+
+    statement, args = template.bind({'date': '2024-01-01', 'ticker': 'AAPL'})
+    assert statement == sql
+    assert args == ['2024-01-01', 'AAPL', '2024-01-01']
+
+def test_named_paramstyle_binds_by_name():
+    sql = "SELECT * FROM t WHERE date >= ? AND date <= ?"
+    template = QueryTemplate(sql, PATTERN, paramstyle='named')
+
+    statement, args = template.bind({'date': '2024-01-01'})
+    assert statement == "SELECT * FROM t WHERE date >= :date AND date <= :date"
+    assert args == {'date': '2024-01-01'}
+
+def test_statement_text_is_stable_between_runs():
+    template = QueryTemplate("SELECT * FROM t WHERE ticker = ?", PATTERN)
+    first, _ = template.bind({'ticker': 'AAPL'})
+    second, _ = template.bind({'ticker': 'MSFT'})
+    assert first is second
+
+def test_replace_mode_substitutes_quoted_names():
+    pattern = re.compile(r"(\w+)\s*=\s*'\w+'")
+    template = QueryTemplate("SELECT * FROM t WHERE ticker = 'ticker'", pattern, replace_mode=True)
+
+    statement, args = template.bind({'ticker': "O'NEIL"})
+    assert statement == "SELECT * FROM t WHERE ticker = 'O''NEIL'"
+    assert args == []
+
+def test_batch_equality_is_folded_into_in_list():
+    template = QueryTemplate("SELECT * FROM t WHERE ticker = ?;", PATTERN)
+
+    statement, args = template.bind({'ticker': ['AAPL', 'MSFT']})
+    assert statement == ("SELECT batched.ticker AS batch_value, batched.* FROM "
+                         "(SELECT * FROM t WHERE ticker IN (?, ?)) AS batched")
+    assert args == ['AAPL', 'MSFT']
+
+def test_batch_in_list_is_tagged_by_the_compared_column():
+    template = QueryTemplate("SELECT * FROM t WHERE ticker = :symbol", re.compile(r':(\w+)'), paramstyle='named')
+    statement, args = template.bind({'symbol': ['AAPL', 'MSFT']})
+    assert statement.startswith('SELECT batched.ticker AS batch_value') and 'ticker IN (:symbol_0, :symbol_1)' in statement
+    # Qualified columns may be ambiguous in the SELECT * of a join and are repeated per value instead
+    statement, _ = QueryTemplate("SELECT * FROM t s WHERE s.ticker = ?", PATTERN).bind({'ticker': ['A', 'B']})
+    assert ' UNION ALL ' in statement and ' IN (' not in statement
+
+def test_batch_falls_back_to_union_all_with_tag():
+    sql = "SELECT price FROM t WHERE date >= ? AND ticker = ? AND date <= ?"
+    template = QueryTemplate(sql, PATTERN, paramstyle='named')
+
+    statement, args = template.bind({'date': ['2024-01-01', '2024-02-01'], 'ticker': 'AAPL'})
+    assert statement.count(' UNION ALL ') == 1
+    assert statement.startswith('SELECT :date_0 AS batch_value, batched.* FROM (SELECT price FROM t WHERE date >= :date_0')
+    assert args == {'date_0': '2024-01-01', 'ticker': 'AAPL', 'date_1': '2024-02-01'}
+
+def test_batch_runs_in_one_statement():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE t (ticker TEXT, price REAL)')
+    conn.executemany('INSERT INTO t VALUES (?, ?)', [('A', 1), ('B', 2), ('C', 3), ('A', 4)])
+    for sql in ("SELECT * FROM t WHERE ticker = ?", "SELECT price FROM t WHERE ticker = ?"):
+        statement, args = QueryTemplate(sql, PATTERN).bind({'ticker': ['A', 'C']})
+        rows = conn.execute(statement, args).fetchall()
+        assert sorted((row[0], row[-1]) for row in rows) == [('A', 1.0), ('A', 4.0), ('C', 3.0)]
+
+def test_only_one_parameter_can_be_batched():
+    template = QueryTemplate("SELECT * FROM t WHERE a = ? AND b = ?", PATTERN)
+    with pytest.raises(ValueError, match='a, b'):
+        template.bind({'a': [1, 2], 'b': [3]})
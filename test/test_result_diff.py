@@ -0,0 +1,33 @@
+import pandas as pd
+from result_diff import fingerprint_result, diff_result, is_unchanged
+
+def make_prices(n):
+    return pd.DataFrame({'day': range(n), 'price': [100.0 + i for i in range(n)]})
+
+def test_appended_rows_become_append_operation():
+    previous = fingerprint_result(make_prices(1200), block_size=500)
+    diff = diff_result(previous, make_prices(1250))
+
+    assert diff['replace'] == []
+    assert diff['append_from'] == 1200
+    assert diff['delete_from'] is None
+
+def test_changed_rows_are_replaced_by_block():
+    df = make_prices(2000)
+    previous = fingerprint_result(df, block_size=500)
+    df.loc[700, 'price'] = -1.0
+
+    diff = diff_result(previous, df)
+    assert diff['replace'] == [(500, 1000)]
+    assert diff['append_from'] is None
+
+def test_identical_result_has_no_operations():
+    previous = fingerprint_result(make_prices(100))
+    assert is_unchanged(diff_result(previous, make_prices(100)))
+
+def test_column_change_or_large_rewrite_falls_back_to_full_result():
+    df = make_prices(1000)
+    previous = fingerprint_result(df, block_size=100)
+
+    assert diff_result(previous, df.rename(columns={'price': 'close'})) is None
+    assert diff_result(previous, df.assign(price=0.0)) is None
@@ -0,0 +1,60 @@
+import sqlite3
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+from db_utils import execute_sql_query
+from result_cache import ResultCache
+from rollup import normalize_rollup, rollup_frame, SQLITE_DATE_BUCKETS
+
+SQL = 'SELECT * FROM prices WHERE price >= ?'
+
+def make_config(tmp_path, bucket_sql=None):
+    path = str(tmp_path / 'prices.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE prices (date TEXT, ticker TEXT, price REAL)')
+    dates = pd.date_range('2024-01-01', '2024-03-31', freq='D').strftime('%Y-%m-%d')
+    conn.executemany('INSERT INTO prices VALUES (?, ?, ?)',
+                     [(d, t, i + (10 if t == 'MSFT' else 0)) for i, d in enumerate(dates) for t in ('AAPL', 'MSFT')])
+    conn.commit()
+    conn.close()
+    return SimpleNamespace(source='test', get_connection=lambda: sqlite3.connect(path),
+                           get_connection_async=None, date_bucket_sql=bucket_sql)
+
+def make_rollup(bucket):
+    return normalize_rollup({'date_column': 'date', 'bucket': bucket, 'group_by': ['ticker'],
+                             'measures': ['price'], 'functions': ['avg', 'max', 'count']})
+
+@pytest.mark.parametrize('bucket', ['day', 'week', 'month'])
+def test_sql_pushdown_matches_pandas_fallback(tmp_path, bucket):
+    config = make_config(tmp_path, SQLITE_DATE_BUCKETS)
+    rollup = make_rollup(bucket)
+    pushed = execute_sql_query(SQL, [0], config, {}, is_file=False, rollup=rollup)
+    full = execute_sql_query(SQL, [0], config, {}, is_file=False)
+    pd.testing.assert_frame_equal(pushed, rollup_frame(full, rollup), check_dtype=False)
+    assert list(pushed.columns) == ['date', 'ticker', 'avg_price', 'max_price', 'count_price']
+
+def test_weeks_start_on_monday_and_months_on_the_first(tmp_path):
+    config = make_config(tmp_path, SQLITE_DATE_BUCKETS)
+    weeks = execute_sql_query(SQL, [0], config, {}, is_file=False, rollup=make_rollup('week'))
+    assert (pd.to_datetime(weeks['date']).dt.weekday == 0).all()
+    assert weeks['date'].iloc[0] == '2024-01-01'
+    months = execute_sql_query(SQL, [0], config, {}, is_file=False, rollup=make_rollup('month'))
+    assert months['date'].unique().tolist() == ['2024-01-01', '2024-02-01', '2024-03-01']
+    assert months['count_price'].tolist() == [31, 31, 29, 29, 31, 31]
+
+def test_pandas_fallback_is_cached_per_bucket(tmp_path):
+    config = make_config(tmp_path)
+    cache = ResultCache()
+    monthly = execute_sql_query(SQL, [0], config, {}, is_file=False, cache=cache, rollup=make_rollup('month'))
+    weekly = execute_sql_query(SQL, [0], config, {}, is_file=False, cache=cache, rollup=make_rollup('week'))
+    assert len(monthly) == 6 and len(weekly) > len(monthly)
+    # Full result plus one rollup per bucket
+    assert len(cache) == 3
+
+def test_rollup_needs_plain_identifiers():
+    assert normalize_rollup({'date_column': 'date', 'bucket': 'month', 'measures': []}) is None
+    assert normalize_rollup({'date_column': 'date', 'bucket': None, 'measures': ['price']}) is None
+    with pytest.raises(ValueError):
+        normalize_rollup({'date_column': 'date', 'bucket': 'month', 'measures': ['price); DROP TABLE x; --']})
+    with pytest.raises(ValueError):
+        normalize_rollup({'date_column': 'date', 'bucket': 'year', 'measures': ['price']})
@@ -0,0 +1,88 @@
+import sqlite3
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import pytest
+from db_utils import execute_sql_query
+from rollup import normalize_rollup, SQLITE_DATE_BUCKETS
+from sampling import sample_statement, refresh_sample_table, SQLITE_TABLE_SAMPLE, TABLESAMPLE_BERNOULLI
+
+def make_config(tmp_path, bucket_sql=None, sample_tables=None, rows=20000):
+    path = str(tmp_path / 'trades.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE trades (date TEXT, desk TEXT, amount REAL)')
+    rng = np.random.default_rng(7)
+    dates = pd.date_range('2024-01-01', periods=rows, freq='h').strftime('%Y-%m-%d %H:%M')
+    conn.executemany('INSERT INTO trades VALUES (?, ?, ?)',
+                     [(d, 'rates' if i % 2 else 'fx', float(a)) for i, (d, a) in enumerate(zip(dates, rng.gamma(2, 50, rows)))])
+    conn.execute('CREATE TABLE trades_sample AS SELECT * FROM trades WHERE rowid % 10 = 0')
+    conn.commit()
+    conn.close()
+    return SimpleNamespace(source='test', get_connection=lambda: sqlite3.connect(path), get_connection_async=None,
+                           date_bucket_sql=bucket_sql, table_sample_sql=SQLITE_TABLE_SAMPLE,
+                           sample_tables=sample_tables or {})
+
+ROLLUP = normalize_rollup({'date_column': 'date', 'bucket': 'month', 'group_by': ['desk'],
+                           'measures': ['amount'], 'functions': ['sum', 'count', 'avg', 'max']})
+
+def test_first_base_table_is_sampled():
+    statement, fraction = sample_statement(
+        'WITH recent AS (SELECT * FROM trades t WHERE t.date > ?) SELECT * FROM recent JOIN desks d ON d.id = recent.desk',
+        0.01, TABLESAMPLE_BERNOULLI
+    )
+    assert 'FROM trades AS t TABLESAMPLE BERNOULLI (1.0) WHERE' in statement and fraction == 0.01
+    statement, _ = sample_statement('SELECT * FROM trades WHERE desk = ?', 0.05, SQLITE_TABLE_SAMPLE)
+    assert statement.startswith('SELECT * FROM (SELECT * FROM trades WHERE abs(random() % 1000000) < 50000) AS trades WHERE')
+    # A maintained sample table wins and brings its own fraction
+    statement, fraction = sample_statement('SELECT * FROM Trades', 0.05, SQLITE_TABLE_SAMPLE, {'trades': ('trades_s', 0.1)})
+    assert statement == 'SELECT * FROM trades_s AS Trades' and fraction == 0.1
+    with pytest.raises(ValueError):
+        sample_statement('SELECT * FROM trades', 0.05, None)
+
+def test_from_inside_function_arguments_is_not_a_table():
+    statement, _ = sample_statement(
+        "SELECT EXTRACT(year FROM date) AS y, substring(desk FROM 2) AS d, trim(both ' ' FROM note), "
+        "'from quotes' AS q FROM trades WHERE amount IS DISTINCT FROM 0",
+        0.1, TABLESAMPLE_BERNOULLI
+    )
+    assert statement.count('TABLESAMPLE') == 1
+    assert statement.endswith('FROM trades AS trades TABLESAMPLE BERNOULLI (10.0) WHERE amount IS DISTINCT FROM 0')
+    statement, _ = sample_statement('SELECT * FROM (SELECT CAST(x AS TEXT) FROM trades) AS t', 0.1, TABLESAMPLE_BERNOULLI)
+    assert statement == 'SELECT * FROM (SELECT CAST(x AS TEXT) FROM trades AS trades TABLESAMPLE BERNOULLI (10.0)) AS t'
+
+@pytest.mark.parametrize('bucket_sql', [SQLITE_DATE_BUCKETS, None])
+def test_rollup_over_a_sample_table_is_scaled(tmp_path, bucket_sql):
+    config = make_config(tmp_path, bucket_sql, {'trades': ('trades_sample', 0.1)})
+    approximate = execute_sql_query('SELECT * FROM trades', [], config, {}, is_file=False, rollup=ROLLUP, sample=0.5)
+    sample = execute_sql_query('SELECT * FROM trades_sample', [], config, {}, is_file=False)
+    sample['date'] = pd.to_datetime(sample['date']).dt.strftime('%Y-%m-01')
+    groups = sample.groupby(['date', 'desk'])['amount']
+    assert approximate.attrs['sample'] == 0.1
+    assert list(approximate.columns) == ['date', 'desk', 'sum_amount', 'sum_amount_se', 'count_amount', 'count_amount_se',
+                                         'avg_amount', 'avg_amount_se', 'max_amount', 'max_amount_se', 'sample_rows']
+    np.testing.assert_allclose(approximate['sum_amount'], groups.sum().values * 10)
+    np.testing.assert_allclose(approximate['count_amount'], groups.count().values * 10)
+    np.testing.assert_allclose(approximate['avg_amount'], groups.mean().values)
+    np.testing.assert_allclose(approximate['avg_amount_se'], (groups.std() * np.sqrt(0.9 / groups.count())).values)
+    np.testing.assert_allclose(approximate['max_amount'], groups.max().values)
+    assert approximate['max_amount_se'].isna().all()
+
+def test_random_sample_estimates_cover_the_exact_total(tmp_path):
+    config = make_config(tmp_path, SQLITE_DATE_BUCKETS, rows=50000)
+    exact = execute_sql_query('SELECT * FROM trades', [], config, {}, is_file=False, rollup=ROLLUP)
+    approximate = execute_sql_query('SELECT * FROM trades', [], config, {}, is_file=False, rollup=ROLLUP, sample=0.05)
+    merged = exact.merge(approximate, on=['date', 'desk'], suffixes=('', '_approx'))
+    assert len(merged) == len(exact)
+    error = (merged['sum_amount_approx'] - merged['sum_amount']) / merged['sum_amount_se']
+    # Most buckets lie within two standard errors and the grand total within four
+    assert (error.abs() < 2).mean() > 0.85
+    total_error = merged['sum_amount_approx'].sum() - merged['sum_amount'].sum()
+    assert abs(total_error) < 4 * np.sqrt((merged['sum_amount_se'] ** 2).sum())
+    assert approximate['sample_rows'].sum() < 0.1 * 50000
+
+def test_sample_table_is_refreshed(tmp_path):
+    config = make_config(tmp_path)
+    conn = config.get_connection()
+    rows = refresh_sample_table(conn, 'trades', 'trades_sample', 0.2, SQLITE_TABLE_SAMPLE)
+    assert 2000 < rows < 6000
+    assert conn.execute('SELECT COUNT(*) FROM trades_sample').fetchone()[0] == rows
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from db_utils import query_key
+from singleflight import SingleFlight
+
+def test_concurrent_identical_calls_share_one_run():
+    flights = SingleFlight()
+    runs = []
+    started = threading.Event()
+
+    def work():
+        runs.append(1)
+        started.set()
+        time.sleep(0.2)
+        return 42
+
+    def call():
+        return flights.do('query', work)
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        first = pool.submit(call)
+        started.wait()
+        others = [pool.submit(call) for _ in range(4)]
+        results = [first.result()] + [f.result() for f in others]
+
+    assert len(runs) == 1
+    assert [value for value, _ in results] == [42] * 5
+    assert sum(coalesced for _, coalesced in results) == 4
+    assert flights.in_flight() == 0
+
+def test_exception_is_shared_and_key_released():
+    flights = SingleFlight()
+    release = threading.Event()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait()
+        raise RuntimeError('boom')
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, 'query', fail)
+        started.wait()
+        waiter = pool.submit(flights.do, 'query', fail)
+        while flights.waiting('query') < 1:
+            time.sleep(0.01)
+        release.set()
+        with pytest.raises(RuntimeError, match='boom'):
+            leader.result()
+        with pytest.raises(RuntimeError, match='boom'):
+            waiter.result()
+    assert flights.do('query', lambda: 'ok') == ('ok', False)
+
+def test_waiting_counts_callers_joined_to_a_run():
+    flights = SingleFlight()
+    release = threading.Event()
+    started = threading.Event()
+
+    def work():
+        started.set()
+        release.wait()
+        return 1
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        leader = pool.submit(flights.do, 'query', work)
+        started.wait()
+        assert flights.waiting('query') == 0
+        waiters = [pool.submit(flights.do, 'query', work) for _ in range(2)]
+        while flights.waiting('query') < 2:
+            time.sleep(0.01)
+        release.set()
+        assert [f.result() for f in [leader] + waiters] == [(1, False), (1, True), (1, True)]
+    assert flights.waiting('query') == 0
+
+def test_async_callers_share_one_run():
+    flights = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.1)
+        return 7
+
+    async def main():
+        return await asyncio.gather(*(flights.do_async('query', work) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert len(runs) == 1
+    assert [value for value, _ in results] == [7] * 3
+    assert sum(coalesced for _, coalesced in results) == 2
+    assert flights.in_flight() == 0
+
+def test_query_key_ignores_layout_but_not_literal_text():
+    assert query_key('s', 'SELECT *\n  FROM t WHERE a = ?;', [1]) == query_key('s', 'SELECT * FROM t WHERE a = ?', [1])
+    assert query_key('s', "SELECT * FROM t WHERE a = 'x  y'", []) != query_key('s', "SELECT * FROM t WHERE a = 'x y'", [])
+    assert query_key('s', 'SELECT "a  b" FROM t', []) != query_key('s', 'SELECT "a b" FROM t', [])
@@ -0,0 +1,45 @@
+import sys
+import time
+import threading
+from sources import SourceRegistry
+
+def test_sources_initialize_lazily_and_drop_when_idle():
+    registry = SourceRegistry(['example', 'example2'], idle_timeout=0.05)
+    assert registry.loaded_sources() == []
+
+    registry.get('example2')
+    assert registry.loaded_sources() == ['example2']
+
+    time.sleep(0.1)
+    registry.get('example')
+    assert registry.loaded_sources() == ['example']
+    assert 'example2.connection' not in sys.modules
+
+def test_default_source_is_first_configured():
+    registry = SourceRegistry(['example', 'example2'])
+    assert registry.get().source == 'example'
+
+def test_query_file_check_does_not_hold_the_registry():
+    registry = SourceRegistry(['example', 'example2'])
+    context = registry.get('example')
+    registry.get('example2')
+    walking, release = threading.Event(), threading.Event()
+
+    def slow_signature():
+        walking.set()
+        release.wait(5)
+        return context._catalog_signature
+    context.catalog_signature = slow_signature
+    context._catalog_checked -= 60
+    checker = threading.Thread(target=registry.get, args=('example',))
+    checker.start()
+    assert walking.wait(5)
+    try:
+        # Other sources, and the same source, are served while the files are walked
+        started = time.monotonic()
+        assert registry.get('example2').source == 'example2'
+        assert registry.get('example') is context
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+        checker.join(5)
@@ -0,0 +1,96 @@
+import re
+import time
+import sqlite3
+import threading
+from types import SimpleNamespace
+from db_utils import load_queries, execute_sql_query, interrupt_run, run_key
+from metrics import metrics
+from preflight import preflight_query
+from sources import SourceContext
+from speculation import Speculator, SpeculativeRun, params_complete
+
+QUERIES = {
+    'prices.sql': 'SELECT * FROM prices WHERE ticker = ?',
+    'costly.sql': '-- speculate: off\nSELECT * FROM prices WHERE ticker = ?',
+    'slow.sql': ('WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 500000000) '
+                 'SELECT COUNT(*) AS n FROM c WHERE x > ?')
+}
+
+def make_registry(tmp_path):
+    db = str(tmp_path / 'prices.db')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE prices (ticker TEXT, price REAL)')
+    conn.executemany('INSERT INTO prices VALUES (?, ?)', [('AAPL', 1), ('MSFT', 2)])
+    conn.commit()
+    conn.close()
+    folder = tmp_path / 'queries'
+    folder.mkdir()
+    for name, sql in QUERIES.items():
+        (folder / name).write_text(sql)
+    config = SimpleNamespace(
+        source='spec', queries_path=str(folder), get_connection=lambda: sqlite3.connect(db), get_connection_async=None,
+        query_param_pattern=re.compile(r'(\w+)\s*(?:[=><!]+)\s*\?'), query_param_replace_mode=False,
+        query_paramstyle='qmark', date_bucket_sql=None
+    )
+    context = SourceContext(config, load_queries(config))
+    return SimpleNamespace(get=lambda source=None: context), context
+
+def wait_idle(speculator, user, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while speculator.active(user) and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+def test_stable_values_are_prefetched_once(tmp_path):
+    registry, context = make_registry(tmp_path)
+    speculator = Speculator(registry, debounce=0.1)
+    before = metrics.get('query_executions', source='spec', origin='speculative')
+    for ticker in ('A', 'AA', 'AAPL'):
+        speculator.schedule(SpeculativeRun('u1', 'spec', 'prices.sql', {'ticker': ticker}))
+    time.sleep(0.3)
+    wait_idle(speculator, 'u1')
+    assert metrics.get('query_executions', source='spec', origin='speculative') == before + 1
+
+    # Run Query finds the prefetched result before estimating anything
+    decision = preflight_query('prices.sql', {'ticker': 'AAPL'}, context.config, context.queries,
+                               cache=context.result_cache)
+    assert decision['method'] == 'cache' and decision['row_limit'] is None
+    df = execute_sql_query('prices.sql', {'ticker': 'AAPL'}, context.config, context.queries, cache=context.result_cache)
+    assert df['price'].tolist() == [1]
+    assert metrics.get('result_cache_hits', source='spec', origin='user') == 1
+
+def test_newer_run_interrupts_the_running_one(tmp_path):
+    registry, context = make_registry(tmp_path)
+    speculator = Speculator(registry, debounce=0.01, per_user=1)
+    speculator.schedule(SpeculativeRun('u1', 'spec', 'slow.sql', {'x': 1}))
+    time.sleep(0.3)
+    assert [run.query for run in speculator.active('u1')] == ['slow.sql']
+
+    interrupted = metrics.get('speculative_runs', status='interrupted')
+    start = time.monotonic()
+    speculator.schedule(SpeculativeRun('u1', 'spec', 'prices.sql', {'ticker': 'MSFT'}))
+    time.sleep(0.1)
+    wait_idle(speculator, 'u1')
+    assert time.monotonic() - start < 2
+    assert metrics.get('speculative_runs', status='interrupted') == interrupted + 1
+    assert len(context.result_cache) == 1
+
+def test_opted_out_and_incomplete_queries_are_not_run(tmp_path):
+    registry, context = make_registry(tmp_path)
+    speculator = Speculator(registry, debounce=0.01)
+    speculator.schedule(SpeculativeRun('u1', 'spec', 'costly.sql', {'ticker': 'AAPL'}))
+    time.sleep(0.1)
+    wait_idle(speculator, 'u1')
+    assert len(context.result_cache) == 0
+    assert not params_complete({'ticker': 'AAPL', 'date': None})
+    assert not params_complete({'ticker': []})
+
+def test_interrupt_only_stops_the_expected_run(tmp_path):
+    _, context = make_registry(tmp_path)
+    thread = threading.Thread(target=execute_sql_query, args=('slow.sql', {'x': 1}, context.config, context.queries))
+    thread.start()
+    time.sleep(0.3)
+    assert not interrupt_run(thread.ident, run_key('slow.sql', {'x': 2}, context.config, context.queries))
+    assert thread.is_alive()
+    assert interrupt_run(thread.ident, run_key('slow.sql', {'x': 1}, context.config, context.queries))
+    thread.join(2)
+    assert not thread.is_alive()
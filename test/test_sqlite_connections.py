@@ -0,0 +1,68 @@
+import sqlite3
+import threading
+import pytest
+from sqlite_connections import SQLiteConnectionFactory
+
+def make_db(tmp_path):
+    path = tmp_path / 'data.db'
+    conn = sqlite3.connect(str(path))
+    conn.execute('CREATE TABLE prices (ticker TEXT, price REAL)')
+    conn.execute("INSERT INTO prices VALUES ('AAPL', 1)")
+    conn.commit()
+    conn.close()
+    return path
+
+def test_path_is_relative_to_anchor(tmp_path, monkeypatch):
+    make_db(tmp_path)
+    monkeypatch.chdir('/')
+    connections = SQLiteConnectionFactory('data.db', anchor=str(tmp_path / 'connection.py'))
+    assert connections.path == str(tmp_path / 'data.db')
+    assert connections.connect().execute('SELECT COUNT(*) FROM prices').fetchone() == (1,)
+
+def test_read_only_connection_blocks_writes_but_allows_temp_tables(tmp_path):
+    connections = SQLiteConnectionFactory(str(make_db(tmp_path)))
+    conn = connections.connect()
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("INSERT INTO prices VALUES ('MSFT', 2)")
+    conn.execute('CREATE TEMPORARY TABLE ref_prices AS SELECT * FROM prices')
+    assert conn.execute('SELECT COUNT(*) FROM ref_prices').fetchone() == (1,)
+
+def test_closed_connections_are_reused_across_threads(tmp_path):
+    connections = SQLiteConnectionFactory(str(make_db(tmp_path)), pool_size=1)
+    conn = connections.connect()
+    # Connections in use are never handed out twice
+    busy = connections.connect()
+    assert busy is not conn
+    conn.close()
+    busy.close()
+    assert conn.execute('SELECT COUNT(*) FROM prices').fetchone() == (1,)
+    with pytest.raises(sqlite3.ProgrammingError):
+        # The pool keeps one idle connection and closes the rest
+        busy.execute('SELECT 1')
+
+    # A request thread or a thread running a referenced query takes the idle connection
+    other = []
+    thread = threading.Thread(target=lambda: (other.append(connections.connect()), other[0].close()))
+    thread.start()
+    thread.join()
+    assert other[0] is conn
+
+def test_release_closes_idle_connections_and_in_use_ones_when_returned(tmp_path):
+    connections = SQLiteConnectionFactory(str(make_db(tmp_path)))
+    idle, in_use = connections.connect(), connections.connect()
+    idle.close()
+
+    connections.release()
+    with pytest.raises(sqlite3.ProgrammingError):
+        idle.execute('SELECT 1')
+    assert in_use.execute('SELECT COUNT(*) FROM prices').fetchone() == (1,)
+    in_use.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        in_use.execute('SELECT 1')
+    assert connections.connect() not in (idle, in_use)
+
+def test_unshared_connections_are_new_each_time(tmp_path):
+    connections = SQLiteConnectionFactory(str(make_db(tmp_path)), shared=False, mmap_size=0)
+    first, second = connections.connect(), connections.connect()
+    assert first is not second
+    assert first.execute('PRAGMA mmap_size').fetchone() == (0,)